@@ -0,0 +1,81 @@
+# bench_file_finder.py
+"""
+Compare the original find_python_files, which walks everything with
+rglob("*") and filters afterwards, with the pruning scandir walker and with
+the persistent file index on an unchanged tree, on a book repository holding
+a populated 50k-file .venv, a .git directory and __pycache__ directories.
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import Generator
+
+from pybooktools.find_files.file_finder import walk_files
+from pybooktools.find_files.file_index import RACY_NS
+from pybooktools.find_files.find_file_types import EXCLUDE_DIRS, EXCLUDE_FILES, find_python_files
+
+
+def rglob_file_finder(start_search: Path) -> Generator[Path, None, None]:
+    """The original recursive search: walk everything, then filter."""
+    for path in start_search.rglob("*"):
+        if any(part in EXCLUDE_DIRS for part in path.parts):
+            continue
+        if path.is_file() and path.name not in EXCLUDE_FILES and path.suffix.lower() == ".py":
+            yield path
+
+
+def walker_file_finder(start_search: Path) -> Generator[Path, None, None]:
+    for entry in walk_files(start_search, True, EXCLUDE_DIRS):
+        if entry.name not in EXCLUDE_FILES and entry.name.endswith(".py"):
+            yield Path(entry.path)
+
+
+def build_tree(root: Path, venv_files: int = 50_000) -> None:
+    for c in range(20):
+        chapter = root / f"c{c:02}_chapter"
+        (chapter / "__pycache__").mkdir(parents=True)
+        for e in range(30):
+            (chapter / f"example_{e}.py").write_text(f"print({e})\n", encoding="utf-8")
+            (chapter / "__pycache__" / f"example_{e}.cpython-313.pyc").write_bytes(b"")
+    site_packages = root / ".venv" / "lib" / "python3.13" / "site-packages"
+    per_package = 100
+    for p in range(venv_files // per_package):
+        package = site_packages / f"package_{p}"
+        package.mkdir(parents=True)
+        for f in range(per_package):
+            (package / f"module_{f}.py").write_bytes(b"")
+    objects = root / ".git" / "objects"
+    for d in range(256):
+        (objects / f"{d:02x}").mkdir(parents=True)
+        for f in range(20):
+            (objects / f"{d:02x}" / f"{f:038x}").write_bytes(b"")
+
+
+def best_time(find, root: Path, repeat: int = 3) -> tuple[float, int]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(1 for _ in find(root))
+        times.append(time.perf_counter() - start)
+    return min(times), found
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_tree(root)
+        time.sleep(RACY_NS / 1e9 + 0.1)  # Let directory mtimes settle, as in a real tree
+        expected = sorted(rglob_file_finder(root))
+        assert sorted(walker_file_finder(root)) == expected
+        assert sorted(find_python_files("recursive", root)) == expected  # Also builds the index
+        old, found = best_time(rglob_file_finder, root)
+        walk, _ = best_time(walker_file_finder, root)
+        index, _ = best_time(lambda r: find_python_files("recursive", r), root)
+        print(f"{found} examples found among a 50k-file .venv")
+        print(f"rglob then filter:      {old:.4f}s")
+        print(f"pruning scandir:        {walk:.4f}s  ({old / walk:.0f}x faster)")
+        print(f"index, unchanged tree:  {index:.4f}s  ({old / index:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,41 @@
 # file_finder.py
+import os
 from functools import partial
 from pathlib import Path
 from typing import Literal, Optional, Generator, Iterable, Callable
 
+from pybooktools.find_files.file_index import indexed_files
+
+
+def walk_files(
+    start_search: Path,
+    recursive: bool,
+    exclude_dirs: set[str],
+) -> Generator[os.DirEntry, None, None]:
+    """
+    Yields a DirEntry for each file under start_search, depth first in directory
+    order. Excluded directories are pruned before they are entered, and the
+    type information scandir already has is used instead of a stat per path.
+    Symbolic links to directories are not followed, as with rglob().
+    """
+    pending = [start_search]
+    while pending:
+        directory = pending.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name in exclude_dirs:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError:  # Unreadable or vanished directory
+            continue
+        if recursive:
+            pending.extend(reversed(subdirs))
+
 
 def file_finder(
     depth: Literal["directory", "recursive"] = "directory",
@@ -15,23 +48,22 @@ def file_finder(
     exclude_dirs = set(exclude_dirs) if exclude_dirs else set()
     exclude_files = set(exclude_files) if exclude_files else set()
 
-    def yield_this(path: Path) -> bool:
-        if any(part in exclude_dirs for part in path.parts):
+    if any(part in exclude_dirs for part in start_search.parts):
+        return
+
+    def wanted(name: str) -> bool:
+        if name in exclude_files:
+            return False
+        if extensions and os.path.splitext(name)[1].lower() not in extensions:
             return False
-        if path.is_file():
-            if path.name in exclude_files:
-                return False
-            if extensions and path.suffix.lower() not in extensions:
-                return False
-            return True
-        return False
-
-    iterator = start_search.iterdir() if depth == "directory" else start_search.rglob("*")
-
-    for path in iterator:
-        if yield_this(path):
-            # print(path)
-            yield path
+        return True
+
+    if depth == "directory":
+        for entry in walk_files(start_search, False, exclude_dirs):
+            if wanted(entry.name):
+                yield Path(entry.path)
+    else:  # The persistent index avoids walking an unchanged tree again
+        yield from indexed_files(start_search, exclude_dirs, wanted)
 
 
 def curry_file_finder(
@@ -0,0 +1,195 @@
+# file_index.py
+"""
+Persistent, incrementally refreshed index of the files under a directory.
+
+For every directory the index records its mtime, its subdirectories and
+its files. Adding, removing or renaming an entry changes the mtime of its
+directory, so `refresh` re-scans only directories whose mtime differs from
+the recorded one; on an unchanged tree it stats each directory and lists
+nothing. A directory modified within a couple of seconds of a scan may
+change again within the same timestamp tick, so it is re-scanned next time
+regardless. (mtime, size, hash) records for files are kept alongside, in a
+separate store loaded only when a hash is requested; a hash is reused while
+the file's mtime and size are unchanged.
+
+Directories named in `prune` are never entered. An index is kept per root
+and prune set, so each tool gets an index matching its exclusions.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import pytest
+
+from pybooktools.util import config
+from pybooktools.util.disk_cache import write_atomic
+
+RACY_NS = 2_000_000_000  # Directories modified this close to a scan are re-scanned
+
+
+class FileIndex:
+    def __init__(
+        self,
+        root: Path,
+        prune: Iterable[str] = (),
+        cache_dir: Path = config.cache_dir / "file_index",
+    ):
+        self.root = root
+        self.prune = frozenset(prune)
+        self.resolved_root = root.resolve()
+        key = hashlib.sha256(f"{self.resolved_root}\0{sorted(self.prune)}".encode()).hexdigest()[:24]
+        self.store = cache_dir / f"{key}.json"
+        self.hash_store = cache_dir / f"{key}_hashes.json"
+        # "relative/dir" ("" for root) -> [mtime_ns, racy, [subdirectory names], [file names]]
+        self.dirs: dict[str, list] = self._load(self.store)
+        # "relative/file" -> [mtime_ns, size, sha256], loaded on first use
+        self._hashes: Optional[dict[str, list]] = None
+        self.changed = self.hashes_changed = False
+
+    @staticmethod
+    def _load(store: Path) -> dict:
+        try:
+            return json.loads(store.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _join(rel: str, name: str) -> str:
+        return f"{rel}/{name}" if rel else name
+
+    def _scan(self, rel: str, mtime_ns: int, scan_start: int) -> list:
+        dirs: list[str] = []
+        files: list[str] = []
+        with os.scandir(self.resolved_root / rel) as entries:
+            for entry in entries:
+                if entry.name in self.prune:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        return [mtime_ns, mtime_ns >= scan_start - RACY_NS, dirs, files]
+
+    def refresh(self) -> "FileIndex":
+        """Bring the index up to date, re-scanning only directories that changed."""
+        scan_start = time.time_ns()
+        current: dict[str, list] = {}
+        pending = [""]
+        while pending:
+            rel = pending.pop()
+            try:
+                mtime_ns = os.stat(self.resolved_root / rel).st_mtime_ns
+                record = self.dirs.get(rel)
+                if record is None or record[1] or record[0] != mtime_ns:
+                    record = self._scan(rel, mtime_ns, scan_start)
+                    self.changed = True
+            except OSError:  # Unreadable or vanished directory
+                continue
+            current[rel] = record
+            pending.extend(self._join(rel, name) for name in reversed(record[2]))
+        if current.keys() != self.dirs.keys():
+            self.changed = True
+        self.dirs = current
+        return self
+
+    def files(self, keep: Optional[Callable[[str], bool]] = None) -> list[Path]:
+        """
+        Every indexed file whose name passes `keep`, depth first in directory
+        order, as root / relative path.
+        """
+        found: list[Path] = []
+        pending = [""]
+        root = str(self.root)
+        while pending:
+            rel = pending.pop()
+            record = self.dirs.get(rel)
+            if record is None:
+                continue
+            prefix = os.path.join(root, rel, "")
+            found.extend(Path(prefix + name) for name in record[3] if keep is None or keep(name))
+            pending.extend(self._join(rel, name) for name in reversed(record[2]))
+        return found
+
+    def file_hash(self, path: Path) -> Optional[str]:
+        """
+        sha256 of path's content, reused while its mtime and size are
+        unchanged. None if path is not in the index.
+        """
+        try:
+            rel = path.resolve().relative_to(self.resolved_root).as_posix()
+        except ValueError:
+            return None
+        directory, _, name = rel.rpartition("/")
+        if name not in self.dirs.get(directory, [0, 0, [], []])[3]:
+            return None
+        if self._hashes is None:
+            self._hashes = self._load(self.hash_store)
+        stat = path.stat()
+        entry = self._hashes.get(rel)
+        if entry is None or entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+            entry = self._hashes[rel] = [stat.st_mtime_ns, stat.st_size, hashlib.sha256(path.read_bytes()).hexdigest()]
+            self.hashes_changed = True
+        return entry[2]
+
+    @staticmethod
+    def _save(store: Path, data: dict) -> None:
+        store.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(store, json.dumps(data))  # Concurrent tools never see half an index
+
+    def save(self) -> None:
+        if self.changed:
+            self._save(self.store, self.dirs)
+            self.changed = False
+        if self.hashes_changed:
+            self._save(self.hash_store, self._hashes)
+            self.hashes_changed = False
+
+
+def indexed_files(
+    root: Path,
+    prune: Iterable[str] = (),
+    keep: Optional[Callable[[str], bool]] = None,
+) -> list[Path]:
+    """Files under root outside pruned directories, from the refreshed, saved index."""
+    index = FileIndex(root, prune).refresh()
+    index.save()
+    return index.files(keep)
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_incremental_refresh(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    root = tmp_path / "book"
+    (root / "c01").mkdir(parents=True)
+    (root / ".venv" / "lib").mkdir(parents=True)
+    (root / "c01" / "a.py").write_text("A = 1\n", encoding="utf-8")
+    (root / ".venv" / "lib" / "v.py").write_text("", encoding="utf-8")
+    cache = tmp_path / "cache"
+
+    index = FileIndex(root, {".venv"}, cache).refresh()
+    assert index.files() == [root / "c01" / "a.py"]
+    assert index.file_hash(root / "c01" / "a.py") == hashlib.sha256(b"A = 1\n").hexdigest()
+    index.save()
+
+    for record in index.dirs.values():  # Pretend the scan was long ago
+        record[1] = False
+    index.changed = True
+    index.save()
+    index = FileIndex(root, {".venv"}, cache)
+    monkeypatch.setattr(os, "scandir", lambda path: pytest.fail(f"scanned {path}"))
+    assert index.refresh().files() == [root / "c01" / "a.py"]  # Unchanged: no directory listed
+    monkeypatch.undo()
+
+    (root / "c01" / "b.py").write_text("", encoding="utf-8")
+    assert sorted(index.refresh().files()) == [root / "c01" / "a.py", root / "c01" / "b.py"]
+    (root / "c01" / "a.py").write_text("A = 2\n", encoding="utf-8")
+    assert index.file_hash(root / "c01" / "a.py") == hashlib.sha256(b"A = 2\n").hexdigest()
+    assert index.file_hash(root / ".venv" / "lib" / "v.py") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
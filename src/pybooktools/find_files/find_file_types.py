@@ -1,7 +1,8 @@
 # find_file_types.py
 from pybooktools.find_files.file_finder import curry_file_finder
 
-# Exclude these directories from find_python_files().
+# Exclude these directories from find_python_files(), and from every other
+# search of a book's tree, so they all share one file index.
 EXCLUDE_DIRS = {
     "venv",
     ".venv",
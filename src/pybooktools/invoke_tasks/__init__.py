@@ -5,6 +5,7 @@ this package.
 
 from invoke import Collection
 
+from pybooktools.invoke_tasks.durations import durations
 from pybooktools.invoke_tasks.prettier import prettier
 from pybooktools.invoke_tasks.run_all import examples
 from pybooktools.invoke_tasks.semantic_breaks import rewrite_with_semantic_breaks
@@ -13,5 +14,6 @@ from pybooktools.invoke_tasks.validate_output import validate
 namespace = Collection(
     examples,
     validate,
+    durations,
     # rewrite_with_semantic_breaks,
 )
@@ -0,0 +1,76 @@
+# durations.py
+"""
+Report the slowest examples and the examples that got slower, from the
+run times `invoke examples` and `invoke validate` record.
+"""
+from pathlib import Path
+
+from invoke import task
+from rich.console import Console
+from rich.table import Table
+
+from pybooktools.run_scripts.duration_store import DurationStore
+
+console = Console()
+
+
+def relative(path: Path) -> str:
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
+
+
+@task(
+    help={
+        "tool": "Whose runs to report: examples or validate (default: examples).",
+        "count": "Number of slowest examples to list (default: 20).",
+        "factor": "Report examples now this many times slower than their recent median (default: 1.5).",
+    }
+)
+def durations(ctx, tool: str = "examples", count: int = 20, factor: float = 1.5) -> None:
+    """
+    Show the slowest examples as of their latest run,
+    and duration regressions: examples whose latest
+    run took `factor` times their recent median.
+    """
+    _ = ctx  # Silence warning
+    with DurationStore(tool) as store:
+        slowest = store.slowest(count)
+        regressions = store.regressions(factor)
+
+    if not slowest:
+        console.print(f"❗ No recorded runs of `invoke {tool}`.", style="bold red")
+        return
+    table = Table(title=f"Slowest examples ({tool})")
+    table.add_column("Example")
+    table.add_column("Status")
+    table.add_column("Wall (s)", justify="right")
+    table.add_column("CPU (s)", justify="right")
+    table.add_column("Peak RSS (MiB)", justify="right")
+    for timing in slowest:
+        table.add_row(
+            relative(timing.path),
+            timing.status,
+            f"{timing.usage.wall:.2f}",
+            "" if timing.usage.cpu is None else f"{timing.usage.cpu:.2f}",
+            "" if timing.usage.max_rss is None else f"{timing.usage.max_rss / 1024:.1f}",
+        )
+    console.print(table)
+
+    if regressions:
+        table = Table(title="Slower than usual")
+        table.add_column("Example")
+        table.add_column("Median (s)", justify="right")
+        table.add_column("Latest (s)", justify="right")
+        table.add_column("Change", justify="right")
+        for regression in regressions:
+            table.add_row(
+                relative(regression.path),
+                f"{regression.before:.2f}",
+                f"{regression.now:.2f}",
+                f"{regression.now / regression.before:.1f}x",
+            )
+        console.print(table)
+    else:
+        console.print("✅ No duration regressions.", style="bold green")
@@ -1,30 +1,19 @@
 # find_python_files.py
 from pathlib import Path
 
-# Directories to exclude from the search.
-EXCLUDED_DIRS = {
-    "venv",
-    ".venv",
-    "__pycache__",
-    ".git",
-    "python",
-    "invoke_tasks",
-    "xperiments",
-    "slidev",
-}
-EXCLUDED_FILES = {"__init__.py", "tasks.py", "bootstrap.py"}
+from pybooktools.find_files.file_finder import file_finder
+from pybooktools.find_files.find_file_types import EXCLUDE_DIRS, EXCLUDE_FILES
 
 
 def find_python_files(target_dir: Path) -> list[Path]:
     """
     Recursively find all Python files (*.py) in
-    target_dir, excepting exclusions.
+    target_dir, excepting exclusions. Uses the find_files index.
     """
-    python_files: list[Path] = []
-    for file in target_dir.rglob("*.py"):
-        if file.name in EXCLUDED_FILES:
-            continue
-        if any(ex_dir in file.parts for ex_dir in EXCLUDED_DIRS):
-            continue
-        python_files.append(file)
-    return python_files
+    return list(file_finder(
+        "recursive",
+        target_dir,
+        extensions={".py"},
+        exclude_files=EXCLUDE_FILES,
+        exclude_dirs=EXCLUDE_DIRS,
+    ))
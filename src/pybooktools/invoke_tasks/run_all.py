@@ -8,6 +8,7 @@ all jobs on first failure.
 """
 
 import sys
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Optional
 
@@ -15,7 +16,15 @@ from invoke import task
 from rich.console import Console
 
 from pybooktools.invoke_tasks.find_python_files import find_python_files
+from pybooktools.run_scripts.async_runner import run_scripts_concurrently
+from pybooktools.run_scripts.duration_store import DurationStore
+from pybooktools.run_scripts.fork_server import ForkServer
+from pybooktools.run_scripts.interpreter_pool import InterpreterPool
+from pybooktools.run_scripts.resource_usage import SORT_KEYS, usage_table
+from pybooktools.run_scripts.result_cache import ResultCache
 from pybooktools.run_scripts.run_all_scripts import run_scripts_parallel
+from pybooktools.run_scripts.script_pool import ScriptPool
+from pybooktools.util import config
 
 console = Console()
 
@@ -24,9 +33,31 @@ console = Console()
     help={
         "target_dir": "Directory to search for Python files (default: current directory).",
         "throttle_limit": "Maximum number of parallel processes (default: number of processors).",
+        "warm": "Run examples in a pool of warm interpreters instead of one interpreter per file.",
+        "fork": "Fork each example from one server that has already imported the preload modules (POSIX).",
+        "preload": "Comma-separated modules for --warm and --fork to import once (default: config.preload_modules).",
+        "subinterpreters": "Run examples in subinterpreters of one process (Python 3.14+), falling back to subprocesses.",
+        "use_asyncio": "Drive all running examples from one thread with asyncio instead of a thread per example.",
+        "no_cache": "Re-run every example, ignoring cached results of unchanged examples.",
+        "timeout": f"Seconds before a running example is killed; 0 for no limit (default: {config.example_timeout}).",
+        "sort_by": "Order the resource usage table by wall, cpu or rss (default: wall).",
+        "top": "Rows in the resource usage table; 0 for all (default: 15).",
     }
 )
-def examples(ctx, target_dir: str = ".", throttle_limit: Optional[int] = None) -> None:
+def examples(
+    ctx,
+    target_dir: str = ".",
+    throttle_limit: Optional[int] = None,
+    warm: bool = False,
+    fork: bool = False,
+    preload: Optional[str] = None,
+    subinterpreters: bool = False,
+    use_asyncio: bool = False,
+    no_cache: bool = False,
+    timeout: float = config.example_timeout,
+    sort_by: str = "wall",
+    top: int = 15,
+) -> None:
     """
     Run all Python scripts in a directory tree in
     parallel.
@@ -40,8 +71,41 @@ def examples(ctx, target_dir: str = ".", throttle_limit: Optional[int] = None) -
     task stops further execution and prints an
     error message.
 
+    With --warm, each worker interpreter starts once and
+    preloads common imports, which removes most of the
+    per-example startup cost.
+
+    With --fork, one server imports the preload modules once
+    and forks a child for each example, which starts with
+    them already imported and runs in a process of its own.
+    --preload replaces the modules --warm and --fork import.
+
+    With --subinterpreters, examples run in parallel
+    subinterpreters inside this process; any example a
+    subinterpreter can't run goes to a subprocess.
+
+    With --use-asyncio, examples run as asyncio subprocesses
+    from a single thread, with output read as it arrives.
+
+    Results of unchanged examples are reused from the
+    cache in .pybooktools_cache unless --no-cache is given.
+
+    Each example's run time is recorded there too, and the
+    next run starts the examples that failed last time
+    first, then the slowest (see `invoke durations`).
+
+    An example still running after --timeout seconds is
+    killed and reported as timed out. On the first
+    failure, the examples still running are killed.
+
+    Finally, a table shows the wall time, CPU time and
+    peak memory of the examples that ran, largest
+    --sort-by first.
     """
     _ = ctx  # Turns off "value is not used" warning
+    if sort_by not in SORT_KEYS:
+        console.print(f"❗ --sort-by must be one of {', '.join(SORT_KEYS)}", style="bold red")
+        sys.exit(1)
     target_path = Path(target_dir).resolve()
     console.print(f"🔍 Searching for Python files in: {target_path}", style="yellow")
 
@@ -50,7 +114,29 @@ def examples(ctx, target_dir: str = ".", throttle_limit: Optional[int] = None) -
         console.print("❗ No Python files found.", style="bold red")
         sys.exit(1)
 
-    results = run_scripts_parallel(python_files)
+    cache = None if no_cache else ResultCache()
+    limit = timeout or None
+    modules = [name for name in preload.split(",") if name] if preload is not None else config.preload_modules
+    with DurationStore("examples") as durations:
+        if warm:
+            pool = ScriptPool(throttle_limit, modules)
+        elif fork:
+            pool = ForkServer(modules)
+        elif subinterpreters:
+            pool = InterpreterPool(throttle_limit)
+        else:
+            pool = None
+        with pool or nullcontext():
+            if use_asyncio and pool is None:
+                results = run_scripts_concurrently(
+                    python_files, throttle_limit, cache=cache, timeout=limit, durations=durations
+                )
+            else:
+                results = run_scripts_parallel(
+                    python_files, throttle_limit, pool=pool, cache=cache, timeout=limit, durations=durations
+                )
+        if ran := durations.this_run():
+            console.print(usage_table([(t.path, t.usage) for t in ran], sort_by, top))
 
     if any(res.return_code != 0 for res in results):
         console.print("\n❌ One or more scripts failed.", style="bold red")
@@ -5,7 +5,6 @@ actual output to expected ## comments.
 """
 import os
 import re
-import subprocess
 import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from difflib import Differ
@@ -17,7 +16,15 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
 
+from pybooktools.find_files.file_index import FileIndex
+from pybooktools.find_files.find_file_types import EXCLUDE_DIRS
 from pybooktools.invoke_tasks.find_python_files import find_python_files
+from pybooktools.run_scripts.duration_store import DurationStore
+from pybooktools.run_scripts.import_graph import ImportGraph
+from pybooktools.run_scripts.resource_usage import SORT_KEYS, usage_table
+from pybooktools.run_scripts.result_cache import ResultCache, script_key
+from pybooktools.run_scripts.run_one_script import capture, decode_output
+from pybooktools.run_scripts.script_result import ScriptResult
 
 console = Console()
 
@@ -68,11 +75,19 @@ class Result(NamedTuple):
     failed: bool = False
 
 
-def run_and_compare(file: Path, interpreter: str) -> Result:
+def run_and_compare(
+    file: Path,
+    interpreter: str,
+    cache: ResultCache | None = None,
+    durations: DurationStore | None = None,
+) -> Result:
     """
     Run a Python script using the specified
     interpreter, compare its output to the
     expected output, and return a result object.
+    If the script is unchanged since a successful
+    run, its output comes from `cache`. Each run
+    is timed into `durations`.
     """
 
     def succeed() -> Result:
@@ -81,32 +96,43 @@ def run_and_compare(file: Path, interpreter: str) -> Result:
     def fail(msg: str = "") -> Result:
         return Result(msg=msg, failed=True)
 
-    try:
-        result = subprocess.run(
-            [interpreter, str(file)],
-            capture_output=True,
-            text=True,
-            check=False,
-        )
-    except Exception as e:
-        return fail(
-            f"{file}\n[bold red]\u274c Exception trying to run {file.name}:[/bold red] {e}"
-        )
-
-    if result.returncode != 0:
-        return fail(
-            f"{file}\n[bold red]\u274c {result.returncode = }: [/bold red]\n{result.stderr}"
-        )
+    key = ""
+    cached: ScriptResult | None = None
+    if cache:
+        key = script_key(cache, file, interpreter, os.environ.get("PYTHONPATH", ""))
+        cached = cache.get(key)
+
+    if cached:
+        stdout = cached.result_value
+    else:
+        try:
+            result = capture([interpreter, str(file)], os.environ.copy())
+        except Exception as e:
+            return fail(
+                f"{file}\n[bold red]\u274c Exception trying to run {file.name}:[/bold red] {e}"
+            )
+        if durations:
+            status = result.stopped or ("ok" if result.return_code == 0 else "failed")
+            durations.record(file, status, result.usage)
+
+        if result.stopped == "truncated":
+            return fail(f"{file}\n[bold red]\u274c Output over the limit, killed[/bold red]")
+        if result.return_code != 0:
+            return fail(
+                f"{file}\n[bold red]\u274c {result.return_code = }: [/bold red]\n"
+                f"{decode_output(result.stderr, errors='replace')}"
+            )
+        stdout = decode_output(result.stdout)
 
     expected: set[str] = extract_expected_output(file)
-    actual: set[str] = actual_output_set(result.stdout)
+    actual: set[str] = actual_output_set(stdout)
     if actual != expected:
         diff_panel = rich_diff("\n".join(sorted(expected)), "\n".join(sorted(actual)), file.name)
         console.print(diff_panel)
         msg = (
             f"{file}\n[bold red]\u274c Output mismatch.[/bold red]\n"
             f"[yellow]Expected (from ## comments):[/yellow] {sorted(expected)}\n"
-            f"[green]Actual (stdout):[/green]\n{result.stdout}\n"
+            f"[green]Actual (stdout):[/green]\n{stdout}\n"
             f"[magenta]Actual (parsed):[/magenta] {sorted(actual)}\n"
             f"[red]Missing:[/red] {sorted(expected - actual)}\n"
             f"[blue]Unexpected:[/blue] {sorted(actual - expected)}"
@@ -114,6 +140,8 @@ def run_and_compare(file: Path, interpreter: str) -> Result:
         console.print(Panel(msg, title=f"Comparison: {file.name}", border_style="red"))
         return fail(f"[bold red]{file}[/bold red]")
 
+    if cache and not cached:
+        cache.put(key, ScriptResult(0, stdout))
     return succeed()
 
 
@@ -121,18 +149,41 @@ def run_and_compare(file: Path, interpreter: str) -> Result:
     help={
         "target_dir": "Directory to search for Python files (default: current directory).",
         "throttle_limit": "Max number of parallel workers (default: number of CPU cores).",
+        "no_cache": "Re-run every example, ignoring cached results of unchanged examples.",
+        "changed": "Only validate examples affected by edits since the last run.",
+        "sort_by": "Order the resource usage table by wall, cpu or rss (default: wall).",
+        "top": "Rows in the resource usage table; 0 for all (default: 15).",
     }
 )
-def validate(ctx, target_dir: str = ".", throttle_limit: int | None = None) -> None:
+def validate(
+    ctx,
+    target_dir: str = ".",
+    throttle_limit: int | None = None,
+    no_cache: bool = False,
+    changed: bool = False,
+    sort_by: str = "wall",
+    top: int = 15,
+) -> None:
     """
     Run Python example scripts and compare actual
     output to expected ## comments.
 
     Ignores whitespace, supports parallel
     execution, and uses the active interpreter.
+    Output of unchanged examples comes from the
+    cache unless --no-cache is given. With --changed,
+    only examples whose source or imported local
+    modules changed since the last run are validated.
+    Examples that failed last time start first, then
+    the slowest (see `invoke durations`). A table of
+    the wall time, CPU time and peak memory of the
+    examples that ran follows, largest --sort-by first.
 
     """
     _ = ctx  # Silence warning
+    if sort_by not in SORT_KEYS:
+        console.print(f"❗ --sort-by must be one of {', '.join(SORT_KEYS)}", style="bold red")
+        sys.exit(1)
     interpreter = sys.executable
     root = Path(target_dir).resolve()
     console.print(f"🐍 Using interpreter: {interpreter}", style="green")
@@ -143,6 +194,14 @@ def validate(ctx, target_dir: str = ".", throttle_limit: int | None = None) -> N
         console.print("❗ No Python files found.", style="bold red")
         sys.exit(1)
 
+    graph = ImportGraph("validate", index=FileIndex(root, EXCLUDE_DIRS).refresh()) if changed else None
+    if graph:
+        files = graph.affected(files)
+        if not files:
+            graph.save()
+            console.print("\n✅ No examples affected by changes.", style="bold green")
+            return
+
     if throttle_limit is None:
         throttle_limit = os.cpu_count() or 4
 
@@ -151,15 +210,28 @@ def validate(ctx, target_dir: str = ".", throttle_limit: int | None = None) -> N
         style="cyan",
     )
 
+    cache = None if no_cache else ResultCache()
     discrepancies: list[str] = []
-    with ThreadPoolExecutor(max_workers=throttle_limit) as executor:
+    succeeded: list[Path] = []
+    failed: list[Path] = []
+    with DurationStore("validate") as durations, ThreadPoolExecutor(max_workers=throttle_limit) as executor:
         futures = {
-            executor.submit(run_and_compare, file, interpreter): file for file in files
+            executor.submit(run_and_compare, file, interpreter, cache, durations): file
+            for file in durations.schedule(files)
         }
         for future in as_completed(futures):
             result = future.result()
             if result.failed:
                 discrepancies.append(result.msg)
+                failed.append(futures[future])
+            else:
+                succeeded.append(futures[future])
+        if ran := durations.this_run():
+            console.print(usage_table([(t.path, t.usage) for t in ran], sort_by, top))
+
+    if graph:
+        graph.record(succeeded, failed)
+        graph.save()
 
     if discrepancies:
         console.rule(f"\n❗{len(discrepancies)} Output discrepancies", style="bold red")
@@ -0,0 +1,257 @@
+# chapter_model.py
+"""
+One parsed model of a Markdown chapter, shared by mdvalid, mdextract,
+mdinject and mdslug.
+
+A chapter is scanned once for its fenced blocks (see fenced_blocks), their
+first lines and slug lines, and its headings. The model is kept in memory
+for the rest of the process and persisted under the cache directory, keyed
+on the file's mtime and size, so a validate → extract → run → inject cycle
+parses each chapter once. Offsets are bytes into the chapter file; text
+is only read and decoded when a block's content is used.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Mapping, TypeVar
+
+import pytest
+
+from pybooktools.md_examples.fenced_blocks import FencedBlock, scan_fenced_blocks
+from pybooktools.util import config
+from pybooktools.util.config import default_slug_line_pattern
+from pybooktools.util.disk_cache import write_atomic
+
+
+def decode(data: bytes) -> str:
+    return data.decode("utf-8")
+
+
+class BlockInfo(NamedTuple):
+    fence_tag: str
+    start: int
+    content_start: int
+    content_end: int
+    end: int
+    start_line: int
+    end_line: int
+    first_line: str  # First line of content, where the slug line belongs
+    slug: Optional[str]  # File name from the slug line, if there is one
+
+
+class Heading(NamedTuple):
+    level: int
+    title: str
+    line: int
+    offset: int
+
+
+@dataclass
+class Chapter:
+    path: Path
+    mtime_ns: int
+    size: int
+    block_info: list[BlockInfo]
+    headings: list[Heading]
+
+    @cached_property
+    def data(self) -> bytes:
+        return self.path.read_bytes()
+
+    @cached_property
+    def blocks(self) -> list[FencedBlock]:
+        """The fenced blocks, in order, reading the file on first use."""
+        return [
+            FencedBlock(
+                info.fence_tag, info.start, info.content_start, info.content_end, info.end,
+                info.start_line, info.end_line, self.data, decode,
+            )
+            for info in self.block_info
+        ]
+
+    def indent(self, i: int) -> str:
+        """The whitespace before block i's opening fence, as in a list item."""
+        start = self.block_info[i].start
+        line = self.data[start:self.data.index(b"```", start)]
+        return decode(line)
+
+    def splice(self, replacements: Mapping[int, str]) -> str:
+        """
+        The chapter text with block i (fences included) replaced by
+        replacements[i], written without the block's indent: splice indents
+        each of its non-blank lines as the opening fence was. Line endings
+        are normalized as read_text() does.
+        """
+        pieces: list[str] = []
+        position = 0
+        for i, replacement in sorted(replacements.items()):
+            info = self.block_info[i]
+            pieces.append(decode(self.data[position:info.start]))
+            if indent := self.indent(i):
+                replacement = "\n".join(indent + line if line.strip() else line for line in replacement.split("\n"))
+            pieces.append(replacement)
+            position = info.end
+        pieces.append(decode(self.data[position:]))
+        return "".join(pieces).replace("\r\n", "\n").replace("\r", "\n")
+
+    def to_json(self) -> dict:
+        return {
+            "path": str(self.path),
+            "mtime_ns": self.mtime_ns,
+            "size": self.size,
+            "blocks": [list(info) for info in self.block_info],
+            "headings": [list(heading) for heading in self.headings],
+        }
+
+    @classmethod
+    def from_json(cls, path: Path, data: dict) -> "Chapter":
+        return cls(
+            path,
+            data["mtime_ns"],
+            data["size"],
+            [BlockInfo(*info) for info in data["blocks"]],
+            [Heading(*heading) for heading in data["headings"]],
+        )
+
+
+def parse_chapter(path: Path, stat: os.stat_result) -> Chapter:
+    data = path.read_bytes()
+    block_info: list[BlockInfo] = []
+    for block in scan_fenced_blocks(data, decode):
+        first_end = data.find(b"\n", block.content_start, block.content_end)
+        if first_end == -1:
+            first_end = block.content_end
+        first_line = next(iter(decode(data[block.content_start:first_end]).splitlines()), "")
+        match = default_slug_line_pattern.match(first_line)
+        block_info.append(BlockInfo(
+            block.fence_tag, block.start, block.content_start, block.content_end, block.end,
+            block.start_line, block.end_line, first_line, match.group(1) if match else None,
+        ))
+    headings: list[Heading] = []
+    blocks = iter(block_info)
+    block = next(blocks, None)
+    line, counted = 1, 0
+    at = 0 if data.startswith(b"#") else data.find(b"\n#")
+    while at != -1:
+        start = at if at == 0 and data.startswith(b"#") else at + 1
+        while block is not None and block.end < start:
+            block = next(blocks, None)
+        end = data.find(b"\n", start)
+        end = len(data) if end == -1 else end
+        if block is None or start < block.start:  # Not inside a code block
+            marks, _, title = decode(data[start:end]).rstrip("\r").partition(" ")
+            if set(marks) == {"#"} and len(marks) <= 6:
+                line += data.count(b"\n", counted, start)
+                counted = start
+                headings.append(Heading(len(marks), title.strip(), line, start))
+        at = data.find(b"\n#", end)
+    return Chapter(path, stat.st_mtime_ns, stat.st_size, block_info, headings)
+
+
+_loaded: dict[Path, Chapter] = {}
+
+
+def load_chapter(markdown_file: Path, cache_dir: Path = config.cache_dir / "chapters") -> Chapter:
+    """
+    The model of markdown_file: from memory or the cache directory if the file
+    is unchanged, otherwise parsed and stored.
+    """
+    path = markdown_file.resolve()
+    stat = path.stat()
+
+    def current(chapter: Optional[Chapter]) -> bool:
+        return chapter is not None and (chapter.mtime_ns, chapter.size) == (stat.st_mtime_ns, stat.st_size)
+
+    if current(chapter := _loaded.get(path)):
+        return chapter
+    entry = cache_dir / f"{hashlib.sha256(str(path).encode()).hexdigest()}.json"
+    try:
+        chapter = Chapter.from_json(path, json.loads(entry.read_text(encoding="utf-8")))
+    except (OSError, ValueError, KeyError, TypeError):
+        chapter = None
+    if not current(chapter):
+        chapter = parse_chapter(path, stat)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(entry, json.dumps(chapter.to_json()))  # Concurrent tools never see half an entry
+    _loaded[path] = chapter
+    return chapter
+
+
+T = TypeVar("T")
+
+
+def map_chapters(func: Callable[[Path], T], markdown_files: Iterable[Path], jobs: int = 1) -> Iterator[T]:
+    """
+    Yields func(chapter) for each of markdown_files, in order, running up to
+    `jobs` chapters at once in separate processes. func must be picklable:
+    a module-level function or a partial of one.
+    """
+    markdown_files = list(markdown_files)
+    if jobs <= 1 or len(markdown_files) <= 1:
+        yield from map(func, markdown_files)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(func, markdown_files)
+
+
+# --------------------------- TESTS ---------------------------
+
+chapter_md = """# Chapter One
+
+Text with a # hash.
+
+```python
+# example_1.py
+print("One")
+```
+
+## Section
+
+```python
+print("No slug")
+# Not a heading
+```
+"""
+
+
+def test_chapter_model(tmp_path: Path):
+    md_file = tmp_path / "C01_One.md"
+    md_file.write_text(chapter_md, encoding="utf-8")
+    chapter = load_chapter(md_file, tmp_path / "cache")
+    assert [info.slug for info in chapter.block_info] == ["example_1.py", None]
+    assert chapter.block_info[1].first_line == 'print("No slug")'
+    assert [(h.level, h.title, h.line) for h in chapter.headings] == [(1, "Chapter One", 1), (2, "Section", 10)]
+    assert chapter.blocks[0].content == '# example_1.py\nprint("One")'
+    assert chapter.splice({0: "```python\n# example_1.py\nprint(1)\n```"}) == chapter_md.replace(
+        'print("One")', "print(1)"
+    )
+
+
+def test_splice_keeps_the_indent(tmp_path: Path):
+    md_file = tmp_path / "C02_Two.md"
+    md_file.write_text("1. A list item:\n\n   ```python\n   print(1)\n\n   print(2)\n   ```\n2. Next\n", encoding="utf-8")
+    chapter = load_chapter(md_file, tmp_path / "cache")
+    assert chapter.indent(0) == "   "
+    assert chapter.splice({0: "```python\n# example_1.py\nprint(3)\n\nprint(4)\n```"}) == (
+        "1. A list item:\n\n   ```python\n   # example_1.py\n   print(3)\n\n   print(4)\n   ```\n2. Next\n"
+    )
+
+
+def test_chapter_model_is_reused(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    md_file = tmp_path / "C01_One.md"
+    md_file.write_text(chapter_md, encoding="utf-8")
+    first = load_chapter(md_file, tmp_path / "cache")
+    _loaded.clear()  # As in a new process
+    monkeypatch.setattr(__name__ + ".parse_chapter", lambda *args: pytest.fail("parsed again"))
+    assert load_chapter(md_file, tmp_path / "cache").block_info == first.block_info
+    monkeypatch.undo()
+    md_file.write_text(chapter_md + "\n# Another\n", encoding="utf-8")
+    assert load_chapter(md_file, tmp_path / "cache").headings[-1].title == "Another"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -7,6 +7,7 @@ from typing import List, Pattern, Set, Callable, Optional
 
 import pytest
 
+from pybooktools.md_examples.chapter_model import load_chapter
 from pybooktools.md_examples.fenced_blocks import FenceTypes, fenced_blocks_with_tags, fenced_blocks
 from pybooktools.util.config import default_slug_line_pattern
 
@@ -90,20 +91,19 @@ def examples_with_sluglines(
     fence_tags: Optional[Set[FenceTypes]] = None,
 ) -> List[Example]:
     source_path = markdown_source.resolve()
-    markdown_content = markdown_source.read_text(encoding="utf-8")
+    chapter = load_chapter(markdown_source)
 
     return [
         Example(
             slug_filename=match.group(1),
-            example_body="\n".join(block.content.splitlines()).rstrip() + "\n",
+            example_body=block.content.rstrip() + "\n",
             parent_code_dir=code_repo_root,
             fence_tag=block.fence_tag,
             md_source_path=source_path,
         )
-        for block in fenced_blocks_with_tags(markdown_content, fence_tags)
-        if (fence_tags is None or block.fence_tag in fence_tags)
-        if (lines := block.content.splitlines())
-        if (match := slug_pattern.match(lines[0]))
+        for info, block in zip(chapter.block_info, chapter.blocks)
+        if info.fence_tag and (fence_tags is None or info.fence_tag in fence_tags)
+        if (match := slug_pattern.match(info.first_line))
         if ("_.py" is not match.group(1))  # Do not extract unfinished examples
     ]
 
@@ -117,7 +117,7 @@ def examples_without_sluglines(markdown_content: str, fence_tags: Optional[Set[F
     return [
         example.raw
         for example in fenced_blocks_with_tags(markdown_content, fence_tags)
-        if (lines := example.content.splitlines()) and not default_slug_line_pattern.match(lines[0])
+        if example.content and not default_slug_line_pattern.match(example.content.partition("\n")[0])
     ]
 
 
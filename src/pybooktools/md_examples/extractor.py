@@ -1,12 +1,16 @@
 # extractor.py
 """Extract code examples from Markdown files."""
+from functools import partial
 from pathlib import Path
+from typing import Annotated
 
-from cyclopts import App
+from cyclopts import App, Parameter
 from cyclopts.types import ResolvedExistingDirectory
 from rich.console import Console
 
 from pybooktools.md_examples import write_examples, examples_with_sluglines
+from pybooktools.md_examples.chapter_model import map_chapters
+from pybooktools.md_examples.examples import Example
 
 console = Console()
 
@@ -20,17 +24,57 @@ app = App(
 )
 
 
+def write_chapter(markdown_file: Path, examples: list[Example]) -> None:
+    console.rule(markdown_file.name)
+    write_examples(examples)
+
+
 @app.command(name="-e")
 def extract(markdown_file: Path, target_dir: Path):
     """Extract examples from a single markdown file to target_dir."""
-    console.rule(markdown_file.name)
-    examples = examples_with_sluglines(markdown_file, target_dir)
-    write_examples(examples)
+    write_chapter(markdown_file, examples_with_sluglines(markdown_file, target_dir))
 
 
 @app.command(name="-d")
-def extract_directory(markdown_dir: ResolvedExistingDirectory, target_dir: Path):
+def extract_directory(
+        markdown_dir: ResolvedExistingDirectory,
+        target_dir: Path,
+        jobs: Annotated[int, Parameter(name="-j", help="Chapters to extract at once")] = 1,
+):
     """Extract examples from all markdown files in a directory to target_dir."""
     console.rule(f"  extracting to {target_dir}  ")
-    for markdown_file in list(markdown_dir.glob("*.md")):
-        extract(markdown_file, target_dir)
+    markdown_files = list(markdown_dir.glob("*.md"))
+    chapter_examples = map_chapters(
+        partial(examples_with_sluglines, code_repo_root=target_dir), markdown_files, jobs
+    )
+    # Chapters are parsed in parallel but written here in the same order as
+    # one at a time, so the last example with a given destination still wins.
+    for markdown_file, examples in zip(markdown_files, chapter_examples):
+        write_chapter(markdown_file, examples)
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_parallel_extraction_matches_serial(tmp_path: Path):
+    book = tmp_path / "book"
+    book.mkdir()
+    for n in range(1, 4):
+        (book / f"C0{n}_Chapter.md").write_text(
+            f"# Chapter {n}\n\n```python\n# twice.py\nprint('first in {n}')\n```\n\n"
+            f"```python\n# twice.py\nprint('last in {n}')\n```\n\n"
+            f"```python\n# shared/common.py\nprint({n})\n```\n",
+            encoding="utf-8",
+        )
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    extract_directory(book, serial)
+    extract_directory(book, parallel, jobs=2)
+    # The last example with a destination wins, within a chapter and across chapters:
+    assert (serial / "c02_chapter" / "twice.py").read_text(encoding="utf-8").endswith("print('last in 2')\n")
+    last = list(book.glob("*.md"))[-1].stem[2]
+    assert (serial / "shared" / "common.py").read_text(encoding="utf-8").endswith(f"print({last})\n")
+    assert {
+        path.relative_to(serial): path.read_text(encoding="utf-8") for path in serial.rglob("*.py")
+    } == {
+        path.relative_to(parallel): path.read_text(encoding="utf-8") for path in parallel.rglob("*.py")
+    }
@@ -1,14 +1,171 @@
 # fenced_blocks.py
+"""
+Streaming scanner for ``` fenced blocks.
+
+A file is memory-mapped and searched for fences directly, so prose between
+blocks is never copied. Each FencedBlock records its offsets (bytes for a
+file, characters for a string) and line numbers; its text is only sliced
+out and decoded when `content` or `raw` is first used. Lines end where
+str.splitlines() ends them.
+"""
+import mmap
+import re
+import weakref
 from pathlib import Path
-from typing import Generator, NamedTuple, Optional, Literal
+from typing import Generator, Iterator, Optional, Literal, Callable
 
 FenceTypes = Literal["python", "pyi", "cpp", "java", "bash", "js"]
 
+Source = str | bytes | mmap.mmap
+
+
+class FencedBlock:
+    """
+    Behaves as the tuple (content, fence_tag, raw) for unpacking, indexing
+    and comparison, with the text decoded on first use.
+    """
+    __slots__ = (
+        "fence_tag", "start", "content_start", "content_end", "end",
+        "start_line", "end_line", "_source", "_decode", "_content", "_raw", "__weakref__",
+    )
+    _fields = ("content", "fence_tag", "raw")
+
+    def __init__(
+        self,
+        fence_tag: str,  # Name after three backticks, if it exists
+        start: int,  # Offset of the opening fence line
+        content_start: int,  # Offset of the first line after the opening fence
+        content_end: int,  # Offset of the closing fence line
+        end: int,  # Offset of the end of the closing fence line
+        start_line: int,  # 1-based line number of the opening fence
+        end_line: int,  # 1-based line number of the closing fence
+        source: Source,
+        decode: Callable[[Source], str],
+    ):
+        self.fence_tag = fence_tag
+        self.start = start
+        self.content_start = content_start
+        self.content_end = content_end
+        self.end = end
+        self.start_line = start_line
+        self.end_line = end_line
+        self._source: Optional[Source] = source
+        self._decode = decode
+        self._content: Optional[str] = None
+        self._raw: Optional[str] = None
+
+    def _text(self, start: int, end: int) -> str:
+        return "\n".join(self._decode(self._source[start:end]).splitlines())
+
+    @property
+    def content(self) -> str:
+        """Content within fences"""
+        if self._content is None:
+            self._content = self._text(self.content_start, self.content_end)
+        return self._content
+
+    @property
+    def raw(self) -> str:
+        """Entire block including fences"""
+        if self._raw is None:
+            self._raw = self._text(self.start, self.end)
+        return self._raw
+
+    def _detach(self) -> None:
+        """Copy out the text before the scanned source is closed."""
+        _ = self.content, self.raw
+        self._source = None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter((self.content, self.fence_tag, self.raw))
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
 
-class FencedBlock(NamedTuple):
-    content: str  # Content within fences
-    fence_tag: str  # Name after three backticks, if it exists
-    raw: str  # Entire block including fences
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (FencedBlock, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f"FencedBlock(content={self.content!r}, fence_tag={self.fence_tag!r}, raw={self.raw!r})"
+
+
+# Line boundaries of str.splitlines() other than "\n" and "\r\n"; if a
+# source has none, lines can be found by searching for "\n" alone:
+_other_breaks_str = re.compile("\r(?!\n)|[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_other_breaks_bytes = re.compile(rb"\r(?!\n)|[\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")  # UTF-8
+_breaks_str = re.compile("\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_breaks_bytes = re.compile(rb"\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
+FenceLine = tuple[int, int, int, int, int]  # start, fence offset, end (before the break), next line, line number
+
+
+def _fence_lines_by_newline(source: Source, decode: Callable[[Source], str]) -> Iterator[FenceLine]:
+    """The fence lines of a source whose only line breaks are "\n" and "\r\n", jumping between candidates."""
+    text = isinstance(source, str)
+    newline, fence, cr = ("\n", "```", "\r") if text else (b"\n", b"```", b"\r")
+    search = 0  # Always the start of a line
+    counted, line = 0, 1  # line is the number of the line starting at counted
+    while (at := source.find(fence, search)) != -1:
+        line_start = max(search, source.rfind(newline, search, at) + 1)
+        line_end = source.find(newline, at)
+        next_line = len(source) if line_end == -1 else line_end + 1
+        if line_end == -1:
+            line_end = len(source)
+        search = next_line
+        if decode(source[line_start:at]).strip():  # Not the first thing on its line
+            continue
+        line += source[counted:line_start].count(newline)  # Only the gap since the last fence
+        counted = line_start
+        if source[line_end - 1:line_end] == cr:
+            line_end -= 1
+        yield line_start, at, line_end, next_line, line
+
+
+def _fence_lines_by_line(source: Source, decode: Callable[[Source], str]) -> Iterator[FenceLine]:
+    """The fence lines of any source, visiting every line."""
+    fence, breaks = ("```", _breaks_str) if isinstance(source, str) else (b"```", _breaks_bytes)
+
+    def lines() -> Iterator[tuple[int, int, int]]:
+        line_start = 0
+        for match in breaks.finditer(source):
+            yield line_start, match.start(), match.end()
+            line_start = match.end()
+        if line_start < len(source):
+            yield line_start, len(source), len(source)
+
+    for line, (line_start, line_end, next_line) in enumerate(lines(), start=1):
+        at = source.find(fence, line_start, line_end)
+        if at != -1 and not decode(source[line_start:at]).strip():
+            yield line_start, at, line_end, next_line, line
+
+
+def scan_fenced_blocks(source: Source, decode: Callable[[Source], str] = str) -> Generator[FencedBlock]:
+    """
+    Yields the fenced blocks in source, jumping from one candidate fence to
+    the next. A fence is a line whose first non-blank characters are ```,
+    and an unterminated block is not yielded, as before.
+    """
+    other_breaks = _other_breaks_str if isinstance(source, str) else _other_breaks_bytes
+    fence_lines = _fence_lines_by_line if other_breaks.search(source) else _fence_lines_by_newline
+    opening: Optional[tuple[int, int, int, str]] = None
+    for line_start, at, line_end, next_line, line in fence_lines(source, decode):
+        if opening is None:
+            opening = (line_start, next_line, line, decode(source[at + 3:line_end]).strip())
+            continue
+        start, content_start, start_line, fence_tag = opening
+        yield FencedBlock(
+            fence_tag, start, content_start, line_start, line_end,
+            start_line, line, source, decode,
+        )
+        opening = None
 
 
 def fenced_blocks(markdown: Path | str) -> Generator[FencedBlock]:
@@ -17,35 +174,26 @@ def fenced_blocks(markdown: Path | str) -> Generator[FencedBlock]:
     Accepts either a Path to a markdown file or the markdown example_body as a string.
     Each block is yielded as a FencedBlock, containing the example_body inside the fence,
     the fence tag (e.g., 'python' for ```python), and the raw fenced block text.
+    A file is memory-mapped rather than read; blocks still alive when the scan
+    ends copy out their text, so they remain usable after the file is closed.
     """
-    if isinstance(markdown, Path):
-        lines = markdown.read_text(encoding="utf-8").splitlines()
-    else:
-        lines = markdown.splitlines()
-
-    in_fence = False
-    fence_tag = ""
-    block_lines: list[str] = []
-    raw_lines: list[str] = []
-
-    for line in lines:
-        stripped = line.lstrip()
-        if stripped.startswith("```"):
-            raw_lines.append(line)
-            if in_fence:
-                content = "\n".join(block_lines)
-                raw = "\n".join(raw_lines)
-                yield FencedBlock(content=content, fence_tag=fence_tag, raw=raw)
-                in_fence = False
-                fence_tag = ""
-                block_lines.clear()
-                raw_lines.clear()
-            else:
-                in_fence = True
-                fence_tag = stripped[3:].strip()
-        elif in_fence:
-            block_lines.append(line)
-            raw_lines.append(line)
+    if not isinstance(markdown, Path):
+        yield from scan_fenced_blocks(markdown)
+        return
+    with markdown.open("rb") as f:
+        if f.seek(0, 2) == 0:  # Empty files cannot be mapped
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    yielded: list[weakref.ref[FencedBlock]] = []
+    try:
+        for block in scan_fenced_blocks(mapped, lambda data: data.decode("utf-8")):
+            yielded.append(weakref.ref(block))
+            yield block
+    finally:
+        for ref in yielded:
+            if (block := ref()) is not None:
+                block._detach()
+        mapped.close()
 
 
 def fenced_blocks_with_tags(
@@ -116,6 +264,72 @@ No tag
     assert blocks[0].raw.strip().endswith("```")
 
 
+def test_offsets_and_line_numbers():
+    md = "Intro\n\n```python\nx = 1\n```\nText with ``` inline\n  ```\nindented\n  ```\n"
+    blocks = list(fenced_blocks(md))
+    assert len(blocks) == 2
+    assert (blocks[0].start_line, blocks[0].end_line) == (3, 5)
+    assert md[blocks[0].start:blocks[0].end] == "```python\nx = 1\n```"
+    assert (blocks[1].start_line, blocks[1].end_line) == (7, 9)
+    assert blocks[1].content == "indented"
+
+
+def test_file_matches_string(tmp_path):
+    md = "# Title\r\n```python\r\n# a.py\r\nprint('é')\r\n\r\n```\r\nEnd\r\n```\r\nunterminated\r\n"
+    md_file = tmp_path / "chapter.md"
+    md_file.write_bytes(md.encode("utf-8"))
+    from_file = list(fenced_blocks(md_file))  # Scan finished: text copied out, file closed
+    from_string = list(fenced_blocks(md))
+    assert len(from_file) == len(from_string) == 1
+    assert from_file[0].content == from_string[0].content == "# a.py\nprint('é')\n"
+    assert from_file[0].raw == from_string[0].raw == "```python\n# a.py\nprint('é')\n\n```"
+    assert from_file[0].start_line == 2
+    assert list(fenced_blocks(tmp_path / "chapter.md")) and not list(fenced_blocks(""))
+
+
+def test_behaves_as_a_tuple():
+    block = next(fenced_blocks("```python\nx = 1\n```\n"))
+    content, fence_tag, raw = block
+    assert (content, fence_tag, raw) == ("x = 1", "python", "```python\nx = 1\n```")
+    assert block[0] == content and block[-1] == raw and len(block) == 3
+    assert block == (content, fence_tag, raw) == next(fenced_blocks("```python\nx = 1\n```"))
+    assert len({block, next(fenced_blocks("```python\nx = 1\n```"))}) == 1
+
+
+def _blocks_by_splitlines(markdown: str) -> list[tuple[str, str, str]]:
+    """The original line-by-line scan, which the streaming scanner matches."""
+    blocks, block_lines, raw_lines, fence_tag, in_fence = [], [], [], "", False
+    for line in markdown.splitlines():
+        stripped = line.lstrip()
+        if stripped.startswith("```"):
+            raw_lines.append(line)
+            if in_fence:
+                blocks.append(("\n".join(block_lines), fence_tag, "\n".join(raw_lines)))
+                block_lines, raw_lines, in_fence = [], [], False
+            else:
+                in_fence, fence_tag = True, stripped[3:].strip()
+        elif in_fence:
+            block_lines.append(line)
+            raw_lines.append(line)
+    return blocks
+
+
+def test_lines_end_as_in_splitlines(tmp_path):
+    cases = [
+        "Text\r```python\rx = 1\r```\rmore",
+        "```\u2028a\u2029b\x0c```js\x85c\n```",
+        "Intro\n\u00a0```python\r\nx\x1c```\r\n```bash\x0becho\x1d```",
+        "```python\nx = 1\n```",
+    ]
+    for md in cases:
+        md_file = tmp_path / "chapter.md"
+        md_file.write_bytes(md.encode("utf-8"))
+        expected = _blocks_by_splitlines(md)
+        assert expected, md
+        assert [tuple(block) for block in fenced_blocks(md)] == expected, md
+        assert [tuple(block) for block in fenced_blocks(md_file)] == expected, md
+
+
 if __name__ == "__main__":
     import pytest
 
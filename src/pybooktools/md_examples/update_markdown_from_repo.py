@@ -4,6 +4,8 @@ from pathlib import Path
 
 from rich.console import Console
 
+from pybooktools.md_examples.chapter_model import load_chapter
+
 console = Console()
 
 
@@ -38,36 +40,29 @@ def update_markdown_with_repo_examples(markdown_file: Path, example_repo: Path)
         A new version of the Markdown file as a string, with the fenced examples replaced
         by the contents of the corresponding Python files.
     """
-    # Read the original Markdown content.
-    markdown_text = markdown_file.read_text(encoding="utf-8")
-
-    # Pattern to match a fenced python code block starting with a slug line.
-    # Group 1: opening fence (e.g. "```python\n")
-    # Group 2: slug line including comment marker (e.g. "# example_1.py\n")
-    # Group 3: the filename from the slug line (e.g. "example_1.py")
-    # Group 4: the rest of the code block (which will be replaced)
-    fenced_python_block = re.compile(
-        r"(```python\s*\n)"  # Opening fence with language tag.
-        r"(\s*(?:#|//)\s*(\S+\.py)\s*\n)"  # slug line: commented filename.
-        r"(.*?)"  # the rest of the code block.
-        r"\n```",  # Closing fence.
-        re.DOTALL
-    )
+    chapter = load_chapter(markdown_file)
+    # A python block is replaced if its first non-blank line is a slug line:
+    # a commented filename, e.g. "# example_1.py". Group 1 is the filename.
+    slug_line = re.compile(r"(?:#|//)\s*(\S+\.py)\s*$")
 
-    def replacer(match: re.Match) -> str:
-        example_name: str = match.group(3)
+    replacements: dict[int, str] = {}
+    for i, (info, block) in enumerate(zip(chapter.block_info, chapter.blocks)):
+        if info.fence_tag != "python":
+            continue
+        match = slug_line.match(block.content.lstrip().partition("\n")[0])
+        if match is None:
+            continue
+        example_name: str = match.group(1)
         if "/" in example_name:
             console.print(nc("Skipping book utility ") + pc(example_name))
-            return match.group(0)
+            continue
         example_path: Path = example_repo / example_name
         try:
             # Read the content of the corresponding file.
             file_content: str = example_path.read_text(encoding="utf-8").rstrip()
         except Exception as e:
             raise FileNotFoundError(f"Could not read file {example_path}: {e}")
-        # Return a new fenced code block with the file's content.
-        return f"```python\n{file_content}\n```"
+        # A new fenced code block with the file's content.
+        replacements[i] = f"```python\n{file_content}\n```"
 
-    # Substitute all matching code blocks with the updated content.
-    new_markdown: str = fenced_python_block.sub(replacer, markdown_text)
-    return new_markdown
+    return chapter.splice(replacements)
@@ -0,0 +1,68 @@
+# bench_extract_slides.py
+"""
+Compare the original extract_slides, which finds the inline token after
+each heading with tokens.index() and so is quadratic in the token count,
+with the single indexed pass in md_presentation.extract, on a synthetic
+document of 10k headings with a code block after every few of them.
+Parsing with markdown-it is timed on its own, since both pay for it.
+"""
+import time
+from typing import Callable, List
+
+from markdown_it import MarkdownIt
+
+from pybooktools.presentation.md_presentation import Slide, _markdown, extract_slides
+
+
+def index_search_extract_slides(md_text: str) -> List[Slide]:
+    """The original extraction: a linear tokens.index() search per heading."""
+    tokens = MarkdownIt().parse(md_text)
+    slides: List[Slide] = []
+    current_headers: List[str] = []
+    for token in tokens:
+        if token.type == "heading_open":
+            level = int(token.tag[1])
+            content_token = tokens[tokens.index(token) + 1]
+            current_headers.append(f"{'  ' * (level - 1)}• {content_token.content}")
+        elif token.type == "fence":
+            if current_headers:
+                slides.append(Slide(type="header", content="<br>".join(current_headers)))
+                current_headers = []
+            slides.append(Slide(type="code", content=token.content, language=token.info.strip() or "plaintext"))
+    if current_headers:
+        slides.append(Slide(type="header", content="<br>".join(current_headers)))
+    return slides
+
+
+def synthetic_document(headings: int = 10_000) -> str:
+    parts = []
+    for n in range(headings):
+        parts.append(f"{'#' * (n % 3 + 1)} Heading {n}\n\nSome text about heading {n}.\n")
+        if n % 4 == 3:
+            parts.append(f"```python\n# example_{n}.py\nprint({n})\n```\n")
+    return "\n".join(parts)
+
+
+def best_time(func: Callable[[], object], repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    md_text = synthetic_document()
+    assert index_search_extract_slides(md_text) == extract_slides(md_text)
+    parse = best_time(lambda: _markdown.parse(md_text))
+    single = best_time(lambda: extract_slides(md_text))
+    quadratic = best_time(lambda: index_search_extract_slides(md_text), repeat=1)
+    print(f"{len(extract_slides(md_text))} slides from 10k headings, {len(_markdown.parse(md_text))} tokens")
+    print(f"markdown-it parse alone:    {parse:.3f}s")
+    print(f"tokens.index() per heading: {quadratic:.3f}s")
+    print(f"single indexed pass:        {single:.3f}s  ({quadratic / single:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,26 +13,19 @@ Usage:
 """
 
 import argparse
-import http.server
-import socketserver
 import threading
 import webbrowser
 from pathlib import Path
 
-from markdown_it import MarkdownIt
+from pybooktools.presentation.md_presentation import extract
+from pybooktools.presentation.page_server import Page, PageHandler, ThreadedServer, prerender
 
 PORT = 8765
 
 
 def extract_code_blocks(md_text: str) -> list[tuple[str, str]]:
     """Extracts (language, code) pairs from fenced code blocks."""
-    md = MarkdownIt()
-    tokens = md.parse(md_text)
-    return [
-        (token.info.strip(), token.content)
-        for token in tokens
-        if token.type == "fence"
-    ]
+    return extract(md_text).code_blocks
 
 
 def generate_html(code_blocks: list[tuple[str, str]]) -> str:
@@ -136,33 +129,26 @@ def generate_html(code_blocks: list[tuple[str, str]]) -> str:
 """
 
 
-class InMemoryHandler(http.server.BaseHTTPRequestHandler):
+class InMemoryHandler(PageHandler):
     """Serves a single in-memory HTML page."""
 
-    def __init__(self, html: str, *args, **kwargs):
-        self._html = html
+    def __init__(self, page: Page, *args, **kwargs):
+        self._page = page
         super().__init__(*args, **kwargs)
 
     def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Content-Length", str(len(self._html.encode("utf-8"))))
-        self.end_headers()
-        self.wfile.write(self._html.encode("utf-8"))
-
-    def log_message(self, format, *args):
-        pass  # silence logs
+        self.send_page(self._page)
 
 
 def run_viewer(md_path: Path) -> None:
     md_text = md_path.read_text(encoding="utf-8")
     code_blocks = extract_code_blocks(md_text)
-    html = generate_html(code_blocks)
+    page = prerender(generate_html(code_blocks))
 
     def handler(*args, **kwargs):
-        InMemoryHandler(html, *args, **kwargs)
+        InMemoryHandler(page, *args, **kwargs)
 
-    with socketserver.TCPServer(("localhost", PORT), handler) as httpd:
+    with ThreadedServer(("localhost", PORT), handler) as httpd:
         thread = threading.Thread(target=httpd.serve_forever)
         thread.daemon = True
         thread.start()
@@ -0,0 +1,218 @@
+# live_reload.py
+"""
+Pieces for updating a running presentation as its Markdown file is edited.
+
+watch_file polls the file's mtime and size. split_chunks cuts Markdown
+into chunks that each parse the same on their own as in place, so only
+the chunks whose text changed need parsing again. diff turns the old
+and new slide lists into the patches that take one to the other, and a
+Broadcast hands each set of patches to every open event stream.
+"""
+import re
+import threading
+import uuid
+from collections import deque
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Callable, Generic, List, NamedTuple, Optional, Sequence, TypeVar
+
+import pytest
+
+T = TypeVar("T")
+
+_heading = re.compile(r"#{1,6}(?:[ \t]|$)")
+_fence = re.compile(r" {0,3}(`{3,}|~{3,})")
+# The start of a CommonMark HTML block; the group picks the line that ends it
+_html = re.compile(r" {0,3}<(!--|\?|!\[CDATA\[|![A-Za-z]|(?:script|pre|style|textarea)(?=[\s>]|$)|/?[A-Za-z])", re.I)
+_html_ends = {"!--": "-->", "?": "?>", "![CDATA[": "]]>"}
+
+
+def _html_end(opening: str) -> str:
+    """What ends the HTML block begun by opening (see _html); "" for a blank line."""
+    lowered = opening.lower()
+    if lowered in _html_ends:
+        return _html_ends[lowered]
+    if lowered.startswith("!"):
+        return ">"
+    if lowered in ("script", "pre", "style", "textarea"):
+        return f"</{lowered}>"
+    return ""
+
+
+def split_chunks(md_text: str) -> List[str]:
+    """
+    Splits md_text before each ATX heading ('# ...' at the start of a line)
+    outside fenced code blocks and HTML blocks (comments included). A heading
+    always starts a new block, so each chunk parses the same on its own.
+    "".join(chunks) == md_text.
+    """
+    chunks: List[str] = []
+    start = 0
+    position = 0
+    fence = ""  # The open fence's marker, if inside a fenced block
+    html_end: Optional[str] = None  # What ends the open HTML block, if inside one
+    for line in md_text.splitlines(keepends=True):
+        match = _fence.match(line)
+        if html_end is not None:
+            if (not line.strip()) if html_end == "" else html_end in line.lower():
+                html_end = None
+        elif fence:
+            if match and match.group(1).startswith(fence) and not line[match.end():].strip():
+                fence = ""
+        elif html := _html.match(line):
+            html_end = _html_end(html.group(1))
+            if html_end and html_end in line[html.end():].lower():  # Ends on the line it starts
+                html_end = None
+        elif match:
+            if match.group(1)[0] == "~" or "`" not in line[match.end():]:  # Else it's inline code, not a fence
+                fence = match.group(1)
+        elif _heading.match(line) and position > start:
+            chunks.append(md_text[start:position])
+            start = position
+        position += len(line)
+    if start < len(md_text):
+        chunks.append(md_text[start:])
+    return chunks
+
+
+class Patch(NamedTuple, Generic[T]):
+    """Replace old items [start:end] with items."""
+    start: int
+    end: int
+    items: List[T]
+
+
+def diff(old: Sequence[T], new: Sequence[T]) -> List[Patch[T]]:
+    """Patches, in increasing order of start, that turn old into new when applied from last to first."""
+    return [
+        Patch(i1, i2, list(new[j1:j2]))
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def apply(items: Sequence[T], patches: List[Patch[T]]) -> List[T]:
+    result = list(items)
+    for patch in reversed(patches):
+        result[patch.start:patch.end] = patch.items
+    return result
+
+
+class Broadcast(Generic[T]):
+    """
+    A numbered sequence of changes for any number of listeners, each of
+    which asks for the changes after the version it last saw. Versions
+    belong to this Broadcast's `token`, so a listener that outlived a
+    restart is told to start over.
+    """
+
+    def __init__(self, history: int = 100):
+        self.token = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.closed = False
+        self._changes: deque[T] = deque(maxlen=history)  # The last of these made `version`
+        self._condition = threading.Condition()
+
+    def publish(self, change: T) -> None:
+        with self._condition:
+            self._changes.append(change)
+            self.version += 1
+            self._condition.notify_all()
+
+    def since(self, token: str, version: int, timeout: float) -> Optional[List[T]]:
+        """
+        The changes after (token, version), waiting up to timeout seconds for
+        one; [] if none arrived or the Broadcast closed. None if they can't
+        be replayed: the listener must start over from the current state.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: token != self.token or self.version != version or self.closed, timeout
+            )
+            behind = self.version - version
+            if token != self.token or not 0 <= behind <= len(self._changes):
+                return None
+            return list(self._changes)[len(self._changes) - behind:]
+
+    def close(self) -> None:
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+def watch_file(path: Path, on_change: Callable[[str], None], stop: threading.Event, interval: float = 0.5) -> None:
+    """Polls path until stop is set, calling on_change(text) each time its mtime or size changes."""
+    def signature():
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    last = signature()
+    while not stop.wait(interval):
+        try:
+            current = signature()
+            if current == last:
+                continue
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):  # Mid-save, or briefly gone: try again next time
+            continue
+        last = current
+        on_change(text)
+
+
+# --------------------------- TESTS ---------------------------
+
+def test_split_chunks():
+    md_text = (
+        "Intro\n# One\ntext\n## Two\n```python\n# not a heading\n```\n"
+        "~~~~\n```\n# still code\n~~~~\n#hashtag\n### Three\n"
+    )
+    chunks = split_chunks(md_text)
+    assert "".join(chunks) == md_text
+    assert [chunk.splitlines()[0] for chunk in chunks] == ["Intro", "# One", "## Two", "### Three"]
+    assert split_chunks("") == []
+    assert split_chunks("<!--\n# commented out\n-->\n# Real\n") == ["<!--\n# commented out\n-->\n", "# Real\n"]
+    assert split_chunks("<div>\n# x\n</div>\n# still html\n\n# Real\n") == [
+        "<div>\n# x\n</div>\n# still html\n\n", "# Real\n"
+    ]
+
+
+def test_diff_and_apply():
+    old = list("abcdefg")
+    new = list("abXdefgh")
+    patches = diff(old, new)
+    assert patches == [Patch(2, 3, ["X"]), Patch(7, 7, ["h"])]
+    assert apply(old, patches) == new
+    assert diff(old, old) == []
+
+
+def test_broadcast():
+    changes: Broadcast[str] = Broadcast(history=2)
+    assert changes.since(changes.token, 0, timeout=0) == []
+    for change in "abc":
+        changes.publish(change)
+    assert changes.since(changes.token, 1, timeout=0) == ["b", "c"]
+    assert changes.since(changes.token, 3, timeout=0) == []
+    assert changes.since(changes.token, 0, timeout=0) is None  # Older than the history
+    assert changes.since("restarted", 3, timeout=0) is None
+    threading.Timer(0.05, changes.publish, ["d"]).start()
+    assert changes.since(changes.token, 3, timeout=5) == ["d"]
+
+
+def test_watch_file(tmp_path: Path):
+    path = tmp_path / "slides.md"
+    path.write_text("# One\n", encoding="utf-8")
+    seen: List[str] = []
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch_file, args=(path, seen.append, stop, 0.01))
+    watcher.start()
+    try:
+        stop.wait(0.1)  # Let it see the original first
+        path.write_text("# One\n# Two\n", encoding="utf-8")
+        for _ in range(500):
+            if seen:
+                break
+            stop.wait(0.01)
+        assert seen == ["# One\n# Two\n"]
+    finally:
+        stop.set()
+        watcher.join()
@@ -14,27 +14,34 @@ Features:
 - '-' key to decrease font size
 - 'q' key to quit
 - Mouse wheel to scroll within code examples
-- Code reformatting using Ruff when font size changes
+- Code reformatting using Ruff when font size changes, cached per slide and
+  width, with the neighbouring slides formatted ahead in the background
+
+- With --watch, edits to the Markdown file appear in the open presentation
+  (and any other open copies) without losing the current slide
 
 Usage:
-    python md_presentation.py path/to/markdown_file.md
+    python md_presentation.py path/to/markdown_file.md [--watch]
 """
 
 import argparse
-import http.server
 import json
-import socketserver
 import threading
 import time
 import uuid
 import webbrowser
+from collections import OrderedDict
 from pathlib import Path
 from subprocess import run, PIPE
-from typing import Dict, List, NamedTuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 
+import pytest
 from markdown_it import MarkdownIt
 
+from pybooktools.presentation.live_reload import Broadcast, Patch, apply, diff, split_chunks, watch_file
+from pybooktools.presentation.page_server import Page, PageHandler, ThreadedServer, prerender
+
 PORT = 8765
 
 
@@ -45,33 +52,53 @@ class Slide(NamedTuple):
     language: str = ""  # Only for code slides
 
 
-def extract_slides(md_text: str) -> List[Slide]:
-    """
-    Extracts slides from markdown text.
+class Extracted(NamedTuple):
+    """Everything the presentation tools take from one parse of a Markdown file."""
+    slides: List[Slide]
+    code_blocks: List[Tuple[str, str]]  # (language, code) of each fenced block
 
-    Creates slides following these rules:
-    1. Headers and subheaders are collected until a code block is encountered
-    2. The collected headers form one slide
-    3. Each code block forms its own slide
-    4. Process repeats for subsequent headers and code blocks
-    """
-    md = MarkdownIt()
-    tokens = md.parse(md_text)
 
-    slides: List[Slide] = []
-    current_headers: List[str] = []
+_markdown = MarkdownIt()
+
 
-    for token in tokens:
+def scan(md_text: str) -> List[Slide]:
+    """
+    Each heading as a header slide holding its one bullet point, and each
+    fenced code block as a code slide, in a single pass over the tokens.
+    Code slides keep the language as written, which may be empty.
+    """
+    tokens = _markdown.parse(md_text)
+    parts: List[Slide] = []
+    for i, token in enumerate(tokens):
         if token.type == "heading_open":
             level = int(token.tag[1])  # h1 -> 1, h2 -> 2, etc.
-            content_token = tokens[tokens.index(token) + 1]
-            header_text = content_token.content
+            header_text = tokens[i + 1].content  # The heading's inline token
 
             # Add bullet point with appropriate indentation
             indent = "  " * (level - 1)
-            current_headers.append(f"{indent}• {header_text}")
+            parts.append(Slide(type="header", content=f"{indent}• {header_text}"))
 
         elif token.type == "fence":
+            parts.append(Slide(type="code", content=token.content, language=token.info.strip()))
+    return parts
+
+
+def assemble(parts: Iterable[Slide]) -> Extracted:
+    """
+    Builds the slides from what scan found, following these rules:
+    1. Headers and subheaders are collected until a code block is encountered
+    2. The collected headers form one slide
+    3. Each code block forms its own slide
+    4. Process repeats for subsequent headers and code blocks
+    """
+    slides: List[Slide] = []
+    code_blocks: List[Tuple[str, str]] = []
+    current_headers: List[str] = []
+
+    for part in parts:
+        if part.type == "header":
+            current_headers.append(part.content)
+        else:
             # First, if we have collected headers, create a header slide
             if current_headers:
                 header_content = "<br>".join(current_headers)
@@ -79,23 +106,205 @@ def extract_slides(md_text: str) -> List[Slide]:
                 current_headers = []
 
             # Then create a code slide
-            slides.append(Slide(
-                type="code",
-                content=token.content,
-                language=token.info.strip() or "plaintext"
-            ))
+            code_blocks.append((part.language, part.content))
+            slides.append(part._replace(language=part.language or "plaintext"))
 
     # Don't forget any remaining headers
     if current_headers:
         header_content = "<br>".join(current_headers)
         slides.append(Slide(type="header", content=header_content))
 
-    return slides
+    return Extracted(slides, code_blocks)
+
+
+def extract(md_text: str) -> Extracted:
+    """Extracts slides and code blocks from markdown text with one parse."""
+    return assemble(scan(md_text))
 
 
-class PresentationHandler(http.server.BaseHTTPRequestHandler):
+def extract_slides(md_text: str) -> List[Slide]:
+    """Extracts slides from markdown text; see extract."""
+    return extract(md_text).slides
+
+
+def ruff_format(code: str, width: int) -> str:
+    """Formats Python code using Ruff, returning it unchanged if Ruff rejects it."""
+    result = run(
+        ["ruff", "format", "--line-length", str(width), "-"],
+        input=code,
+        stdout=PIPE,
+        stderr=PIPE,
+        encoding="utf-8"
+    )
+    return result.stdout if result.returncode == 0 else code
+
+
+FormatKey = Tuple[int, int]  # (slide index, width)
+
+
+class SlideFormatter:
+    """
+    Formats Python code slides, keeping the results in an LRU cache keyed
+    on (slide index, width). Each entry remembers the code it formatted,
+    so after set_slides it is only used if that slide's code is unchanged.
+
+    Each request also queues the nearest Python slides on either side, at
+    the same width, for a background thread to format, so that moving to
+    the next or previous slide is served from memory. A newer request
+    replaces whatever is still queued.
+    """
+
+    def __init__(
+        self,
+        slides: List[Slide],
+        format_code: Callable[[str, int], str] = ruff_format,
+        capacity: int = 256,
+        neighbours: int = 2,
+    ):
+        self._slides = slides
+        self._format_code = format_code
+        self._capacity = capacity
+        self._neighbours = neighbours
+        self._cache: OrderedDict[FormatKey, Tuple[str, str]] = OrderedDict()  # (code, formatted)
+        self._in_progress: Dict[FormatKey, threading.Event] = {}
+        self._queued: List[FormatKey] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._preformat, daemon=True)
+        self._thread.start()
+
+    def set_slides(self, slides: List[Slide]) -> None:
+        with self._condition:
+            self._slides = slides
+            self._queued = []
+
+    def formattable(self, index: int) -> bool:
+        slide = self._slides[index]
+        return slide.type == "code" and slide.language == "python"
+
+    def format(self, index: int, width: int) -> str:
+        """Slide `index` formatted to `width` columns; queues its neighbours to be formatted next."""
+        if not self.formattable(index):
+            raise ValueError("Only Python code is supported for formatting")
+        formatted = self._formatted((index, width))
+        with self._condition:
+            self._queued = [(neighbour, width) for neighbour in self._neighbours_of(index)]
+            self._condition.notify()
+        return formatted
+
+    def _neighbours_of(self, index: int) -> Iterator[int]:
+        """The nearest Python slides after and before `index`, alternating, nearest first."""
+        after = [i for i in range(index + 1, len(self._slides)) if self.formattable(i)]
+        before = [i for i in range(index - 1, -1, -1) if self.formattable(i)]
+        for pair in zip(after[:self._neighbours], before[:self._neighbours]):
+            yield from pair
+        shorter = min(len(after), len(before), self._neighbours)
+        yield from after[shorter:self._neighbours]
+        yield from before[shorter:self._neighbours]
+
+    def _formatted(self, key: FormatKey) -> str:
+        """From the cache, else format it here, or wait while the other thread does."""
+        index, width = key
+        while True:
+            with self._condition:
+                code = self._slides[index].content
+                if key in self._cache and self._cache[key][0] == code:
+                    self._cache.move_to_end(key)
+                    return self._cache[key][1]
+                pending = self._in_progress.get(key)
+                if pending is None:
+                    pending = self._in_progress[key] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            formatted = self._format_code(code, width)
+            with self._condition:
+                self._cache[key] = (code, formatted)
+                if len(self._cache) > self._capacity:
+                    self._cache.popitem(last=False)
+            return formatted
+        finally:
+            with self._condition:
+                del self._in_progress[key]
+            pending.set()
+
+    def _preformat(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queued and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                key = self._queued.pop(0)
+            try:
+                self._formatted(key)
+            except Exception:  # noqa Reported if the presenter reaches that slide
+                pass
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+def slide_json(slide: Slide) -> Dict[str, str]:
+    return {"type": slide.type, "content": slide.content, "language": slide.language}
+
+
+def render_page(slides: List[Slide], event_id: Optional[str] = None) -> Page:
+    """The page showing slides; with an event_id, it follows changes from there."""
+    return prerender(generate_html(json.dumps([slide_json(slide) for slide in slides]), event_id))
+
+
+class Deck:
+    """
+    The slides being presented, with their rendered page and formatter.
+
+    With `live` set, update() takes the edited Markdown text, parses again
+    only the chunks (see split_chunks) whose text changed, and publishes on
+    `changes` the patches that turn the old slides into the new ones.
+    """
+
+    def __init__(self, md_text: str, live: bool = False):
+        self.live = live
+        self.changes: Broadcast[List[Patch[Slide]]] = Broadcast()
+        self._scanned: Dict[str, List[Slide]] = {}  # Chunk text -> scan(chunk)
+        self._lock = threading.Lock()
+        self.slides = self._extract(md_text) if live else extract_slides(md_text)
+        self.formatter = SlideFormatter(self.slides)
+        self.page = self._render()
+
+    def _extract(self, md_text: str) -> List[Slide]:
+        chunks = split_chunks(md_text)
+        self._scanned = {
+            chunk: self._scanned[chunk] if chunk in self._scanned else scan(chunk) for chunk in chunks
+        }
+        return assemble(part for chunk in chunks for part in self._scanned[chunk]).slides
+
+    def _render(self) -> Page:
+        return render_page(self.slides, f"{self.changes.token}:{self.changes.version}" if self.live else None)
+
+    def update(self, md_text: str) -> None:
+        with self._lock:
+            slides = self._extract(md_text)
+            patches = diff(self.slides, slides)
+            if not patches:
+                return
+            self.slides = slides
+            self.formatter.set_slides(slides)
+            # Publish first: a page loaded meanwhile is the old one, which these patches update
+            self.changes.publish(patches)
+            self.page = self._render()
+
+    def close(self) -> None:
+        self.changes.close()
+        self.formatter.close()
+
+
+class PresentationHandler(PageHandler):
     """Handles HTTP requests for the presentation server."""
-    _slides: List[Slide]
+    _deck: Deck
     _presentation_dir: Path
 
     def do_GET(self):
@@ -105,66 +314,80 @@ class PresentationHandler(http.server.BaseHTTPRequestHandler):
             self._serve_html()
         elif parsed.path == "/format":
             self._serve_formatted_code(parse_qs(parsed.query))
+        elif parsed.path == "/events" and self._deck.live:
+            self._serve_events(parse_qs(parsed.query))
         else:
             self.send_error(404, "Not Found")
 
     def _serve_html(self):
-        """Serves the main HTML page with the presentation."""
-        js_slides = json.dumps([
-            {"type": slide.type, "content": slide.content, "language": slide.language}
-            for slide in self._slides
-        ])
-
-        html = generate_html(js_slides)
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        """Serves the main HTML page with the presentation, rendered when the slides last changed."""
+        self.send_page(self._deck.page)
 
     def _serve_formatted_code(self, qs: Dict[str, List[str]]) -> None:
-        """Formats Python code using Ruff and serves the result."""
+        """Serves Python code formatted using Ruff, from memory when already formatted."""
         try:
             index = int(qs.get("index", [0])[0])
             width = int(qs.get("width", [88])[0])
-
-            slide = self._slides[index]
-            if slide.type != "code" or slide.language != "python":
-                raise ValueError("Only Python code is supported for formatting")
-
-            result = run(
-                ["ruff", "format", "--line-length", str(width), "-"],
-                input=slide.content,
-                stdout=PIPE,
-                stderr=PIPE,
-                encoding="utf-8"
-            )
-            formatted = result.stdout if result.returncode == 0 else slide.content
+            formatted = self._deck.formatter.format(index, width)
         except Exception as e:
             formatted = f"// Formatting failed: {str(e)}"
-
+        self.send_text(formatted)
+
+    def _serve_events(self, qs: Dict[str, List[str]]) -> None:
+        """
+        Streams Server-Sent Events: a "patch" event for each change to the
+        slides after the page's version, or "reload" if the page is too old
+        to patch. Each event's id is the version it brings the page to, which
+        the browser sends back as Last-Event-ID when it reconnects.
+        """
+        changes = self._deck.changes
+        token, _, version = (self.headers.get("Last-Event-ID") or qs.get("last", [""])[0]).partition(":")
+        if not version.isdigit():
+            token, version = "", "0"  # Not a version we published
+        version = int(version)
+        self.close_connection = True  # The stream has no length, so it ends the connection
         self.send_response(200)
-        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
         self.end_headers()
-        self.wfile.write(formatted.encode("utf-8"))
-
-    def log_message(self, *args):
-        """Silence log messages."""
-        pass
-
-
-class PresentationServer(socketserver.TCPServer):
-    """Server for the presentation."""
-    allow_reuse_address = True
-
-    def __init__(self, slides: List[Slide], presentation_dir: Path):
+        try:
+            while not changes.closed:
+                published = changes.since(token, version, timeout=15)
+                if published is None:
+                    self.wfile.write(b"event: reload\ndata:\n\n")
+                    return
+                if not published:
+                    self.wfile.write(b": keep-alive\n\n")  # Also notices a closed connection
+                for patches in published:
+                    version += 1
+                    data = json.dumps([
+                        {"start": patch.start, "end": patch.end, "slides": [slide_json(s) for s in patch.items]}
+                        for patch in patches
+                    ])
+                    self.wfile.write(f"id: {token}:{version}\nevent: patch\ndata: {data}\n\n".encode("utf-8"))
+        except ConnectionError:  # The page was closed or reloaded
+            pass
+
+
+class PresentationServer(ThreadedServer):
+    """Server for the presentation; a slow format request doesn't hold up other viewers."""
+
+    def __init__(self, deck: Deck, presentation_dir: Path):
         handler = lambda *args, **kwargs: PresentationHandler(*args, **kwargs)
-        PresentationHandler._slides = slides
+        PresentationHandler._deck = deck
         PresentationHandler._presentation_dir = presentation_dir
         super().__init__(("localhost", PORT), handler)
 
+    def server_close(self) -> None:
+        super().server_close()
+        PresentationHandler._deck.close()
 
-def generate_html(js_slides: str) -> str:
-    """Generates the HTML for the presentation."""
+
+def generate_html(js_slides: str, event_id: Optional[str] = None) -> str:
+    """
+    Generates the HTML for the presentation. With an event_id, the page
+    applies the changes to its slides streamed from /events after that.
+    """
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -271,17 +494,16 @@ def generate_html(js_slides: str) -> str:
   <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.8.0/highlight.min.js"></script>
   <script>
     const slides = {js_slides};
+    const eventId = {json.dumps(event_id)};  // The version of these slides, when following changes
     let currentIndex = 0;
     let fontSize = 2;
 
     const container = document.getElementById("slides-container");
     const controls = document.querySelector(".controls");
 
-    // Create all slides
-    slides.forEach((slide, index) => {{
+    function makeSlide(slide) {{
       const slideDiv = document.createElement("div");
-      slideDiv.className = `slide ${{index === 0 ? "active" : ""}}`;
-      slideDiv.dataset.index = index;
+      slideDiv.className = "slide";
 
       if (slide.type === "header") {{
         slideDiv.className += " header-slide";
@@ -292,21 +514,68 @@ def generate_html(js_slides: str) -> str:
         const code = document.createElement("code");
         code.className = `hljs ${{slide.language}}`;
         code.textContent = slide.content;
+        hljs.highlightElement(code);
         pre.appendChild(code);
         slideDiv.appendChild(pre);
       }}
+      return slideDiv;
+    }}
 
-      container.appendChild(slideDiv);
-    }});
+    function numberSlides() {{
+      Array.from(container.children).forEach((slideDiv, index) => {{
+        slideDiv.dataset.index = index;
+      }});
+    }}
 
-    // Initialize highlighting
-    document.querySelectorAll('pre code').forEach(block => {{
-      hljs.highlightElement(block);
-    }});
+    // Create all slides
+    slides.forEach(slide => container.appendChild(makeSlide(slide)));
+    numberSlides();
+    container.firstElementChild?.classList.add("active");
+
+    // Each patch replaces old slides [start, end) with new ones. Only those
+    // slide elements are rebuilt, and the presenter stays on the same slide.
+    function applyPatches(patches) {{
+      const nodes = Array.from(container.children);
+      let index = currentIndex;
+      for (const patch of patches) {{
+        if (currentIndex < patch.start) break;
+        if (currentIndex < patch.end) {{  // The current slide changed: stay at its place in the patch
+          const offset = currentIndex - patch.start;
+          index += Math.min(offset, Math.max(patch.slides.length - 1, 0)) - offset;
+          break;
+        }}
+        index += patch.slides.length - (patch.end - patch.start);
+      }}
+      // Last to first, so the indexes of earlier patches still hold:
+      for (const patch of [...patches].reverse()) {{
+        nodes.slice(patch.start, patch.end).forEach(node => node.remove());
+        const next = patch.start > 0 ? nodes[patch.start - 1].nextSibling : container.firstChild;
+        const added = document.createDocumentFragment();
+        patch.slides.forEach(slide => added.appendChild(makeSlide(slide)));
+        container.insertBefore(added, next);
+        slides.splice(patch.start, patch.end - patch.start, ...patch.slides);
+      }}
+      numberSlides();
+      updateFontSize();
+      if (slides.length === 0) return;
+      index = Math.min(Math.max(index, 0), slides.length - 1);
+      if (container.querySelector(".slide.active")) {{
+        currentIndex = index;  // Unchanged, perhaps moved
+      }} else {{
+        showSlide(index, true);
+      }}
+    }}
+
+    if (eventId !== null) {{
+      // On reconnecting, the browser sends the id of the last event as Last-Event-ID
+      const events = new EventSource(`/events?last=${{encodeURIComponent(eventId)}}`);
+      events.addEventListener("patch", e => applyPatches(JSON.parse(e.data)));
+      events.addEventListener("reload", () => location.reload());
+    }}
 
     async function showSlide(index, forceRuff = false) {{
       // Hide current slide
-      document.querySelector(".slide.active").classList.remove("active");
+      document.querySelector(".slide.active")?.classList.remove("active");
 
       // Show new slide
       const newSlide = document.querySelector(`.slide[data-index="${{index}}"]`);
@@ -446,6 +715,9 @@ def main() -> None:
         description="Create an interactive browser presentation from a Markdown file"
     )
     parser.add_argument("markdown_file", type=Path, help="Path to the Markdown file")
+    parser.add_argument(
+        "--watch", action="store_true", help="Update the open presentation when the Markdown file changes"
+    )
     args = parser.parse_args()
 
     md_path = args.markdown_file
@@ -458,18 +730,23 @@ def main() -> None:
 
     # Extract slides from markdown
     md_text = md_path.read_text(encoding="utf-8")
-    slides = extract_slides(md_text)
+    deck = Deck(md_text, live=args.watch)
 
-    if not slides:
+    if not deck.slides:
+        deck.close()
         print("No slides found in the Markdown file.")
         return
 
     # Start the server
-    with PresentationServer(slides, presentation_dir) as server:
+    with PresentationServer(deck, presentation_dir) as server:
         thread = threading.Thread(target=server.serve_forever)
         thread.daemon = True
         thread.start()
 
+        stop_watching = threading.Event()
+        if args.watch:
+            threading.Thread(target=watch_file, args=(md_path, deck.update, stop_watching), daemon=True).start()
+
         # Open browser
         webbrowser.open(f"http://localhost:{PORT}")
         print(f"Presentation started at http://localhost:{PORT}")
@@ -479,8 +756,147 @@ def main() -> None:
             thread.join()
         except KeyboardInterrupt:
             print("\nShutting down...")
+            stop_watching.set()
             server.shutdown()
 
 
+# --------------------------- TESTS ---------------------------
+
+def test_extract_slides_and_code_blocks():
+    md_text = (
+        "# Title\n\n## Part\n\n```python\nx = 1\n```\n\n"
+        "```\nplain\n```\n\n### Coda\n"
+    )
+    slides, code_blocks = extract(md_text)
+    assert slides == [
+        Slide("header", "• Title<br>  • Part"),
+        Slide("code", "x = 1\n", "python"),
+        Slide("code", "plain\n", "plaintext"),
+        Slide("header", "    • Coda"),
+    ]
+    assert code_blocks == [("python", "x = 1\n"), ("", "plain\n")]
+    assert extract_slides(md_text) == slides
+
+
+DECK = [
+    Slide("header", "• Intro"),
+    Slide("code", "a = 1\n", "python"),
+    Slide("header", "• Middle"),
+    Slide("code", "echo hi\n", "bash"),
+    Slide("code", "b = 2\n", "python"),
+    Slide("code", "c = 3\n", "python"),
+    Slide("code", "d = 4\n", "python"),
+]
+
+
+class CountingFormatter:
+    def __init__(self):
+        self.calls: List[FormatKey] = []
+
+    def __call__(self, code: str, width: int) -> str:
+        self.calls.append((next(i for i, slide in enumerate(DECK) if slide.content == code), width))
+        return f"{code}# {width}\n"
+
+
+def wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_formatter_caches_by_slide_and_width():
+    format_code = CountingFormatter()
+    formatter = SlideFormatter(DECK, format_code, neighbours=0)
+    try:
+        assert formatter.format(1, 40) == "a = 1\n# 40\n"
+        assert formatter.format(1, 40) == "a = 1\n# 40\n"
+        assert formatter.format(1, 60) == "a = 1\n# 60\n"
+        assert format_code.calls == [(1, 40), (1, 60)]
+        with pytest.raises(ValueError):
+            formatter.format(3, 40)
+    finally:
+        formatter.close()
+
+
+def test_formatter_preformats_neighbours():
+    format_code = CountingFormatter()
+    formatter = SlideFormatter(DECK, format_code, neighbours=2)
+    try:
+        assert list(formatter._neighbours_of(4)) == [5, 1, 6]
+        formatter.format(4, 50)
+        wait_for(lambda: len(format_code.calls) == 4)
+        assert sorted(format_code.calls) == [(1, 50), (4, 50), (5, 50), (6, 50)]
+        formatter.format(5, 50)
+        assert len(format_code.calls) == 4
+    finally:
+        formatter.close()
+
+
+def test_formatter_evicts_least_recently_used():
+    format_code = CountingFormatter()
+    formatter = SlideFormatter(DECK, format_code, capacity=2, neighbours=0)
+    try:
+        formatter.format(1, 40)
+        formatter.format(4, 40)
+        formatter.format(1, 40)  # Now the most recently used
+        formatter.format(5, 40)  # Evicts slide 4
+        formatter.format(1, 40)
+        formatter.format(4, 40)
+        assert format_code.calls == [(1, 40), (4, 40), (5, 40), (4, 40)]
+    finally:
+        formatter.close()
+
+
+def test_formatter_reformats_changed_slides():
+    format_code = CountingFormatter()
+    formatter = SlideFormatter(DECK, format_code, neighbours=0)
+    try:
+        formatter.format(1, 40)
+        formatter.set_slides([*DECK[:4], DECK[4]._replace(content="a = 1\n"), *DECK[5:]])
+        formatter.format(1, 40)  # Same code at the same index: still cached
+        assert formatter.format(4, 40) == "a = 1\n# 40\n"
+        assert format_code.calls == [(1, 40), (1, 40)]  # CountingFormatter names slides by their code
+        assert len(formatter._cache) == 2
+    finally:
+        formatter.close()
+
+
+def test_chunked_extraction_matches_full_parse():
+    md_text = (Path(__file__).parent / "test_presentation.md").read_text(encoding="utf-8")
+    for text in [
+        md_text,
+        "<!--\n# commented out\n-->\n# Real\n",
+        "<div>\n# x\n</div>\n\n# Real\n",
+        "<!-- one line -->\n# Real\n<script>\n# y\n</script>\n## Also real\n",
+    ]:
+        deck = Deck(text, live=True)
+        try:
+            assert deck.slides == extract_slides(text), text
+        finally:
+            deck.close()
+
+
+def test_deck_publishes_patches_for_edits():
+    chapters = [f"# Chapter {n}\n\nText.\n\n```python\nprint({n})\n```\n\n## Aside {n}\n" for n in range(5)]
+    deck = Deck("".join(chapters), live=True)
+    try:
+        before, scanned = deck.slides, dict(deck._scanned)
+        chapters[2] = "# Chapter 2\n\n```python\nprint('two')\n```\n\n```\nmore\n```\n"
+        deck.update("".join(chapters))
+        assert deck.slides == extract_slides("".join(chapters))
+        # Only the edited chunk was parsed again:
+        assert [chunk for chunk in deck._scanned if deck._scanned[chunk] is not scanned.get(chunk)] == [chapters[2]]
+        assert deck.changes.version == 1
+        [patches] = deck.changes.since(deck.changes.token, 0, timeout=0)
+        assert apply(before, patches) == deck.slides
+        assert all(patch.start >= 4 for patch in patches)  # Slides before chapter 2 are untouched
+        assert json.dumps(deck.changes.token + ":1") in deck.page.body.decode("utf-8")
+        deck.update("".join(chapters))  # No change, no patch
+        assert deck.changes.version == 1
+    finally:
+        deck.close()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+# page_server.py
+"""
+HTTP plumbing shared by the presentation servers.
+
+ThreadedServer handles each connection on its own thread, so a slow
+request (a ruff run) doesn't hold up the others, and PageHandler speaks
+HTTP/1.1 so browsers keep their connections open. A Page is rendered,
+gzip-compressed and hashed once; PageHandler serves it with an ETag, and
+answers a matching If-None-Match with 304 Not Modified.
+"""
+import gzip
+import hashlib
+import http.client
+import http.server
+import socketserver
+import sys
+import threading
+from typing import NamedTuple
+
+import pytest
+
+
+class Page(NamedTuple):
+    body: bytes
+    gzipped: bytes
+    etag: str
+    content_type: str
+
+
+def prerender(text: str, content_type: str = "text/html; charset=utf-8") -> Page:
+    body = text.encode("utf-8")
+    return Page(
+        body=body,
+        gzipped=gzip.compress(body, mtime=0),
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        content_type=content_type,
+    )
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class ThreadedServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """One thread per connection; those threads don't keep the process alive."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # Browsers drop idle kept-alive connections; that's not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    """Keep-alive request handler that serves Pages."""
+    protocol_version = "HTTP/1.1"
+
+    def send_page(self, page: Page, cache_control: str = "no-cache") -> None:
+        """
+        Sends page, compressed if the client accepts gzip. The default
+        cache_control lets the browser keep the page but makes it check
+        the ETag on every load, so a changed page is never stale.
+        """
+        matches = {tag.strip().removeprefix("W/") for tag in self.headers.get("If-None-Match", "").split(",")}
+        not_modified = page.etag in matches or "*" in matches
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", page.etag)
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            self.end_headers()
+            return
+        body = page.body
+        if len(page.gzipped) < len(page.body) and accepts_gzip(self.headers.get("Accept-Encoding", "")):
+            body = page.gzipped
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", page.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, text: str, cache_control: str = "no-cache") -> None:
+        self.send_page(prerender(text, "text/plain; charset=utf-8"), cache_control)
+
+    def log_message(self, *args):
+        """Silence log messages."""
+        pass
+
+
+# --------------------------- TESTS ---------------------------
+
+class _TestHandler(PageHandler):
+    page = prerender("<p>" + "slide " * 1000 + "</p>")
+    slow_started = threading.Event()
+    release = threading.Event()
+
+    def do_GET(self):
+        if self.path == "/slow":
+            self.slow_started.set()
+            self.release.wait(5)
+            self.send_text("done")
+        else:
+            self.send_page(self.page)
+
+
+@pytest.fixture
+def server():
+    with ThreadedServer(("localhost", 0), _TestHandler) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        yield httpd
+        httpd.shutdown()
+
+
+def test_keep_alive_gzip_and_etag(server):
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request("GET", "/", headers={"Accept-Encoding": "gzip, deflate"})
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert gzip.decompress(response.read()) == _TestHandler.page.body
+    etag = response.getheader("ETag")
+    # Same connection, kept alive:
+    connection.request("GET", "/", headers={"If-None-Match": etag})
+    response = connection.getresponse()
+    assert response.status == 304 and response.read() == b""
+    connection.request("GET", "/")
+    response = connection.getresponse()
+    assert response.getheader("Content-Encoding") is None
+    assert response.read() == _TestHandler.page.body
+    connection.close()
+
+
+def test_slow_request_does_not_block_others(server):
+    _TestHandler.release.clear()
+    slow = http.client.HTTPConnection(*server.server_address)
+    slow.request("GET", "/slow")
+    assert _TestHandler.slow_started.wait(5)
+    fast = http.client.HTTPConnection(*server.server_address, timeout=2)
+    fast.request("GET", "/")
+    assert fast.getresponse().status == 200
+    _TestHandler.release.set()
+    assert slow.getresponse().read() == b"done"
+    slow.close()
+    fast.close()
+
+
+def test_accepts_gzip():
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("deflate;q=0.5, GZIP;q=0.8")
+    assert not accepts_gzip("gzip;q=0, deflate")
+    assert not accepts_gzip("")
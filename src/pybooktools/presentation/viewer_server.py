@@ -1,31 +1,25 @@
 # viewer_server.py
 import argparse
-import http.server
 import json
-import socketserver
 import threading
 import webbrowser
 from pathlib import Path
 from subprocess import run, PIPE
 from urllib.parse import urlparse, parse_qs
 
-from markdown_it import MarkdownIt
+from pybooktools.presentation.md_presentation import extract
+from pybooktools.presentation.page_server import Page, PageHandler, ThreadedServer, prerender
 
 PORT = 8765
 
 
 def extract_code_blocks(md_text: str) -> list[tuple[str, str]]:
-    md = MarkdownIt()
-    tokens = md.parse(md_text)
-    return [
-        (token.info.strip(), token.content)
-        for token in tokens
-        if token.type == "fence"
-    ]
+    return extract(md_text).code_blocks
 
 
-class CodeViewerHandler(http.server.BaseHTTPRequestHandler):
+class CodeViewerHandler(PageHandler):
     _blocks: list[tuple[str, str]]
+    _page: Page
 
     def do_GET(self):
         parsed = urlparse(self.path)
@@ -37,15 +31,7 @@ class CodeViewerHandler(http.server.BaseHTTPRequestHandler):
             self.send_error(404, "Not Found")
 
     def _serve_html(self):
-        js_blocks = json.dumps([
-            {"lang": lang or "plaintext", "code": code}
-            for lang, code in self._blocks
-        ])
-        html = generate_html(js_blocks)
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        self.send_page(self._page)
 
     def _serve_formatted_code(self, qs: dict[str, list[str]]) -> None:
         try:
@@ -65,22 +51,17 @@ class CodeViewerHandler(http.server.BaseHTTPRequestHandler):
             formatted = result.stdout if result.returncode == 0 else code
         except Exception:
             formatted = "// formatting failed"
-
-        self.send_response(200)
-        self.send_header("Content-Type", "text/plain; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(formatted.encode("utf-8"))
-
-    def log_message(self, *args):
-        pass
+        self.send_text(formatted)
 
 
-class CodeViewerServer(socketserver.TCPServer):
-    allow_reuse_address = True
-
+class CodeViewerServer(ThreadedServer):
     def __init__(self, code_blocks: list[tuple[str, str]]):
         handler = lambda *args, **kwargs: CodeViewerHandler(*args, **kwargs)
         CodeViewerHandler._blocks = code_blocks
+        CodeViewerHandler._page = prerender(generate_html(json.dumps([
+            {"lang": lang or "plaintext", "code": code}
+            for lang, code in code_blocks
+        ])))
         super().__init__(("localhost", PORT), handler)
 
 
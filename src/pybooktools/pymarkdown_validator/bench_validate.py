@@ -0,0 +1,133 @@
+# bench_validate.py
+"""
+Compare the original per-check validation, where every check makes its own
+pass over the chapter text, with the single-pass rule engine in validate.
+The engine is timed both parsing each chapter (a cold chapter cache) and
+reusing the cached chapter models. Also shows how each approach grows as
+checks are added, by registering copies of the existing checks. Both must
+find exactly the same issues.
+"""
+import re
+import tempfile
+import time
+from itertools import chain
+from pathlib import Path
+
+from pybooktools.md_examples import examples_without_sluglines
+from pybooktools.md_examples import chapter_model
+from pybooktools.md_examples.chapter_model import load_chapter
+from pybooktools.pymarkdown_validator.validate import Issue, rules, run_rules
+
+slug_line_pattern = re.compile(r"^\s*(?:#|//)\s*(\S+\.(?:py|pyi|cpp|java))")
+
+
+# The original checks, each a separate pass over the text:
+
+def check_for_duplicate_slug_lines(markdown_content: str) -> list[Issue]:
+    seen = set()
+    duplicates: list[Issue] = []
+    for line in markdown_content.splitlines():
+        if slug_line_pattern.match(line):
+            if line in seen:
+                duplicates.append(Issue(f"Duplicate slug line", line))
+            seen.add(line)
+    return duplicates
+
+
+def check_for_missing_slug_lines(markdown_content: str) -> list[Issue]:
+    return [
+        Issue("Missing Slug Line", slugless)
+        for slugless in examples_without_sluglines(markdown_content)
+        if slugless.strip().startswith("```python")
+    ]
+
+
+def check_for_colon_in_slug_tag(markdown_content: str) -> list[Issue]:
+    issues: list[Issue] = []
+    lines = markdown_content.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith("```python"):
+            if lines[i + 1].strip().startswith("#:"):
+                issues.append(Issue("Colon in Slug Tag", lines[i + 1]))
+    return issues
+
+
+def check_for_main(markdown_content: str) -> list[Issue]:
+    mains: list[Issue] = []
+    in_code_block = False
+    for i, line in enumerate(markdown_content.splitlines()):
+        if line.strip().startswith("```"):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block and 'if __name__ == "__main__":' in line:
+            mains.append(Issue("__main__ found", f"line {i + 1}"))
+    return mains
+
+
+validation_checks = [
+    check_for_missing_slug_lines,
+    check_for_duplicate_slug_lines,
+    check_for_colon_in_slug_tag,
+    check_for_main,
+]
+
+
+def synthetic_chapter(n: int, blocks: int) -> str:
+    parts = [f"# Chapter {n}\n\n"]
+    for b in range(blocks):
+        parts.append(f"## Section {b}\n\n" + "Prose about the example that follows. " * 8 + "\n\n")
+        slug = "" if b % 10 == 0 else f"# example_{b % 50}.py\n"
+        extra = ""
+        if b % 7 == 3:  # A slug line repeated further down a block
+            extra += f"# example_{b % 50}.py\n"
+        if b % 11 == 5:
+            extra += 'if __name__ == "__main__":\n    pass\n'
+        parts.append(f"```python\n{slug}" + "".join(f"x{i} = {i}\n" for i in range(15)) + extra + "```\n\n")
+    parts.append('```python\n# unterminated.py\nif __name__ == "__main__":\n    pass\n')
+    return "".join(parts)
+
+
+def per_check_passes(chapters: list[Path], checks) -> list[list[Issue]]:
+    return [
+        list(chain.from_iterable(check(md.read_text(encoding="utf-8")) for check in checks))
+        for md in chapters
+    ]
+
+
+def fused_pass(chapters: list[Path], rule_types, cache_dir: Path) -> list[list[Issue]]:
+    return [run_rules(load_chapter(md, cache_dir), rule_types) for md in chapters]
+
+
+def timed(label: str, run) -> list[list[Issue]]:
+    start = time.perf_counter()
+    issues = run()
+    print(f"{label:<42} {time.perf_counter() - start:>7.3f}s  {sum(map(len, issues))} issues")
+    return issues
+
+
+def main(chapter_count: int = 40, blocks: int = 300) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = Path(tmp)
+        chapters = []
+        for n in range(chapter_count):
+            md = corpus / f"C{n:02}_Chapter.md"
+            md.write_text(synthetic_chapter(n, blocks), encoding="utf-8")
+            chapters.append(md)
+        size = sum(md.stat().st_size for md in chapters) / 1_000_000
+        print(f"{chapter_count} chapters, {blocks} blocks each, {size:.1f} MB")
+        for copies in (1, 4):
+            checks = validation_checks * copies
+            rule_types = rules * copies
+            print(f"--- {len(checks)} checks ---")
+            expected = timed("per-check passes", lambda: per_check_passes(chapters, checks))
+            cache_dir = corpus / f"cache{copies}"
+            chapter_model._loaded.clear()
+            parsed = timed("fused pass, parsing chapters", lambda: fused_pass(chapters, rule_types, cache_dir))
+            chapter_model._loaded.clear()
+            cached = timed("fused pass, cached chapter models", lambda: fused_pass(chapters, rule_types, cache_dir))
+            # Per chapter, both group issues by check in the same order:
+            assert parsed == cached == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,15 @@
 """Perform multiple validation tests on Markdown files."""
 import re
 from itertools import chain
-from typing import Callable, List, NamedTuple, Literal
+from typing import Annotated, Iterable, List, NamedTuple, Literal, Type
 
-from cyclopts import App
+from cyclopts import App, Parameter
 from cyclopts.types import ResolvedExistingFile, ResolvedExistingDirectory
 from rich.console import Console, Group
 from rich.panel import Panel
 
-from pybooktools.md_examples import examples_without_sluglines
+from pybooktools.md_examples.chapter_model import BlockInfo, Chapter, decode, load_chapter, map_chapters
+from pybooktools.md_examples.fenced_blocks import FencedBlock
 
 console = Console()
 # TODO: Unify this in one place
@@ -22,70 +23,118 @@ class Issue(NamedTuple):
     text: str
 
 
-# TODO: use md_examples util here:
-def check_for_duplicate_slug_lines(markdown_content: str) -> list[Issue]:
-    """Checks for duplicate slug lines in a Markdown file."""
-    lines = markdown_content.splitlines()
-    seen = set()
-    duplicates: list[Issue] = []
+class Rule:
+    """
+    A validation check. For each chapter, the engine creates one instance of
+    every registered rule and walks the chapter once: `block` is called with
+    each fenced block and `line` with each line inside one, in order, then
+    `end` once, for the rules that override them. A rule collects its
+    findings in `issues`.
+    """
+
+    def __init__(self, chapter: Chapter):
+        self.chapter = chapter
+        self.issues: list[Issue] = []
+
+    def block(self, info: BlockInfo, block: FencedBlock) -> None:
+        pass
+
+    def line(self, text: str, number: int, info: BlockInfo) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+# Rules run, and report, in registration order
+rules: List[Type[Rule]] = []
+
+
+def rule(rule_type: Type[Rule]) -> Type[Rule]:
+    """Class decorator that registers a Rule with the engine."""
+    rules.append(rule_type)
+    return rule_type
+
 
-    for line in lines:
-        if slug_line_pattern.match(line):
-            if line in seen:
-                duplicates.append(Issue(f"Duplicate slug line", line))
-            seen.add(line)
+def overrides(rule_obj: Rule, hook: str) -> bool:
+    return getattr(type(rule_obj), hook) is not getattr(Rule, hook)
 
-    return duplicates
 
+def run_rules(chapter: Chapter, rule_types: Iterable[Type[Rule]] = rules) -> list[Issue]:
+    """Single pass over the chapter, dispatching to every rule."""
+    active = [rule_type(chapter) for rule_type in rule_types]
+    block_hooks = [r.block for r in active if overrides(r, "block")]
+    line_hooks = [r.line for r in active if overrides(r, "line")]
+    for info, block in zip(chapter.block_info, chapter.blocks):
+        for hook in block_hooks:
+            hook(info, block)
+        if line_hooks:
+            for number, text in enumerate(block.content.split("\n"), start=block.start_line + 1):
+                for hook in line_hooks:
+                    hook(text, number, info)
+    for r in active:
+        if overrides(r, "end"):
+            r.end()
+    return list(chain.from_iterable(r.issues for r in active))
 
-def check_for_missing_slug_lines(markdown_content: str) -> list[Issue]:
+
+@rule
+class MissingSlugLine(Rule):
     """Checks for missing slug lines in a Markdown file"""
-    missing_line_issues: list[Issue] = []
-    for slugless in examples_without_sluglines(markdown_content):
-        if not slugless.strip().startswith("```python"):
-            continue
-        missing_line_issues.append(Issue("Missing Slug Line", slugless))
-    return missing_line_issues
 
+    def block(self, info: BlockInfo, block: FencedBlock) -> None:
+        if info.fence_tag.startswith("python") and info.slug is None and block.content:
+            self.issues.append(Issue("Missing Slug Line", block.raw))
+
+
+@rule
+class DuplicateSlugLine(Rule):
+    """Checks for duplicate slug lines in a Markdown file."""
+
+    def __init__(self, chapter: Chapter):
+        super().__init__(chapter)
+        self.seen: set[str] = set()
 
-def check_for_colon_in_slug_tag(markdown_content: str) -> list[Issue]:
+    def line(self, text: str, number: int, info: BlockInfo) -> None:
+        if slug_line_pattern.match(text):
+            if text in self.seen:
+                self.issues.append(Issue(f"Duplicate slug line", text))
+            self.seen.add(text)
+
+
+@rule
+class ColonInSlugTag(Rule):
     """There shouldn't be a colon in the slug tag."""
-    issues: list[Issue] = []
-    lines = markdown_content.splitlines()
-    for i, line in enumerate(lines):
-        if line.strip().startswith("```python"):
-            slug_line = lines[i + 1]
-            if slug_line.strip().startswith("#:"):
-                issues.append(Issue("Colon in Slug Tag", slug_line))
 
-    return issues
+    def block(self, info: BlockInfo, block: FencedBlock) -> None:
+        if info.fence_tag.startswith("python") and info.first_line.strip().startswith("#:"):
+            self.issues.append(Issue("Colon in Slug Tag", info.first_line))
 
 
-# TODO: use md_examples util here:
-def check_for_main(markdown_content: str) -> list[Issue]:
+@rule
+class MainInExample(Rule):
     """Checks for '__main__' inside fenced code blocks in a Markdown file."""
-    mains: list[Issue] = []
-    in_code_block = False
-    lines = markdown_content.splitlines()
+    main = 'if __name__ == "__main__":'
+
+    def line(self, text: str, number: int, info: BlockInfo) -> None:
+        if self.main in text:
+            self.issues.append(Issue("__main__ found", f"line {number}"))
 
-    for i, line in enumerate(lines):
-        if line.strip().startswith("```"):
-            in_code_block = not in_code_block
-            continue
-        if in_code_block and 'if __name__ == "__main__":' in line:
-            mains.append(Issue("__main__ found", f"line {i + 1}"))
+    def end(self) -> None:
+        """A block left open at the end of the chapter runs to the end, so check it too."""
+        data = self.chapter.data
+        start = self.chapter.block_info[-1].end if self.chapter.block_info else 0
+        in_block = False
+        # The tail starts on the line of the last closing fence:
+        for number, text in enumerate(decode(data[start:]).splitlines(), start=data.count(b"\n", 0, start) + 1):
+            if text.strip().startswith("```"):
+                in_block = not in_block
+            elif in_block and self.main in text:
+                self.issues.append(Issue("__main__ found", f"line {number}"))
 
-    return mains
 
+# Add more rules here as needed, decorated with @rule
 
-# Define and populate the list of test functions
-validation_checks: List[Callable[[str], list[Issue]]] = [
-    check_for_missing_slug_lines,
-    check_for_duplicate_slug_lines,
-    check_for_colon_in_slug_tag,
-    check_for_main,
-    # Add more test functions here as needed
-]
 
 app = App(
     version_flags=[],
@@ -97,8 +146,7 @@ app = App(
 
 def check_markdown_file(markdown_file: ResolvedExistingFile) -> list[Issue]:
     """Validate a single Markdown file."""
-    content = markdown_file.read_text(encoding="utf-8")
-    return list(chain.from_iterable(check(content) for check in validation_checks))
+    return run_rules(load_chapter(markdown_file))
 
 
 def display_issues(issues: list[Issue], markdown_file: ResolvedExistingFile):
@@ -120,8 +168,41 @@ def validate_markdown_file(markdown_file: ResolvedExistingFile, verbose: Literal
 
 @app.command(name="-d")
 def validate_markdown_directory(markdown_dir: ResolvedExistingDirectory,
-                                verbose: Literal["verbose", "quiet"] = "quiet"):
+                                verbose: Literal["verbose", "quiet"] = "quiet",
+                                jobs: Annotated[int, Parameter(name="-j", help="Chapters to validate at once")] = 1):
     """Validate all Markdown files in a directory."""
-    for markdown_file in list(markdown_dir.glob("*.md")):
-        validate_markdown_file(markdown_file, verbose)
+    markdown_files = sorted(markdown_dir.glob("*.md"))
+    # Issues are displayed in chapter order however many processes run the checks
+    for markdown_file, issues in zip(markdown_files, map_chapters(check_markdown_file, markdown_files, jobs)):
+        if verbose == "verbose":
+            console.print(f"Validating {markdown_file.name}...")
+        display_issues(issues, markdown_file)
     console.print("[green]Markdown validation complete.[/green]")
+
+
+def test_custom_rule(tmp_path):
+    class TodoInExample(Rule):
+        def line(self, text: str, number: int, info: BlockInfo) -> None:
+            if "TODO" in text:
+                self.issues.append(Issue("TODO", f"line {number}"))
+
+    md = tmp_path / "C01_Test.md"
+    md.write_text("# Title\n\n```python\nx = 1  # TODO\n#: y.py\n```\n", encoding="utf-8")
+    chapter = load_chapter(md, tmp_path / "cache")
+    assert run_rules(chapter, [*rules, TodoInExample]) == [
+        Issue("Missing Slug Line", "```python\nx = 1  # TODO\n#: y.py\n```"),
+        Issue("TODO", "line 4"),
+    ]
+
+
+def test_every_line_and_unterminated_blocks(tmp_path):
+    md = tmp_path / "C02_Test.md"
+    md.write_text(
+        "```python\n# a.py\nx = 1\n```\n\n```python\n# b.py\n# a.py\n```\n\n"
+        '```python\n# c.py\nif __name__ == "__main__":\n    pass\n',
+        encoding="utf-8",
+    )
+    assert run_rules(load_chapter(md, tmp_path / "cache")) == [
+        Issue("Duplicate slug line", "# a.py"),
+        Issue("__main__ found", "line 13"),
+    ]
@@ -7,7 +7,7 @@ This tool parses Markdown files, extracts headers and code blocks, and generates
 an interactive browser presentation using Reveal.js.
 """
 import argparse
-import os
+import hashlib
 import re
 import shutil
 import subprocess
@@ -18,6 +18,11 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterator, List, Optional, Tuple, Union
 
+import pytest
+
+from pybooktools.util import config
+from pybooktools.util.disk_cache import DiskCache
+
 try:
     import ruff
 except ImportError:
@@ -124,33 +129,106 @@ def parse_markdown(markdown: str) -> Iterator[SlideContent]:
         yield SlideContent(bullets=bullets.copy())
 
 
-def format_code(code: str, width: int, language: str = None) -> str:
-    """Format code to fit within the specified width using ruff if available."""
-    if not code.strip():
-        return code
-
-    if ruff and language and language.lower() in ('python', 'py'):
-        try:
-            # Create a temporary file for ruff to format
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.py', delete=False) as temp:
-                temp.write(code)
-                temp_path = temp.name
-
-            # Run ruff format with line length
-            subprocess.run(
-                ["ruff", "format", "--line-length", str(width), temp_path],
-                check=True,
-                capture_output=True
-            )
+def is_python(language: Optional[str]) -> bool:
+    return bool(language) and language.lower() in ('python', 'py')
+
+
+class FormatCache(DiskCache):
+    """
+    Ruff output on disk, keyed by a hash of the code, the line width and the
+    ruff executable, so regenerating a presentation after an edit re-formats
+    only the code blocks that changed. Entries unused for max_age_days are evicted.
+    """
+
+    def __init__(self, cache_dir: Path = config.cache_dir / "ruff_format", max_age_days: float = 30):
+        super().__init__(cache_dir, ".py", max_age_days)
+        self.ruff_id = b""
+        if ruff_path := shutil.which("ruff"):  # An upgraded ruff may format differently
+            stat = Path(ruff_path).stat()
+            self.ruff_id = f"{ruff_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+
+    def key(self, code: str, width: int) -> str:
+        digest = hashlib.sha256()
+        for data in (self.ruff_id, str(width).encode(), code.encode("utf-8")):
+            digest.update(f"{len(data)}:".encode())
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.read(key)
+
+    def put(self, key: str, formatted: str) -> None:
+        self.write(key, formatted)
+
+
+def ruff_format_all(codes: List[str], width: int) -> List[Optional[str]]:
+    """
+    Formats all of codes in a single ruff run over a temporary directory.
+    Returns the formatted code for each, or None where ruff failed, e.g.
+    on a syntax error, which ruff reports without stopping.
+    """
+    names = [f"slide_{n}.py" for n in range(len(codes))]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, code in zip(names, codes):
+            (Path(temp_dir) / name).write_text(code, encoding="utf-8")
+        # Run in temp_dir, so ruff names each file that failed as it was given:
+        result = subprocess.run(
+            ["ruff", "format", "--no-cache", "--line-length", str(width), *names],
+            capture_output=True,
+            text=True,
+            cwd=temp_dir,
+        )
+        formatted = [(Path(temp_dir) / name).read_text(encoding="utf-8") for name in names]
+    if result.returncode == 0:
+        return formatted
+    print(f"Warning: Failed to format code with ruff: {result.stderr.strip()}", file=sys.stderr)
+    failed = {int(n) for n in re.findall(r"\bslide_(\d+)\.py:", result.stderr)}
+    if not failed:  # Ruff failed without naming a file, so trust none of them
+        return [None] * len(codes)
+    return [None if n in failed else new for n, new in enumerate(formatted)]
+
+
+def format_code_blocks(
+    blocks: List[Tuple[str, Optional[str]]],
+    width: int,
+    cache: Optional[FormatCache] = None
+) -> List[str]:
+    """
+    Formats each (code, language) block to fit within width, as format_code
+    does, running ruff once for all the Python blocks missing from the cache.
+    """
+    formatted = [code for code, _ in blocks]
+    if not ruff:
+        return formatted
+    cache = cache or FormatCache()
+    pending: dict[str, List[int]] = {}  # Key -> indexes of blocks with that code
+    for n, (code, language) in enumerate(blocks):
+        if not code.strip() or not is_python(language):
+            continue
+        key = cache.key(code, width)
+        if (cached := cache.get(key)) is not None:
+            formatted[n] = cached
+        else:
+            pending.setdefault(key, []).append(n)
+    if not pending:
+        return formatted
+    try:
+        results = ruff_format_all([blocks[indexes[0]][0] for indexes in pending.values()], width)
+    except Exception as e:
+        print(f"Warning: Failed to format code with ruff: {e}", file=sys.stderr)
+        return formatted
+    for (key, indexes), result in zip(pending.items(), results):
+        if result is None:
+            continue
+        cache.put(key, result)
+        for n in indexes:
+            formatted[n] = result
+    return formatted
 
-            # Read the formatted code
-            formatted_code = Path(temp_path).read_text()
-            os.unlink(temp_path)
-            return formatted_code
-        except Exception as e:
-            print(f"Warning: Failed to format code with ruff: {e}", file=sys.stderr)
 
-    return code
+def format_code(code: str, width: int, language: str = None) -> str:
+    """Format code to fit within the specified width using ruff if available."""
+    return format_code_blocks([(code, language)], width)[0]
 
 
 def generate_reveal_html(
@@ -163,6 +241,11 @@ def generate_reveal_html(
 ) -> str:
     """Generate HTML for a Reveal.js presentation."""
     slide_sections = []
+    # Format every code block up front, in one ruff run:
+    formatted_blocks = iter(format_code_blocks(
+        [(slide.code_block, slide.language) for slide in slides if not slide.bullets and slide.code_block],
+        code_width
+    ))
 
     for slide in slides:
         if slide.bullets:
@@ -190,7 +273,7 @@ def generate_reveal_html(
 
         elif slide.code_block:
             # Format and escape the code
-            formatted_code = format_code(slide.code_block, code_width, slide.language)
+            formatted_code = next(formatted_blocks)
             escaped_code = (
                 formatted_code
                 .replace("&", "&amp;")
@@ -489,5 +572,40 @@ def main():
         sys.exit(1)
 
 
+# --------------------------- TESTS ---------------------------
+
+needs_ruff = pytest.mark.skipif(
+    ruff is None or shutil.which("ruff") is None, reason="ruff is not installed"
+)
+
+
+def test_format_cache_round_trip(tmp_path: Path):
+    cache = FormatCache(tmp_path)
+    key = cache.key("x=1\n", 40)
+    assert key != cache.key("x=1\n", 60) and key != cache.key("x = 1\n", 40)
+    assert cache.get(key) is None
+    cache.put(key, "x = 1\n")
+    assert FormatCache(tmp_path).get(key) == "x = 1\n"
+
+
+@needs_ruff
+def test_format_code_blocks_formats_once(tmp_path: Path):
+    cache = FormatCache(tmp_path)
+    blocks = [("x=1\n", "python"), ("echo  hi\n", "bash"), ("def f( a ):\n  return a\n", "py"), ("x=1\n", "python")]
+    assert format_code_blocks(blocks, 80, cache) == [
+        "x = 1\n", "echo  hi\n", "def f(a):\n    return a\n", "x = 1\n",
+    ]
+    assert len(list(tmp_path.glob("*.py"))) == 2
+    # A syntax error leaves that block unchanged and uncached:
+    assert format_code_blocks([("y=2\n", "python"), ("def (:\n", "python")], 80, cache) == [
+        "y = 2\n", "def (:\n",
+    ]
+    assert len(list(tmp_path.glob("*.py"))) == 3
+    # Already-formatted blocks beside a syntax error are cached too:
+    blocks = [("z = 3\n", "python"), *[("def (:\n", "python")] * 11, ("w = 4\n", "python")]
+    assert format_code_blocks(blocks, 80, cache) == [code for code, _ in blocks]
+    assert len(list(tmp_path.glob("*.py"))) == 5
+
+
 if __name__ == "__main__":
     main()
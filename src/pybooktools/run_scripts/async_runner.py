@@ -0,0 +1,254 @@
+# async_runner.py
+"""
+Run examples from a single thread with asyncio subprocesses, instead of one
+thread per running example.
+
+Output is decoded as it arrives and handed to an OutputSink; TextSink keeps
+the text, as run_script does. Output past the OutputLimit is never read:
+the example is killed and the sink gets the truncation marker instead.
+"""
+import asyncio
+import codecs
+import io
+import os
+import time
+from asyncio.subprocess import PIPE
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Protocol
+
+import pytest
+
+from pybooktools.run_scripts.duration_store import DurationStore
+from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.result_cache import ResultCache, script_key
+from pybooktools.run_scripts.run_one_script import (
+    CHUNK_SIZE, OutputLimit, output_encoding, run_script, script_pythonpath, script_result, timed_out
+)
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util.display import warn
+
+
+class OutputSink(Protocol):
+    def write(self, text: str) -> None: ...
+
+    def text(self) -> str: ...
+
+
+class TextSink:
+    """Keeps the output as it is."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+
+    def write(self, text: str) -> None:
+        self.chunks.append(text)
+
+    def text(self) -> str:
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]  # Then the pieces can go, so the output is held once
+        return self.chunks[0] if self.chunks else ""
+
+
+def output_decoder() -> io.IncrementalNewlineDecoder:
+    """Incremental equivalent of decode_output: same encoding, newlines normalized."""
+    return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(output_encoding())(), translate=True)
+
+
+async def stream_into(stream: asyncio.StreamReader, sink: OutputSink, limit: OutputLimit) -> bool:
+    """
+    Decode stream into sink until EOF, or until it passes limit; then only
+    the output within the limit, and the truncation marker, reach the sink
+    and the result is True.
+    """
+    decoder = output_decoder()
+    size = lines = 0
+    at_line_start = True
+    while chunk := await stream.read(CHUNK_SIZE):
+        chunk_lines = chunk.count(b"\n")
+        if limit.exceeded(size + len(chunk), lines + chunk_lines):
+            chunk = OutputLimit(limit.max_bytes - size, limit.max_lines - lines).prefix(chunk)
+            text = decoder.decode(chunk)  # A character split at the cut is dropped
+            sink.write(text)
+            sink.write(limit.marker(chunk.endswith(b"\n") or (not chunk and at_line_start)))
+            return True
+        size, lines = size + len(chunk), lines + chunk_lines
+        at_line_start = chunk.endswith(b"\n")
+        sink.write(decoder.decode(chunk))
+    sink.write(decoder.decode(b"", final=True))
+    return False
+
+
+async def run_script_async(
+    script_path: Path,
+    timeout: Optional[float] = None,
+    sink: Optional[OutputSink] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> ScriptResult:
+    """
+    run_script as a coroutine: stdout goes to `sink` (a TextSink if none is
+    given) as it arrives, and the ScriptResult holds sink.text(). Cancelling
+    the coroutine kills the example, as does output past `limit`. asyncio
+    reaps the process itself, so only wall time is measured.
+    """
+    sink = TextSink() if sink is None else sink
+    errors = TextSink()
+    env = os.environ.copy()
+    env["PYTHONPATH"] = script_pythonpath(script_path)
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        get_virtual_env_python(), str(script_path), stdout=PIPE, stderr=PIPE, env=env
+    )
+
+    async def read(stream: asyncio.StreamReader, into: OutputSink) -> bool:
+        if over := await stream_into(stream, into, limit):
+            process.kill()
+        return over
+
+    try:
+        over = await asyncio.wait_for(
+            asyncio.gather(read(process.stdout, sink), read(process.stderr, errors), process.wait()),
+            timeout,
+        )
+    except TimeoutError:
+        process.kill()
+        await process.wait()
+        result = timed_out(script_path, process.returncode, timeout)
+        return result._replace(usage=ResourceUsage(time.perf_counter() - start))
+    finally:
+        if process.returncode is None:  # Cancelled
+            process.kill()
+            await process.wait()
+    usage = ResourceUsage(time.perf_counter() - start)
+    if over[0] or over[1]:
+        if not over[0]:
+            sink.write(limit.marker(False))  # Cut off for its stderr: mark the end of what it printed
+        warn(f"Output truncated: {script_path}")
+        return ScriptResult(-1, sink.text(), "truncated", usage=usage)
+    return script_result(script_path, process.returncode, sink.text(), errors.text())._replace(usage=usage)
+
+
+async def run_scripts_async(
+    scripts: Iterable[Path],
+    max_concurrent: Optional[int] = None,
+    cache: ResultCache | None = None,
+    timeout: Optional[float] = None,
+    sink: Callable[[Path], OutputSink] = lambda script_path: TextSink(),
+    durations: DurationStore | None = None,
+) -> list[ScriptResult]:
+    """
+    run_scripts_parallel on one thread: up to `max_concurrent` examples run at
+    once (default: number of processors), each streaming its output into
+    sink(script_path). Stops on the first failure, killing the examples
+    still running, and returns the results so far ending with the failure;
+    otherwise returns every result, in completion order. With `durations`,
+    examples start in its schedule order and each run is timed into it.
+    """
+    slots = asyncio.Semaphore(max_concurrent or os.cpu_count() or 4)
+
+    async def run(script_path: Path) -> ScriptResult:
+        key = script_key(cache, script_path) if cache else ""
+        if cache and (cached := cache.get(key)) is not None:
+            return cached
+        async with slots:
+            try:
+                result = await run_script_async(script_path, timeout, sink(script_path))
+            except OSError as exc:  # The interpreter could not be started
+                warn(f"Exception running script {script_path}: {exc}")
+                return ScriptResult(-1, str(exc), "failed")
+            if durations:
+                durations.record(script_path, result.status, result.usage)
+        if cache:
+            cache.put(key, result)
+        return result
+
+    if durations:
+        scripts = durations.schedule(scripts)
+    results: list[ScriptResult] = []
+    tasks = [asyncio.create_task(run(script_path)) for script_path in scripts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            results.append(result)
+            if result.return_code != 0:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+def run_scripts_concurrently(
+    scripts: Iterable[Path],
+    max_concurrent: Optional[int] = None,
+    cache: ResultCache | None = None,
+    timeout: Optional[float] = None,
+    durations: DurationStore | None = None,
+) -> list[ScriptResult]:
+    """Synchronous entry point for run_scripts_async."""
+    return asyncio.run(run_scripts_async(scripts, max_concurrent, cache, timeout, durations=durations))
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_newlines_across_chunks():
+    decoder = output_decoder()
+    sink = TextSink()
+    for chunk in [b"first li", b"ne\r", b"\nsecond\r", b"\n\nlast"]:
+        sink.write(decoder.decode(chunk))
+    sink.write(decoder.decode(b"", final=True))
+    assert sink.text() == "first line\nsecond\n\nlast"
+    assert sink.chunks == [sink.text()]
+
+
+def test_limit_reached_at_a_chunk_boundary():
+    class Chunks:
+        def __init__(self, *chunks: bytes):
+            self.chunks = list(chunks)
+
+        async def read(self, n: int) -> bytes:
+            return self.chunks.pop(0) if self.chunks else b""
+
+    limit = OutputLimit(max_bytes=1000, max_lines=3)
+    sink = TextSink()
+    assert asyncio.run(stream_into(Chunks(b"a\nb\nc\n", b"dddd\neeee\n"), sink, limit))
+    assert sink.text() == "a\nb\nc\n" + limit.marker()
+
+
+def test_async_matches_subprocess(tmp_path: Path):
+    from pybooktools.run_scripts.script_pool import _write_examples
+
+    for script in _write_examples(tmp_path):
+        assert asyncio.run(run_script_async(script)) == run_script(script), script
+
+
+def test_first_failure_cancels_the_rest(tmp_path: Path):
+    slow = [tmp_path / f"slow_{i}.py" for i in range(4)]
+    for script in slow:
+        script.write_text("import time\ntime.sleep(30)\n", encoding="utf-8")
+    fails = tmp_path / "fails.py"
+    fails.write_text("raise SystemExit(2)\n", encoding="utf-8")
+    results = run_scripts_concurrently([*slow, fails], max_concurrent=8, timeout=20)
+    assert [(r.return_code, r.status) for r in results] == [(2, "failed")]
+
+
+def test_runaway_output_is_truncated(tmp_path: Path):
+    from pybooktools.run_scripts.script_pool import ScriptPool
+
+    runaway = tmp_path / "runaway.py"
+    runaway.write_text("import itertools\nfor i in itertools.count():\n    print(i)\n", encoding="utf-8")
+    limit = OutputLimit()
+    expected = "".join(f"{i}\n" for i in range(limit.max_lines)) + limit.marker()
+    with ScriptPool(workers=1) as pool:
+        for result in [
+            run_script(runaway, timeout=20),
+            pool.run(runaway, timeout=20),
+            asyncio.run(run_script_async(runaway, timeout=20)),
+        ]:
+            assert result == ScriptResult(-1, expected, "truncated")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,74 @@
+# bench_fork_server.py
+"""
+Compare running book-style examples the current way, a fresh interpreter
+per example (run_script), with forking each one from a ForkServer that has
+already imported config.preload_modules. Each example imports a few of the
+usual modules and prints one line. Reports the latency of one example at a
+time, then the wall-clock time to run them all in parallel.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from pybooktools.run_scripts.fork_server import ForkServer, fork_available
+from pybooktools.run_scripts.run_all_scripts import run_scripts_parallel
+from pybooktools.run_scripts.run_one_script import run_script
+
+IMPORTS = [
+    "from dataclasses import dataclass",
+    "from enum import Enum",
+    "from typing import NamedTuple, Protocol",
+    "from pydantic import BaseModel",
+    "from rich.console import Console",
+]
+
+
+def write_examples(root: Path, count: int) -> list[Path]:
+    scripts = []
+    for n in range(count):
+        script = root / f"example_{n}.py"
+        imports = "\n".join(IMPORTS[: 3 + n % 3])
+        script.write_text(f"# {script.name}\n{imports}\nprint('example {n}')\n", encoding="utf-8")
+        scripts.append(script)
+    return scripts
+
+
+def per_example(run, scripts: list[Path]) -> float:
+    start = time.perf_counter()
+    for script in scripts:
+        assert run(script).return_code == 0, script
+    return (time.perf_counter() - start) / len(scripts)
+
+
+def all_parallel(scripts: list[Path], pool=None) -> float:
+    start = time.perf_counter()
+    results = run_scripts_parallel(scripts, os.cpu_count(), pool=pool)
+    assert all(result.return_code == 0 for result in results)
+    return time.perf_counter() - start
+
+
+def main(count: int = 60) -> None:
+    if not fork_available():
+        print("ForkServer needs os.fork; nothing to compare")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        scripts = write_examples(Path(tmp), count)
+        run_script(scripts[0])  # Warm the OS file cache for both
+        with ForkServer() as server:
+            for script in scripts:
+                assert server.run(script) == run_script(script), script
+            subprocess_each = per_example(run_script, scripts)
+            fork_each = per_example(server.run, scripts)
+            subprocess_all = all_parallel(scripts)
+            fork_all = all_parallel(scripts, server)
+        print(f"{count} examples, each importing 3-5 of: dataclasses, enum, typing, pydantic, rich")
+        print(f"fresh interpreter:  {subprocess_each * 1000:6.1f} ms per example, all in parallel {subprocess_all:.2f}s")
+        print(
+            f"fork server:        {fork_each * 1000:6.1f} ms per example, all in parallel {fork_all:.2f}s"
+            f"  ({subprocess_each / fork_each:.0f}x faster per example)"
+        )
+
+
+if __name__ == "__main__":
+    main()
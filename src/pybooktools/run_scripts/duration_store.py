@@ -0,0 +1,296 @@
+# duration_store.py
+"""
+Local history of how long each example took, kept in SQLite.
+
+Every run of a tool (`examples`, `validate`, ...) records, for each example
+it actually ran, its status and ResourceUsage: wall time and, where the
+runner measures them, CPU time and peak RSS. The parallel runners use the latest record of each
+example to `schedule` it: examples that failed last time first, so a
+fail-fast run stops early; then new examples, whose duration is unknown;
+then the rest, longest first, so slow examples don't start last and
+stretch the tail of the run.
+
+The history also answers which examples are slowest, and which got
+markedly slower than they used to be. Only the most recent `keep_runs`
+runs of each tool are kept.
+
+Each record is committed at once, in write-ahead-log mode, so tools running
+at the same time (px and a validate, say) share the store without holding
+it locked for a whole run.
+"""
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import pytest
+
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util import config
+
+SCHEMA_VERSION = 2  # A store with another version is started afresh
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tool TEXT NOT NULL,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    wall REAL NOT NULL,  -- seconds
+    user REAL,           -- CPU seconds, if the runner measured them
+    sys REAL,
+    max_rss INTEGER,     -- peak resident set size in KiB, likewise
+    PRIMARY KEY (run, path)
+);
+CREATE INDEX IF NOT EXISTS timings_by_path ON timings(path, run);
+"""
+
+
+class Timing(NamedTuple):
+    path: Path
+    status: str
+    usage: ResourceUsage
+
+
+class Regression(NamedTuple):
+    path: Path
+    before: float  # Median wall time over earlier runs
+    now: float
+
+
+class DurationStore:
+    """
+    The first `record` starts a new run of `tool`, so a store opened only
+    to report adds nothing. `record` is safe to call from many threads.
+    Use as a context manager so the run is saved.
+    """
+
+    def __init__(
+        self,
+        tool: str,
+        store: Path = config.cache_dir / "durations.sqlite3",
+        keep_runs: int = 50,
+    ):
+        self.tool = tool
+        self.keep_runs = keep_runs
+        store.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(store, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode = WAL")  # Readers don't block the writer, nor it them
+        self.db.execute("PRAGMA synchronous = NORMAL")  # Durable enough for timings, and fast to commit
+        self.db.execute("PRAGMA foreign_keys = ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS timings; DROP TABLE IF EXISTS runs;")
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.lock = threading.Lock()
+        self.run: Optional[int] = None
+
+    def record(self, script_path: Path, status: str, usage: ResourceUsage) -> None:
+        with self.lock:
+            if self.run is None:
+                self.run = self.db.execute(
+                    "INSERT INTO runs (tool, started) VALUES (?, ?)", (self.tool, time.time())
+                ).lastrowid
+            self.db.execute(
+                "INSERT OR REPLACE INTO timings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.run, str(script_path.resolve()), status, *usage),
+            )
+            self.db.commit()  # Don't keep other tools waiting on the store
+
+    def _latest(self) -> dict[str, tuple[str, float]]:
+        """path -> (status, wall) from the most recent earlier run of this tool that ran it."""
+        rows = self.db.execute(
+            """
+            SELECT path, status, wall, MAX(run) FROM timings
+            JOIN runs ON runs.id = timings.run
+            WHERE runs.tool = ? AND run IS NOT ?
+            GROUP BY path
+            """,
+            (self.tool, self.run),
+        )
+        return {path: (status, wall) for path, status, wall, _ in rows}
+
+    def schedule(self, scripts: Iterable[Path]) -> list[Path]:
+        """
+        scripts in the order to start them: failed last time, then never
+        run, then by last wall time, longest first. Ties keep their order.
+        """
+        with self.lock:
+            latest = self._latest()
+
+        def priority(script_path: Path) -> tuple[int, float]:
+            known = latest.get(str(script_path.resolve()))
+            if known is None:
+                return 1, 0.0
+            status, wall = known
+            return (0 if status != "ok" else 2), -wall
+
+        return sorted(scripts, key=priority)
+
+    def slowest(self, count: int = 10) -> list[Timing]:
+        """The examples with the longest wall time in their latest record, slowest first."""
+        with self.lock:
+            rows = self.db.execute(
+                """
+                SELECT path, status, wall, user, sys, max_rss, MAX(run) FROM timings
+                JOIN runs ON runs.id = timings.run
+                WHERE runs.tool = ?
+                GROUP BY path
+                ORDER BY wall DESC
+                LIMIT ?
+                """,
+                (self.tool, count),
+            ).fetchall()
+        return [Timing(Path(path), status, ResourceUsage(*usage)) for path, status, *usage, _ in rows]
+
+    def this_run(self) -> list[Timing]:
+        """Everything recorded by this run so far."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT path, status, wall, user, sys, max_rss FROM timings WHERE run IS ?", (self.run,)
+            ).fetchall()
+        return [Timing(Path(path), status, ResourceUsage(*usage)) for path, status, *usage in rows]
+
+    def regressions(self, factor: float = 1.5, min_increase: float = 0.1, history: int = 5) -> list[Regression]:
+        """
+        Examples whose latest successful wall time is over `factor` times,
+        and at least `min_increase` seconds above, the median of their
+        previous `history` successful runs. Largest slowdown first.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                """
+                SELECT path, wall FROM timings
+                JOIN runs ON runs.id = timings.run
+                WHERE runs.tool = ? AND status = 'ok'
+                ORDER BY path, run DESC
+                """,
+                (self.tool,),
+            ).fetchall()
+        walls: dict[str, list[float]] = {}
+        for path, wall in rows:
+            walls.setdefault(path, []).append(wall)
+        found = []
+        for path, (now, *earlier) in walls.items():
+            if not earlier:
+                continue
+            before = statistics.median(earlier[:history])
+            if now > before * factor and now - before >= min_increase:
+                found.append(Regression(Path(path), before, now))
+        return sorted(found, key=lambda r: r.before - r.now)
+
+    def close(self) -> None:
+        """Forget the runs older than the latest keep_runs."""
+        with self.lock:
+            self.db.execute(
+                """
+                DELETE FROM runs WHERE tool = ? AND id NOT IN (
+                    SELECT id FROM runs WHERE tool = ? ORDER BY id DESC LIMIT ?
+                )
+                """,
+                (self.tool, self.tool, self.keep_runs),
+            )
+            self.db.commit()
+            self.db.close()
+
+    def __enter__(self) -> "DurationStore":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def with_durations(
+    runner: Callable[[Path], ScriptResult], durations: DurationStore | None
+) -> Callable[[Path], ScriptResult]:
+    """
+    Wrap a run_script-style runner so each run's usage goes into `durations`,
+    timing the run if the runner didn't. Goes inside with_cache, so only
+    examples that actually run are recorded.
+    Cancelled examples didn't get to finish, so they aren't recorded.
+    With no store, returns runner unchanged.
+    """
+    if durations is None:
+        return runner
+
+    def timed_runner(script_path: Path) -> ScriptResult:
+        start = time.perf_counter()
+        result = runner(script_path)
+        if result.status != "cancelled":
+            usage = result.usage or ResourceUsage(time.perf_counter() - start)
+            durations.record(script_path, result.status, usage)
+        return result
+
+    return timed_runner
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_schedule_failed_then_new_then_longest(tmp_path: Path):
+    store = tmp_path / "durations.sqlite3"
+    quick, slow, broken, new = (tmp_path / f"{name}.py" for name in ("quick", "slow", "broken", "new"))
+    with DurationStore("examples", store) as durations:
+        durations.record(quick, "ok", ResourceUsage(0.1))
+        durations.record(slow, "ok", ResourceUsage(3.0))
+        durations.record(broken, "failed", ResourceUsage(0.2))
+    with DurationStore("validate", store) as durations:  # Other tools keep their own history
+        durations.record(quick, "ok", ResourceUsage(9.0))
+    with DurationStore("examples", store) as durations:
+        assert durations.schedule([quick, new, slow, broken]) == [broken, new, slow, quick]
+        durations.record(slow, "ok", ResourceUsage(0.5))
+        durations.record(broken, "ok", ResourceUsage(0.2))
+    with DurationStore("examples", store) as durations:
+        assert durations.schedule([quick, new, slow, broken]) == [new, slow, broken, quick]
+        assert [timing.path for timing in durations.slowest(2)] == [slow.resolve(), broken.resolve()]
+
+
+def test_regressions_and_pruning(tmp_path: Path):
+    store = tmp_path / "durations.sqlite3"
+    steady, slower = tmp_path / "steady.py", tmp_path / "slower.py"
+    for wall in (1.0, 1.1, 0.9, 1.0, 3.0):
+        with DurationStore("examples", store, keep_runs=4) as durations:
+            durations.record(steady, "ok", ResourceUsage(1.0))
+            durations.record(slower, "ok", ResourceUsage(wall))
+    with DurationStore("examples", store, keep_runs=4) as durations:
+        assert durations.regressions() == [Regression(slower.resolve(), 1.0, 3.0)]
+        assert durations.db.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 4
+
+
+def test_other_schema_version_starts_afresh(tmp_path: Path):
+    store = tmp_path / "durations.sqlite3"
+    old = sqlite3.connect(store)
+    old.executescript("CREATE TABLE timings (path TEXT, seconds REAL); PRAGMA user_version = 1;")
+    old.execute("INSERT INTO timings VALUES ('old.py', 1.0)")
+    old.commit()
+    old.close()
+    example = tmp_path / "example.py"
+    with DurationStore("examples", store) as durations:
+        durations.record(example, "ok", ResourceUsage(1.0, 0.5, 0.1, 2048))
+    with DurationStore("examples", store) as durations:
+        assert durations.db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert [(t.path, t.usage) for t in durations.slowest()] == [
+            (example.resolve(), ResourceUsage(1.0, 0.5, 0.1, 2048))
+        ]
+
+
+def test_concurrent_tools_share_the_store(tmp_path: Path):
+    store = tmp_path / "durations.sqlite3"
+    example = tmp_path / "example.py"
+    with DurationStore("examples", store) as px, DurationStore("validate", store) as validate:
+        px.record(example, "ok", ResourceUsage(1.0))
+        validate.record(example, "ok", ResourceUsage(2.0))  # While px's run is still open
+        px.record(example, "ok", ResourceUsage(1.5))
+        assert [t.usage.wall for t in validate.slowest()] == [2.0]
+    with DurationStore("examples", store) as durations:
+        assert [t.usage.wall for t in durations.slowest()] == [1.5]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,210 @@
+# fork_server.py
+"""
+Run examples in children forked from one warm fork server.
+
+A ScriptPool worker preloads common imports, but still runs its examples
+one after another, and has to undo what each example did to its
+interpreter. A ForkServer imports config.preload_modules once in a single
+server process (fork_worker) and forks a child per example, so every
+example starts at once with those modules already imported, runs in a
+process of its own, and leaves nothing behind. Examples run
+concurrently, with the same ScriptResult as run_script.
+
+Forking needs POSIX; elsewhere ForkServer.run falls back to run_script.
+"""
+import itertools
+import json
+import os
+import signal
+import subprocess
+import threading
+from concurrent.futures import Future, TimeoutError
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pytest
+
+from pybooktools.run_scripts import fork_worker
+from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.run_one_script import (
+    ChildProcesses, OutputLimit, cancelled, decode_output, run_script, script_pythonpath, script_result,
+    timed_out, truncated,
+)
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util import config
+
+
+def fork_available() -> bool:
+    return hasattr(os, "fork")
+
+
+class ForkedExample:
+    """
+    Stands in for the Popen of one forked example, so ChildProcesses can
+    stop it like any other example process.
+    """
+
+    def __init__(self, server: "ForkServer", request_id: int, response: Future):
+        self.server = server
+        self.request_id = request_id
+        self.response = response
+
+    def terminate(self) -> None:
+        self.server.send({"kill": self.request_id, "signal": signal.SIGTERM})
+
+    def kill(self) -> None:
+        self.server.send({"kill": self.request_id, "signal": signal.SIGKILL})
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        try:
+            self.response.exception(timeout)
+        except TimeoutError:
+            raise subprocess.TimeoutExpired("fork_worker", timeout)
+
+
+class ForkServer:
+    """
+    One fork server process; `run` is safe to call from many threads, and
+    examples run in parallel. Use as a context manager so the server is
+    shut down.
+    """
+
+    def __init__(self, preload: Iterable[str] = config.preload_modules):
+        self.process: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.responses: dict[int, Future] = {}
+        if not fork_available():
+            return
+        env = os.environ.copy()
+        env.pop("PYTHONPATH", None)  # Supplied per example instead
+        self.process = subprocess.Popen(
+            [get_virtual_env_python(), fork_worker.__file__, *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            env=env,
+        )
+        self.reader = threading.Thread(target=self._read_responses, daemon=True)
+        self.reader.start()
+
+    def _read_responses(self) -> None:
+        for line in self.process.stdout:
+            response = json.loads(line)
+            with self.lock:
+                future = self.responses.pop(response["id"])
+            future.set_result(response)
+        with self.lock:  # The server is gone: fail everything still waiting
+            self.process.poll()
+            waiting, self.responses = self.responses, {}
+        for future in waiting.values():
+            future.set_exception(EOFError("Fork server exited"))
+
+    def send(self, request: dict) -> None:
+        with self.lock:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+
+    def run(
+        self,
+        script_path: Path,
+        timeout: Optional[float] = None,
+        processes: Optional[ChildProcesses] = None,
+        limit: OutputLimit = OutputLimit(),
+    ) -> ScriptResult:
+        """Like run_script."""
+        if self.process is None or self.process.poll() is not None:
+            return run_script(script_path, timeout, processes, limit)
+        if processes is not None and processes.killed:
+            return cancelled(script_path)
+        request_id, response = next(self.ids), Future()
+        with self.lock:
+            self.responses[request_id] = response
+        example = ForkedExample(self, request_id, response)
+        try:
+            self.send({
+                "id": request_id,
+                "script": str(script_path),
+                "pythonpath": script_pythonpath(script_path),
+                "cwd": os.getcwd(),
+                "max_bytes": limit.max_bytes,
+                "timeout": timeout,
+            })
+            if processes is not None:
+                processes.add(example)
+            result = response.result()
+        except (EOFError, OSError):  # Let a real process give the real answer
+            return run_script(script_path, timeout, processes, limit)
+        finally:
+            if processes is not None:
+                processes.discard(example)
+        return_code = result["returncode"]
+        stdout, stderr = result["stdout"].encode("latin-1"), result["stderr"].encode("latin-1")
+        if result["timed_out"]:
+            outcome = timed_out(script_path, return_code, timeout)
+        elif any(limit.exceeded(len(output), output.count(b"\n")) for output in (stdout, stderr)):
+            outcome = truncated(script_path, limit.prefix(stdout), limit)
+        elif processes is not None and processes.killed and return_code != 0:
+            outcome = cancelled(script_path, return_code)
+        else:
+            outcome = script_result(script_path, return_code, decode_output(stdout), decode_output(stderr))
+        return outcome._replace(usage=ResourceUsage(result["wall"], result["user"], result["sys"], result["max_rss"]))
+
+    def close(self) -> None:
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.reader.join()
+
+    def __enter__(self) -> "ForkServer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_fork_server_matches_subprocess(tmp_path: Path):
+    """Holds with or without fork: without it, every example falls back."""
+    from pybooktools.run_scripts.script_pool import _write_examples
+
+    scripts = _write_examples(tmp_path)
+    with ForkServer() as server:
+        for script in scripts:
+            assert server.run(script) == run_script(script), script
+
+
+@pytest.mark.skipif(not fork_available(), reason="Needs os.fork")
+def test_forked_examples_run_concurrently_and_stop(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    slow = tmp_path / "slow.py"
+    slow.write_text("import time\ntime.sleep(30)\n", encoding="utf-8")
+    quick = tmp_path / "quick.py"
+    quick.write_text("import sys\nprint('preloaded' if 'fractions' in sys.modules else 'fresh')\n", encoding="utf-8")
+    monkeypatch.setattr(sys.modules[ForkServer.__module__], "run_script", lambda *args: pytest.fail("fell back"))
+    with ForkServer(preload=["fractions"]) as server, ThreadPoolExecutor(2) as executor:
+        stuck = executor.submit(server.run, slow, 1.0)
+        assert server.run(quick) == ScriptResult(0, "preloaded\n")
+        assert stuck.result(10).status == "timeout"
+        processes = ChildProcesses()
+        running = executor.submit(server.run, slow, None, processes)
+        while not processes.running:
+            time.sleep(0.01)
+        processes.kill_all()
+        assert running.result(10).status == "cancelled"
+        assert server.run(quick) == ScriptResult(0, "preloaded\n")  # The server survives both
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,210 @@
+# fork_worker.py
+"""
+Long-lived fork server used by ForkServer (POSIX only).
+
+Runs under the example interpreter (see get_virtual_env_python), which
+may not have pybooktools installed, so it only uses the standard library.
+
+    python fork_worker.py [module_to_preload ...]
+
+The server imports the preload modules once, then forks a child for each
+example. The child starts with every preloaded module already in memory
+(shared copy-on-write with the server), runs the example as `__main__`
+with the same sys.path as `python script` with the request's PYTHONPATH,
+and exits. Nothing the example does can leak into the server or into the
+next example.
+
+Reads one JSON request per line from stdin:
+    {"id": 1, "script": "path/to/example.py", "pythonpath": "...", "cwd": "...",
+     "max_bytes": 1000000, "timeout": 60.0}
+    {"kill": 1, "signal": 9}   (signal the child running request 1)
+and writes one JSON response per line to stdout as each example ends,
+in whatever order they end:
+    {"id": 1, "returncode": 0, "stdout": "...", "stderr": "...", "timed_out": false,
+     "wall": 0.01, "user": 0.01, "sys": 0.0, "max_rss": 20480}
+with the child's resource usage from os.wait4 (max_rss in KiB, as on Linux).
+
+Output is captured at the file-descriptor level as in pool_worker, at most
+max_bytes + 1 bytes of each stream are returned, and a child whose output
+passes max_bytes exits at once. A child still running `timeout` seconds
+after it started is killed. The server itself is single-threaded, so it
+is always safe to fork.
+"""
+import atexit
+import json
+import os
+import runpy
+import selectors
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import IO, NamedTuple
+
+if __package__:
+    from pybooktools.run_scripts.pool_worker import example_traceback, exit_code, preload, watch_output
+else:  # Run as a script, from its own directory
+    from pool_worker import example_traceback, exit_code, preload, watch_output
+
+
+class Child(NamedTuple):
+    id: int
+    out: IO[bytes]
+    err: IO[bytes]
+    max_bytes: int
+    deadline: float | None  # time.monotonic() at which it is killed
+    started: float  # time.monotonic()
+
+
+def run_child(request: dict, out: IO[bytes], err: IO[bytes], base_path: list[str]) -> int:
+    """Run the example in this freshly forked process; returns its exit status."""
+    script, pythonpath, cwd = request["script"], request["pythonpath"], request["cwd"]
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    os.chdir(cwd)
+    sys.argv = [script]
+    # Same sys.path the interpreter builds for `python script` with this PYTHONPATH:
+    sys.path[:] = [
+        os.path.dirname(os.path.realpath(script)),
+        *(entry or cwd for entry in pythonpath.split(os.pathsep)),
+        *base_path,
+    ]
+    os.environ["PYTHONPATH"] = pythonpath
+    watchdog = threading.Thread(
+        target=watch_output, args=((out, err), request["max_bytes"], threading.Event()), daemon=True
+    )
+    watchdog.start()
+    try:
+        runpy.run_path(script, run_name="__main__")
+        returncode = 0
+    except SystemExit as exc:
+        returncode = exit_code(exc)
+    except BaseException as exc:  # noqa Report it like an uncaught exception
+        traceback.print_exception(type(exc), exc, example_traceback(exc, script))
+        returncode = 1
+    # What the interpreter does on the way out of `python script`:
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and not thread.daemon:
+            thread.join()
+    atexit._run_exitfuncs()
+    return returncode
+
+
+def main() -> None:
+    requests_fd = os.dup(0)
+    responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    preload(sys.argv[1:])
+    base_path = sys.path[1:]  # sys.path[0] is this file's directory
+
+    # SIGCHLD wakes the selector through this pipe when a child ends:
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    signal.set_wakeup_fd(wakeup_w)
+    selector = selectors.DefaultSelector()
+    selector.register(requests_fd, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+
+    children: dict[int, Child] = {}  # By pid
+    timed_out: set[int] = set()
+    pending = b""
+    reading = True
+
+    def start(request: dict) -> None:
+        out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            returncode = 1
+            try:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                for fd in (requests_fd, wakeup_r, wakeup_w, responses.fileno()):
+                    os.close(fd)
+                returncode = run_child(request, out, err, base_path)
+            finally:
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(returncode)
+        timeout = request.get("timeout")
+        deadline = time.monotonic() + timeout if timeout else None
+        children[pid] = Child(request["id"], out, err, request["max_bytes"], deadline, time.monotonic())
+
+    def send_signal(request: dict) -> None:
+        for pid, child in children.items():
+            if child.id == request["kill"]:
+                os.kill(pid, request["signal"])
+
+    def reap() -> None:
+        while children:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            child = children.pop(pid)
+            max_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+            with child.out as out, child.err as err:
+                out.seek(0)
+                err.seek(0)
+                response = {
+                    "id": child.id,
+                    "returncode": os.waitstatus_to_exitcode(status),
+                    "stdout": out.read(child.max_bytes + 1).decode("latin-1"),
+                    "stderr": err.read(child.max_bytes + 1).decode("latin-1"),
+                    "timed_out": pid in timed_out,
+                    "wall": time.monotonic() - child.started,
+                    "user": usage.ru_utime,
+                    "sys": usage.ru_stime,
+                    "max_rss": max_rss,
+                }
+            timed_out.discard(pid)
+            responses.write(json.dumps(response) + "\n")
+            responses.flush()
+
+    while reading or children:
+        now = time.monotonic()
+        deadlines = []
+        for pid, child in children.items():
+            if child.deadline is None or pid in timed_out:
+                continue
+            if child.deadline <= now:
+                timed_out.add(pid)
+                os.kill(pid, signal.SIGKILL)
+            else:
+                deadlines.append(child.deadline)
+        wait = max(0.0, min(deadlines) - now) if deadlines else None
+        for key, _ in selector.select(wait):
+            if key.fd == wakeup_r:
+                while True:
+                    try:
+                        if not os.read(wakeup_r, 4096):
+                            break
+                    except BlockingIOError:
+                        break
+            elif reading:
+                data = os.read(requests_fd, 65536)
+                if not data:
+                    reading = False
+                    selector.unregister(requests_fd)
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    request = json.loads(line)
+                    if "kill" in request:
+                        send_signal(request)
+                    else:
+                        start(request)
+        reap()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# import_graph.py
+"""
+Persistent import graph for incremental example runs.
+
+Records, for every file involved in the last successful run, a hash of
+its content and the local files it imports. Given the examples found by
+find_python_files, `affected` returns only those whose own source, or the
+source of anything they transitively import (such as a shared `book_utils`
+module), changed since then. Search directories follow run_script: the
+example's directory and its parent.
+
+An unchanged file isn't parsed again, but the modules it imports are
+looked up again on every run, so a local module created since the last
+run (or one that now shadows another) counts as a change to its importers.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pytest
+
+from pybooktools.find_files.file_index import FileIndex
+from pybooktools.run_scripts.local_imports import imported_modules, resolve_imports
+from pybooktools.util import config
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def search_dirs(path: Path) -> list[Path]:
+    return [path.parent, path.parent.parent]
+
+
+class ImportGraph:
+    """
+    `name` identifies the tool keeping the record, since px and validate
+    each need to know what changed since *their* last run. With an `index`,
+    files it covers are only re-hashed when their mtime or size changed.
+    """
+
+    def __init__(self, name: str, cache_dir: Path = config.cache_dir, index: Optional[FileIndex] = None):
+        self.store = cache_dir / f"import_graph_{name}.json"
+        self.index = index
+        # resolved path -> {"hash": str, "imports": [resolved path, ...],
+        #                   "modules": [[module name, relative import base or None], ...]}
+        self.nodes: dict[str, dict] = {}
+        if self.store.exists():
+            try:
+                self.nodes = json.loads(self.store.read_text(encoding="utf-8"))
+            except ValueError:
+                self.nodes = {}
+
+    def _modules(self, path: Path, digest: str) -> list[tuple[str, Path | None]]:
+        """Every module path imports; reuses the recorded list when the file is unchanged."""
+        node = self.nodes.get(str(path))
+        if node and node["hash"] == digest and "modules" in node:
+            return [(module, base and Path(base)) for module, base in node["modules"]]
+        return imported_modules(path.read_text(encoding="utf-8"), path.parent)
+
+    def _scan(
+        self, files: Iterable[Path]
+    ) -> tuple[dict[Path, str], dict[Path, list[Path]], dict[Path, list[tuple[str, Path | None]]]]:
+        """Current hash, imported modules and direct local imports of files and everything they import."""
+        hashes: dict[Path, str] = {}
+        edges: dict[Path, list[Path]] = {}
+        modules: dict[Path, list[tuple[str, Path | None]]] = {}
+        pending = [(f.resolve(), search_dirs(f.resolve())) for f in files]
+        while pending:
+            path, roots = pending.pop()
+            if path in hashes or not path.is_file():
+                continue
+            hashes[path] = (self.index and self.index.file_hash(path)) or file_hash(path)
+            modules[path] = self._modules(path, hashes[path])
+            edges[path] = resolve_imports(modules[path], roots)  # Looked up afresh: new modules show up
+            pending.extend((imported, roots) for imported in edges[path])
+        return hashes, edges, modules
+
+    def affected(self, files: Iterable[Path]) -> list[Path]:
+        """
+        The files that changed, or whose imports now resolve to other files (one
+        was created or deleted), or that transitively import such a file.
+        """
+        files = list(files)
+        hashes, edges, _ = self._scan(files)
+        changed = set()
+        for path, digest in hashes.items():
+            node = self.nodes.get(str(path), {})
+            if node.get("hash") != digest or set(node.get("imports", [])) != {str(p) for p in edges[path]}:
+                changed.add(path)
+        dependents: dict[Path, set[Path]] = defaultdict(set)
+        for path, imports in edges.items():
+            for imported in imports:
+                dependents[imported].add(path)
+        stale = set(changed)
+        pending = list(changed)
+        while pending:
+            for dependent in dependents[pending.pop()]:
+                if dependent not in stale:
+                    stale.add(dependent)
+                    pending.append(dependent)
+        return [f for f in files if f.resolve() in stale]
+
+    def record(self, succeeded: Iterable[Path], failed: Iterable[Path] = ()) -> None:
+        """
+        Remember the current state of files that ran successfully, and their imports.
+        Failed files are forgotten, so they run again next time.
+        """
+        hashes, edges, modules = self._scan(succeeded)
+        for path, digest in hashes.items():
+            self.nodes[str(path)] = {
+                "hash": digest,
+                "imports": [str(p) for p in edges[path]],
+                "modules": [[module, base and str(base)] for module, base in modules[path]],
+            }
+        for path in failed:
+            self.nodes.pop(str(path.resolve()), None)
+
+    def save(self) -> None:
+        self.store.parent.mkdir(parents=True, exist_ok=True)
+        self.store.write_text(json.dumps(self.nodes, indent=1), encoding="utf-8")
+        if self.index:
+            self.index.save()  # Keep the hashes computed along the way
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_only_dependents_of_changed_files(tmp_path: Path):
+    (tmp_path / "book_utils.py").write_text("# book_utils.py\nX = 1\n", encoding="utf-8")
+    chapter = tmp_path / "c01"
+    chapter.mkdir()
+    uses_utils = chapter / "uses_utils.py"
+    uses_utils.write_text("# uses_utils.py\nfrom book_utils import X\n", encoding="utf-8")
+    uses_sibling = chapter / "uses_sibling.py"
+    uses_sibling.write_text("# uses_sibling.py\nimport helper\n", encoding="utf-8")
+    (chapter / "helper.py").write_text("# helper.py\nfrom book_utils import X\n", encoding="utf-8")
+    standalone = chapter / "standalone.py"
+    standalone.write_text("# standalone.py\nimport sys\n", encoding="utf-8")
+    examples = [standalone, uses_sibling, uses_utils]
+
+    graph = ImportGraph("test", tmp_path)
+    assert graph.affected(examples) == examples  # First run: everything
+    graph.record(examples)
+    graph.save()
+
+    graph = ImportGraph("test", tmp_path)
+    assert graph.affected(examples) == []
+    (tmp_path / "book_utils.py").write_text("# book_utils.py\nX = 2\n", encoding="utf-8")
+    assert graph.affected(examples) == [uses_sibling, uses_utils]
+    graph.record([uses_utils], failed=[uses_sibling])
+    assert graph.affected(examples) == [uses_sibling]
+
+
+def test_new_local_module_affects_its_importers(tmp_path: Path):
+    chapter = tmp_path / "c01"
+    chapter.mkdir()
+    example = chapter / "example.py"
+    example.write_text("# example.py\nimport sys\nimport helper\n", encoding="utf-8")
+    graph = ImportGraph("test", tmp_path)
+    graph.record([example])
+    graph.save()
+
+    graph = ImportGraph("test", tmp_path)
+    assert graph.affected([example]) == []
+    (chapter / "helper.py").write_text("# helper.py\n", encoding="utf-8")
+    assert graph.affected([example]) == [example]
+    graph.record([example])
+    assert graph.affected([example]) == []
+
+
+def test_deleted_local_module_affects_its_importers(tmp_path: Path):
+    chapter = tmp_path / "c01"
+    chapter.mkdir()
+    example = chapter / "example.py"
+    example.write_text("# example.py\nimport helper\n", encoding="utf-8")
+    (chapter / "helper.py").write_text("# helper.py\n", encoding="utf-8")
+    graph = ImportGraph("test", tmp_path)
+    graph.record([example])
+    assert graph.affected([example]) == []
+    (chapter / "helper.py").unlink()
+    assert graph.affected([example]) == [example]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,229 @@
+# interpreter_pool.py
+"""
+Run examples in subinterpreters: isolated interpreters inside this process,
+each with its own modules and GIL (concurrent.interpreters, Python 3.14).
+
+Examples run in parallel without starting a process apiece, and produce
+the same ScriptResult as run_script (or run_statements). Everything a subinterpreter can't do
+the same way falls back to a subprocess automatically:
+  - no InterpreterPoolExecutor (Python before 3.14);
+  - a virtual environment other than this interpreter's, since
+    subinterpreters run this interpreter's site-packages;
+  - examples that import extension modules without subinterpreter
+    support, or call os._exit() (see interpreter_worker).
+
+A subinterpreter can't be killed: an example that times out is reported
+as such, but keeps its worker busy until it ends. Closing the pool then
+doesn't wait for it, but the process can't exit until it ends. Subinterpreters share
+the process's CPU and memory accounting, so only wall time is measured.
+"""
+import os
+import sys
+import time
+from concurrent.futures import TimeoutError
+from pathlib import Path
+from typing import Callable, Optional
+
+import pytest
+
+from pybooktools.run_scripts import interpreter_worker
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.run_one_script import (
+    ChildProcesses, OutputLimit, cancelled, decode_output, output_encoding, run_script, run_source,
+    script_pythonpath, script_result, source_pythonpath, timed_out, truncated,
+)
+from pybooktools.run_scripts.run_statements import run_statements, statement_result
+from pybooktools.run_scripts.script_result import ScriptResult
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:  # Before Python 3.14
+    InterpreterPoolExecutor = None
+
+
+def subinterpreters_available() -> bool:
+    """True if examples can run in subinterpreters of this interpreter."""
+    venv = os.getenv("VIRTUAL_ENV")
+    return InterpreterPoolExecutor is not None and (
+        not venv or Path(venv).resolve() == Path(sys.prefix).resolve()
+    )
+
+
+class InterpreterPool:
+    """
+    A fixed number of worker subinterpreters, with the same `run` as
+    ScriptPool plus `run_source` for px. Safe to call from many threads.
+    Use as a context manager so the workers are shut down.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.executor = (
+            InterpreterPoolExecutor(max_workers=workers or os.cpu_count() or 4)
+            if subinterpreters_available() else None
+        )
+        self.hung = False  # An example timed out and is still running
+
+    def _run(
+        self,
+        script_path: Path,
+        source: Optional[str],
+        timeout: Optional[float],
+        limit: OutputLimit,
+        fallback: Callable[[], ScriptResult],
+        statements: bool = False,
+    ) -> ScriptResult:
+        if self.executor is None:
+            return fallback()
+        pythonpath = script_pythonpath(script_path) if source is None else source_pythonpath(script_path)
+        start = time.perf_counter()
+        future = self.executor.submit(
+            interpreter_worker.run,
+            str(script_path), pythonpath, os.getcwd(), limit.max_bytes, output_encoding(), source, statements,
+        )
+        try:
+            response = future.result(timeout)
+        except TimeoutError:
+            if not future.cancel():
+                self.hung = True
+            return timed_out(script_path, -1, timeout)
+        except Exception:  # noqa The worker itself failed: let a real process give the real answer
+            return fallback()
+        if response["unsupported"]:
+            return fallback()
+        usage = ResourceUsage(time.perf_counter() - start)
+        stdout, stderr = response["stdout"], response["stderr"]
+        if statements:
+            result = statement_result(script_path, response["returncode"], stdout, response["positions"], stderr, limit)
+        elif any(limit.exceeded(len(output), output.count(b"\n")) for output in (stdout, stderr)):
+            result = truncated(script_path, limit.prefix(stdout), limit)
+        else:
+            result = script_result(script_path, response["returncode"], decode_output(stdout), decode_output(stderr))
+        return result._replace(usage=usage)
+
+    def run(
+        self,
+        script_path: Path,
+        timeout: Optional[float] = None,
+        processes: Optional[ChildProcesses] = None,
+        limit: OutputLimit = OutputLimit(),
+    ) -> ScriptResult:
+        """Like run_script. `processes` only stops examples that have not started."""
+        if processes is not None and processes.killed:
+            return cancelled(script_path)
+        return self._run(
+            script_path, None, timeout, limit, lambda: run_script(script_path, timeout, processes, limit)
+        )
+
+    def run_source(
+        self,
+        source: str,
+        script_path: Path,
+        timeout: Optional[float] = None,
+        limit: OutputLimit = OutputLimit(),
+    ) -> ScriptResult:
+        """Like run_source."""
+        return self._run(
+            script_path, source, timeout, limit, lambda: run_source(source, script_path, timeout, limit)
+        )
+
+    def run_statements(
+        self,
+        source: str,
+        script_path: Path,
+        timeout: Optional[float] = None,
+        limit: OutputLimit = OutputLimit(),
+    ) -> ScriptResult:
+        """Like run_statements."""
+        return self._run(
+            script_path, source, timeout, limit, lambda: run_statements(source, script_path, timeout, limit), True
+        )
+
+    def close(self) -> None:
+        """
+        Shut the workers down, dropping examples that haven't started. If an
+        example has hung, don't wait for it: it still runs until it ends, and
+        Python waits for it before the process exits.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=not self.hung, cancel_futures=True)
+
+    def __enter__(self) -> "InterpreterPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_interpreter_pool_matches_subprocess(tmp_path: Path):
+    """Holds with or without subinterpreters: without them, every example falls back."""
+    from pybooktools.run_scripts.script_pool import _write_examples
+
+    scripts = _write_examples(tmp_path)
+    with InterpreterPool(workers=2) as pool:
+        for script in scripts:
+            assert pool.run(script) == run_script(script), script
+            source = script.read_text(encoding="utf-8")
+            assert pool.run_source(source, script) == run_source(source, script), script
+            assert pool.run_statements(source, script) == run_statements(source, script), script
+
+
+@pytest.mark.skipif(not subinterpreters_available(), reason="Needs Python 3.14 subinterpreters")
+def test_examples_run_in_subinterpreters(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    from pybooktools.run_scripts import interpreter_pool
+
+    script = tmp_path / "example.py"
+    script.write_text("print('in a subinterpreter')\n", encoding="utf-8")
+    monkeypatch.setattr(interpreter_pool, "run_script", lambda *args: pytest.fail("fell back"))
+    with InterpreterPool(workers=1) as pool:
+        assert pool.run(script) == ScriptResult(0, "in a subinterpreter\n")
+
+
+OUTSIDE_THE_CAPTURE = {
+    "fd_write.py": "import os\nprint('before')\nos.write(1, b'direct\\n')\n",
+    "child.py": "import subprocess, sys\nsubprocess.run([sys.executable, '-c', 'print(42)'])\n",
+    "system.py": "import os\nos.system('echo shell')\n",
+    "fileno.py": "import os, sys\nos.write(sys.stdout.fileno(), b'fileno\\n')\n",
+    "dunder.py": "import sys\nprint('original stdout', file=sys.__stdout__)\n",
+}
+
+
+def test_output_outside_the_capture_matches_subprocess(tmp_path: Path):
+    with InterpreterPool(workers=1) as pool:
+        for name, source in OUTSIDE_THE_CAPTURE.items():
+            script = tmp_path / name
+            script.write_text(source, encoding="utf-8")
+            assert pool.run(script) == run_script(script), name
+
+
+def test_worker_refuses_what_it_cannot_capture(tmp_path: Path):
+    """interpreter_worker.run works the same in the main interpreter, so it can be checked here."""
+    import subprocess
+
+    write, system, stdout = os.write, os.system, sys.__stdout__
+    for name, source in OUTSIDE_THE_CAPTURE.items():
+        script = tmp_path / name
+        script.write_text(source, encoding="utf-8")
+        response = interpreter_worker.run(str(script), "", str(tmp_path), 1000, "utf-8")
+        assert response["unsupported"] == (name != "dunder.py"), name
+        # Everything is put back:
+        assert (os.write, os.system, sys.__stdout__) == (write, system, stdout)
+        assert sys.modules["subprocess"] is subprocess
+    assert response["stdout"] == b"original stdout\n"
+
+
+@pytest.mark.skipif(not subinterpreters_available(), reason="Needs Python 3.14 subinterpreters")
+def test_close_does_not_wait_for_a_hung_example(tmp_path: Path):
+    script = tmp_path / "hangs.py"
+    script.write_text("import time\ntime.sleep(3)\n", encoding="utf-8")
+    pool = InterpreterPool(workers=1)
+    assert pool.run(script, timeout=0.2).status == "timeout"
+    start = time.perf_counter()
+    pool.close()
+    assert time.perf_counter() - start < 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
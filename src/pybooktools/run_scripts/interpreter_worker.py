@@ -0,0 +1,202 @@
+# interpreter_worker.py
+"""
+Runs one example inside a worker subinterpreter of an InterpreterPool.
+
+Each subinterpreter imports this module for itself, so like pool_worker it
+only uses the standard library. Subinterpreters share the process's file
+descriptors, so output is captured per interpreter by replacing sys.stdout
+and sys.stderr (and sys.__stdout__ and sys.__stderr__), and the example's
+PYTHONPATH only goes into this interpreter's sys.path. Output beyond
+max_bytes stops the example.
+
+An example that can't run here is reported as unsupported, and the pool
+runs it in a subprocess, which captures everything and gives children the
+example's PYTHONPATH. That's an example that:
+  - imports an extension module without subinterpreter support;
+  - calls os._exit(), which would end the whole process;
+  - writes to file descriptor 1 or 2 directly, or asks for their fileno(),
+    since that output would bypass the capture;
+  - starts a process (subprocess, multiprocessing, os.system, os.fork, ...)
+    or imports ctypes or cffi, whose output would bypass it too.
+"""
+import builtins
+import importlib.abc
+import io
+import linecache
+import os
+import runpy
+import sys
+import traceback
+import types
+import warnings
+
+from pybooktools.run_scripts.pool_worker import example_traceback, exit_code
+from pybooktools.run_scripts.statement_worker import execute_statements
+
+
+class NeedsProcess(BaseException):
+    """The example must run in a process of its own."""
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised into the example when its output passes max_bytes."""
+
+
+class CappedBuffer(io.BytesIO):
+    """Keeps at most max_bytes + 1 bytes, then stops the example."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def write(self, data) -> int:
+        room = self.max_bytes + 1 - self.tell()
+        if len(data) > room:
+            super().write(bytes(data[:max(room, 0)]))
+            raise OutputLimitExceeded
+        return super().write(data)
+
+    def fileno(self) -> int:
+        raise NeedsProcess
+
+
+def refuse(*args, **kwargs) -> None:
+    raise NeedsProcess
+
+
+# Modules whose use escapes the capture, and os functions that start processes:
+PROCESS_MODULES = frozenset({"subprocess", "multiprocessing", "ctypes", "cffi", "pty", "_posixsubprocess"})
+PROCESS_FUNCTIONS = [
+    name for name in (
+        "system", "popen", "fork", "forkpty", "posix_spawn", "posix_spawnp",
+        "execl", "execle", "execlp", "execlpe", "execv", "execve", "execvp", "execvpe",
+        "spawnl", "spawnle", "spawnlp", "spawnlpe", "spawnv", "spawnve", "spawnvp", "spawnvpe",
+    )
+    if hasattr(os, name)
+]
+
+
+def in_process_modules(name: str) -> bool:
+    return name.partition(".")[0] in PROCESS_MODULES or name.startswith("concurrent.futures.process")
+
+
+class RefuseProcessModules(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if in_process_modules(name):
+            raise NeedsProcess
+        return None
+
+
+_base_modules: set[str] | None = None
+
+
+def run(
+    script: str,
+    pythonpath: str,
+    cwd: str,
+    max_bytes: int,
+    encoding: str,
+    source: str | None = None,
+    statements: bool = False,
+) -> dict[str, int | bytes | bool | list[int]]:
+    """
+    Run script as `__main__` (or `source` in its place, as run_source does)
+    in this subinterpreter, returning its exit status and captured output. With
+    statements, source runs one top-level statement at a time and
+    "positions" holds where each statement's output ends (see statement_worker).
+    """
+    global _base_modules
+    if _base_modules is None:
+        _base_modules = set(sys.modules)
+    out, err = CappedBuffer(max_bytes), CappedBuffer(max_bytes)
+    streams = [io.TextIOWrapper(buffer, encoding, write_through=True) for buffer in (out, err)]
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    saved_argv, saved_path = sys.argv, sys.path[:]
+    saved_filters = warnings.filters[:]
+    saved_os = {name: getattr(os, name) for name in ("_exit", "write", *PROCESS_FUNCTIONS)}
+    saved_dunder_streams = sys.__stdout__, sys.__stderr__
+    saved_main = sys.modules["__main__"]
+    # Already imported here, they'd skip the finder; they're put back afterwards:
+    hidden = {name: sys.modules.pop(name) for name in list(sys.modules) if in_process_modules(name)}
+    finder = RefuseProcessModules()
+
+    def write(fd: int, data) -> int:
+        if fd in (1, 2):
+            raise NeedsProcess
+        return saved_os["write"](fd, data)
+
+    sys.stdin = io.StringIO()
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__ = streams
+    for name in ("_exit", *PROCESS_FUNCTIONS):
+        setattr(os, name, refuse)
+    os.write = write
+    sys.meta_path.insert(0, finder)
+    sys.argv = [script]
+    sys.path[:] = [
+        os.path.dirname(os.path.realpath(script)) if source is None else "",
+        *(entry or cwd for entry in pythonpath.split(os.pathsep)),
+        *saved_path[1:],
+    ]
+    returncode = 0
+    unsupported = False
+    positions: list[int] = []
+
+    def mark() -> int:
+        streams[0].flush()
+        return out.tell()
+
+    try:
+        if statements:
+            execute_statements(source, script, mark, positions)
+        elif source is None:
+            runpy.run_path(script, run_name="__main__")
+        else:
+            main = types.ModuleType("__main__")
+            main.__builtins__ = builtins
+            main.__file__ = script
+            sys.modules["__main__"] = main
+            linecache.cache[script] = (len(source), None, source.splitlines(True), script)
+            exec(compile(source, script, "exec"), main.__dict__)
+    except SystemExit as exc:
+        returncode = exit_code(exc)
+    except (NeedsProcess, OutputLimitExceeded) as exc:
+        unsupported = isinstance(exc, NeedsProcess)
+        returncode = 1
+    except ImportError as exc:
+        unsupported = "subinterpreter" in str(exc)
+        traceback.print_exception(type(exc), exc, example_traceback(exc, script))
+        returncode = 1
+    except BaseException as exc:  # noqa Report it like an uncaught exception
+        try:
+            traceback.print_exception(type(exc), exc, example_traceback(exc, script))
+        except OutputLimitExceeded:
+            pass
+        returncode = 1
+    finally:
+        for stream in streams:
+            try:
+                stream.flush()
+            except OutputLimitExceeded:
+                pass
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        warnings.filters[:] = saved_filters
+        for name, function in saved_os.items():
+            setattr(os, name, function)
+        sys.__stdout__, sys.__stderr__ = saved_dunder_streams
+        sys.meta_path.remove(finder)
+        sys.modules["__main__"] = saved_main
+        if source is not None:
+            linecache.cache.pop(script, None)  # The file's own lines, if it runs from disk next time
+        # Forget everything the example imported, including its sibling modules:
+        for name in set(sys.modules) - _base_modules:
+            del sys.modules[name]
+        sys.modules.update(hidden)
+
+    return {
+        "returncode": returncode,
+        "stdout": out.getvalue(),
+        "stderr": err.getvalue(),
+        "unsupported": unsupported,
+        "positions": positions,
+    }
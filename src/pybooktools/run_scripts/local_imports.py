@@ -0,0 +1,77 @@
+# local_imports.py
+"""
+Find the modules an example imports from its own book repository,
+as opposed to the standard library or installed packages.
+"""
+import ast
+from pathlib import Path
+
+
+def module_file(module: str, search_dirs: list[Path]) -> Path | None:
+    """Where `import module` would find a local file, if it would."""
+    parts = module.split(".")
+    for directory in search_dirs:
+        base = directory.joinpath(*parts)
+        for candidate in (base.with_name(base.name + ".py"), base / "__init__.py"):
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def imported_modules(source: str, package_dir: Path) -> list[tuple[str, Path | None]]:
+    """
+    (module name, base directory) for every import statement in source.
+    The base directory is None for absolute imports, which use the search path,
+    and the resolved package directory for relative imports.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+    modules: list[tuple[str, Path | None]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend((alias.name, None) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = None
+            if node.level:
+                base = package_dir
+                for _ in range(node.level - 1):
+                    base = base.parent
+            if node.module:
+                modules.append((node.module, base))
+            # `from pkg import mod` may name submodules:
+            prefix = f"{node.module}." if node.module else ""
+            modules.extend((prefix + alias.name, base) for alias in node.names)
+    return modules
+
+
+def resolve_imports(modules: list[tuple[str, Path | None]], search_dirs: list[Path]) -> list[Path]:
+    """The local files, resolved, for modules as listed by imported_modules."""
+    found: dict[Path, None] = {}
+    for module, base in modules:
+        module_path = module_file(module, [base] if base else search_dirs)
+        if module_path is not None:
+            found[module_path.resolve()] = None
+    return list(found)
+
+
+def direct_imports(path: Path, search_dirs: list[Path]) -> list[Path]:
+    """Local files imported by the file at path itself, resolved."""
+    return resolve_imports(imported_modules(path.read_text(encoding="utf-8"), path.parent), search_dirs)
+
+
+def local_imports(script_path: Path, search_dirs: list[Path]) -> list[Path]:
+    """
+    All local files script_path depends on through imports, transitively,
+    in a stable order. Modules not found in search_dirs are ignored.
+    """
+    script = script_path.resolve()
+    found: set[Path] = set()
+    pending = [script]
+    while pending:
+        for path in direct_imports(pending.pop(), search_dirs):
+            if path != script and path not in found:
+                found.add(path)
+                pending.append(path)
+    return sorted(found)
@@ -0,0 +1,161 @@
+# pool_worker.py
+"""
+Long-lived worker process used by ScriptPool.
+
+Runs under the example interpreter (see get_virtual_env_python), which
+may not have pybooktools installed, so it only uses the standard library.
+
+    python pool_worker.py [module_to_preload ...]
+
+Reads one JSON request per line from stdin:
+    {"script": "path/to/example.py", "pythonpath": "...", "cwd": "...", "max_bytes": 1000000,
+     "stdout": "path/to/capture", "stderr": "path/to/capture"}
+and writes one JSON response per line to stdout:
+    {"returncode": 0, "user": 0.01, "sys": 0.0}
+where user and sys are the CPU seconds the worker spent on the example.
+
+Each example runs as `__main__` in a fresh namespace with file-descriptor
+level capture into the two files named in the request, so output from C
+code and child processes is captured too. ScriptPool reads the files
+itself, so the output is there even if the example ends the worker with
+os._exit(). If an example's output passes max_bytes while it runs, the
+worker exits at once, so a runaway example cannot fill the disk; ScriptPool
+then reports the output so far, truncated.
+"""
+import importlib
+import json
+import os
+import runpy
+import sys
+import threading
+import traceback
+import warnings
+from types import TracebackType
+
+
+def preload(modules: list[str]) -> None:
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:  # noqa Not installed, or broken: examples will see it themselves
+            pass
+
+
+def exit_code(exc: SystemExit) -> int:
+    """Mirror the interpreter's handling of an uncaught SystemExit."""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def example_traceback(exc: BaseException, script: str) -> TracebackType | None:
+    """Drop the runpy frames so the traceback matches a direct run."""
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != script:
+        tb = tb.tb_next
+    return tb or exc.__traceback__
+
+
+def watch_output(files: tuple, max_bytes: int, done: threading.Event) -> None:
+    """Runs beside an example, ending the worker if the example's output passes max_bytes."""
+    while not done.wait(0.05):
+        if any(os.fstat(f.fileno()).st_size > max_bytes for f in files):
+            os._exit(3)
+
+
+def run_one(
+    script: str,
+    pythonpath: str,
+    cwd: str,
+    max_bytes: int,
+    stdout: str,
+    stderr: str,
+    base_path: list[str],
+    base_modules: set[str],
+) -> dict[str, int | float]:
+    out = open(stdout, "wb")
+    err = open(stderr, "wb")
+    done = threading.Event()
+    watchdog = threading.Thread(target=watch_output, args=((out, err), max_bytes, done), daemon=True)
+    saved_stdout, saved_stderr = sys.stdout, sys.stderr
+    saved_argv, saved_path = sys.argv, sys.path[:]
+    saved_filters = warnings.filters[:]
+    saved_cwd = os.getcwd()
+    saved_fds = os.dup(1), os.dup(2)
+
+    os.chdir(cwd)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    sys.argv = [script]
+    # Same sys.path the interpreter builds for `python script` with this PYTHONPATH:
+    sys.path[:] = [
+        os.path.dirname(os.path.realpath(script)),
+        *(entry or cwd for entry in pythonpath.split(os.pathsep)),
+        *base_path,
+    ]
+    os.environ["PYTHONPATH"] = pythonpath
+    returncode = 0
+    watchdog.start()
+    started = os.times()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as exc:
+        returncode = exit_code(exc)
+    except BaseException as exc:  # noqa Report it like an uncaught exception
+        traceback.print_exception(type(exc), exc, example_traceback(exc, script))
+        returncode = 1
+    finally:
+        ended = os.times()
+        user, system = ended.user - started.user, ended.system - started.system
+        done.set()
+        watchdog.join()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout, sys.stderr = saved_stdout, saved_stderr
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        warnings.filters[:] = saved_filters
+        os.environ.pop("PYTHONPATH", None)
+        os.chdir(saved_cwd)
+        # Forget everything the example imported, including its sibling modules:
+        for name in set(sys.modules) - base_modules:
+            del sys.modules[name]
+
+    out.close()
+    err.close()
+    return {"returncode": returncode, "user": user, "sys": system}
+
+
+def main() -> None:
+    # Keep private copies of the protocol streams, then give examples a
+    # harmless stdin; fds 1 and 2 are redirected around each run.
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    preload(sys.argv[1:])
+    base_path = sys.path[1:]  # sys.path[0] is this file's directory
+    base_modules = set(sys.modules)
+
+    for line in requests:
+        request = json.loads(line)
+        response = run_one(
+            request["script"], request["pythonpath"], request["cwd"], request["max_bytes"],
+            request["stdout"], request["stderr"], base_path, base_modules,
+        )
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# resource_usage.py
+"""
+What running one example cost: wall time, user and system CPU time, and
+peak resident set size (max RSS).
+
+A child process's CPU time and max RSS come from os.wait4 as it is reaped
+(POSIX only). Runners that don't run an example in a child process of its
+own report what they can measure, and leave the rest as None.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Iterable, Literal, NamedTuple, Optional, get_args
+
+import pytest
+from rich.table import Table
+
+SortKey = Literal["wall", "cpu", "rss"]
+SORT_KEYS: tuple[SortKey, ...] = get_args(SortKey)
+
+
+class ResourceUsage(NamedTuple):
+    wall: float  # Seconds
+    user: Optional[float] = None  # CPU seconds
+    sys: Optional[float] = None
+    max_rss: Optional[int] = None  # KiB
+
+    @property
+    def cpu(self) -> Optional[float]:
+        return None if self.user is None or self.sys is None else self.user + self.sys
+
+
+def from_rusage(wall: float, rusage) -> ResourceUsage:
+    """ResourceUsage from a resource.struct_rusage, as returned by os.wait4."""
+    max_rss = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss  # Bytes on macOS
+    return ResourceUsage(wall, rusage.ru_utime, rusage.ru_stime, max_rss)
+
+
+def reap(process: subprocess.Popen):
+    """
+    process.wait(), returning the resource usage of the finished process
+    (a resource.struct_rusage), or None where os.wait4 is unavailable or
+    another thread reaped the process first.
+    The wait happens under Popen's own lock, as its wait() does, so a
+    wait() or kill() from another thread never finds the pid already reaped
+    (wait() would then report a return code of 0).
+    """
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None
+    with process._waitpid_lock:
+        if process.returncode is not None:  # Reaped by Popen in another thread
+            return None
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def sort_value(usage: ResourceUsage, sort_by: SortKey) -> float:
+    value = {"wall": usage.wall, "cpu": usage.cpu, "rss": usage.max_rss}[sort_by]
+    return -1 if value is None else value
+
+
+def usage_table(
+    rows: Iterable[tuple[Path, ResourceUsage]],
+    sort_by: SortKey = "wall",
+    count: Optional[int] = None,
+    title: str = "Resource usage",
+) -> Table:
+    """A table of each example's usage, largest `sort_by` first, showing the first `count` rows."""
+    rows = sorted(rows, key=lambda row: sort_value(row[1], sort_by), reverse=True)
+    shown = rows[:count] if count else rows
+    table = Table(title=f"{title}: {len(shown)} of {len(rows)} examples by {sort_by}")
+    table.add_column("Example")
+    for heading in ("Wall (s)", "User (s)", "Sys (s)", "Max RSS (MiB)"):
+        table.add_column(heading, justify="right")
+
+    def seconds(value: Optional[float]) -> str:
+        return "" if value is None else f"{value:.2f}"
+
+    for path, usage in shown:
+        try:
+            name = str(path.relative_to(Path.cwd()))
+        except ValueError:
+            name = str(path)
+        table.add_row(
+            name,
+            seconds(usage.wall),
+            seconds(usage.user),
+            seconds(usage.sys),
+            "" if usage.max_rss is None else f"{usage.max_rss / 1024:.1f}",
+        )
+    return table
+
+
+# --------------------------- TESTS ---------------------------
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Needs os.wait4 and Linux's ru_maxrss")
+def test_run_script_measures_the_child(tmp_path: Path):
+    from pybooktools.run_scripts.run_one_script import run_script
+
+    script = tmp_path / "example.py"
+    script.write_text("print(sum(range(100_000)))\n", encoding="utf-8")
+    usage = run_script(script).usage
+    assert usage.max_rss > 0 and usage.cpu is not None and usage.wall > 0
+
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="Needs os.wait4")
+def test_reap_leaves_the_exit_status_to_other_waiters():
+    import signal
+    import threading
+
+    for _ in range(20):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        reaper = threading.Thread(target=reap, args=(process,))
+        reaper.start()
+        process.kill()
+        assert process.wait() == -signal.SIGKILL  # Not 0, as when the pid was reaped behind Popen's back
+        reaper.join()
+        assert process.returncode == -signal.SIGKILL
+
+
+def test_usage_table_sorts_and_keeps_the_top(tmp_path: Path):
+    rows = [
+        (tmp_path / "small.py", ResourceUsage(3.0, 0.1, 0.0, 10 * 1024)),
+        (tmp_path / "unknown.py", ResourceUsage(2.0)),
+        (tmp_path / "large.py", ResourceUsage(1.0, 0.2, 0.1, 50 * 1024)),
+    ]
+    table = usage_table(rows, sort_by="rss")
+    assert [Path(name).name for name in table.columns[0].cells] == ["large.py", "small.py", "unknown.py"]
+    assert list(table.columns[4].cells) == ["50.0", "10.0", ""]
+    top = usage_table(rows, sort_by="wall", count=2)
+    assert [Path(name).name for name in top.columns[0].cells] == ["small.py", "unknown.py"]
+    assert top.title == "Resource usage: 2 of 3 examples by wall"
+
+
+def test_script_results_ignore_usage():
+    from pybooktools.run_scripts.script_result import ScriptResult
+
+    measured = ScriptResult(0, "out\n", usage=ResourceUsage(1.0, 0.5, 0.1, 2048))
+    cached = ScriptResult(0, "out\n")
+    assert measured == cached and not measured != cached
+    assert hash(measured) == hash(cached)
+    assert {measured, cached} == {cached}
+    assert measured != ScriptResult(0, "other\n", usage=measured.usage)
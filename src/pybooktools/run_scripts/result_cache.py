@@ -0,0 +1,164 @@
+# result_cache.py
+"""
+On-disk cache of example results, so unchanged examples are not re-run.
+
+The key hashes everything that can change an example's output:
+its source, the interpreter, the injected PYTHONPATH, and the content of
+the local modules it imports (see local_imports). Only successful runs are
+stored, so failures are always re-run. Entries are evicted by age and by
+the total size of the cache directory.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable
+
+from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.local_imports import local_imports
+from pybooktools.run_scripts.run_one_script import script_pythonpath, source_pythonpath
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util import config
+from pybooktools.util.disk_cache import DiskCache
+
+
+class ResultCache(DiskCache):
+    def __init__(
+        self,
+        cache_dir: Path = config.cache_dir / "results",
+        max_age_days: float = 30,
+        max_size_mb: float = 100,
+    ):
+        super().__init__(cache_dir, ".json", max_age_days, max_size_mb)
+
+    @staticmethod
+    def key(
+        script_path: Path,
+        interpreter: str,
+        pythonpath: str,
+        search_dirs: list[Path],
+        source: str | None = None,
+        mode: str = "",
+    ) -> str:
+        """
+        `source` replaces the content of script_path when the code runs from memory.
+        `mode` distinguishes runners whose results differ for the same code.
+        """
+        digest = hashlib.sha256()
+
+        def add(label: str, data: bytes) -> None:
+            digest.update(f"{label}:{len(data)}:".encode())
+            digest.update(data)
+
+        add("source", script_path.read_bytes() if source is None else source.encode("utf-8"))
+        if mode:
+            add("mode", mode.encode())
+        add("interpreter", interpreter.encode())
+        try:  # A rebuilt or upgraded environment changes the interpreter file
+            stat = Path(interpreter).stat()
+            add("interpreter_stat", f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            pass
+        add("pythonpath", pythonpath.encode())
+        for module in local_imports(script_path, search_dirs):
+            add("module", str(module).encode())
+            add("module_source", module.read_bytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> ScriptResult | None:
+        if (text := self.read(key)) is None:
+            return None
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        return ScriptResult(data["return_code"], data["result_value"], outputs=data.get("outputs"))
+
+    def put(self, key: str, result: ScriptResult) -> None:
+        if result.return_code != 0:
+            return
+        data = {"return_code": result.return_code, "result_value": result.result_value}
+        if result.outputs is not None:
+            data["outputs"] = result.outputs
+        self.write(key, json.dumps(data))
+
+    def cached(self, key: str, run: Callable[[], ScriptResult]) -> ScriptResult:
+        """The stored result for key, otherwise the result of run(), stored."""
+        if (result := self.get(key)) is not None:
+            return result
+        result = run()
+        self.put(key, result)
+        return result
+
+
+def search_dirs(script_path: Path) -> list[Path]:
+    """Where an example's local imports are found: its directory and the one above."""
+    return [script_path.parent, script_path.parent.parent]
+
+
+def script_key(
+    cache: ResultCache, script_path: Path, interpreter: str | None = None, pythonpath: str | None = None
+) -> str:
+    """
+    The cache key for running script_path as run_script does, or with
+    another interpreter or PYTHONPATH.
+    """
+    return cache.key(
+        script_path,
+        get_virtual_env_python() if interpreter is None else interpreter,
+        script_pythonpath(script_path) if pythonpath is None else pythonpath,
+        search_dirs(script_path),
+    )
+
+
+def with_cache(
+    runner: Callable[[Path], ScriptResult], cache: ResultCache | None
+) -> Callable[[Path], ScriptResult]:
+    """
+    Wrap a run_script-style runner so results come from `cache` when possible.
+    With no cache, returns runner unchanged.
+    """
+    if cache is None:
+        return runner
+
+    def cached_runner(script_path: Path) -> ScriptResult:
+        return cache.cached(script_key(cache, script_path), lambda: runner(script_path))
+
+    return cached_runner
+
+
+def with_source_cache(
+    runner: Callable[[str, Path], ScriptResult], cache: ResultCache | None, mode: str = ""
+) -> Callable[[str, Path], ScriptResult]:
+    """
+    with_cache for run_source-style runners, which take the code to run and
+    its example path. `mode` keeps apart results of runners that differ.
+    """
+    if cache is None:
+        return runner
+
+    def cached_runner(source: str, script_path: Path) -> ScriptResult:
+        key = cache.key(
+            script_path,
+            get_virtual_env_python(),
+            source_pythonpath(script_path),
+            search_dirs(script_path),
+            source=source,
+            mode=mode,
+        )
+        return cache.cached(key, lambda: runner(source, script_path))
+
+    return cached_runner
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_threads_store_the_same_entry(tmp_path: Path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = ResultCache(tmp_path)
+    result = ScriptResult(0, "output\n")
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: cache.put("key", result), range(200)))
+    assert cache.get("key") == result
+    assert [entry.name for entry in tmp_path.iterdir()] == ["key.json"]
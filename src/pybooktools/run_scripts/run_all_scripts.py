@@ -1,29 +1,50 @@
 # run_all_scripts.py
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator, Optional
 
 from rich.syntax import Syntax
 
-from pybooktools.run_scripts.run_one_script import run_script
+from pybooktools.run_scripts.duration_store import DurationStore, with_durations
+from pybooktools.run_scripts.fork_server import ForkServer
+from pybooktools.run_scripts.interpreter_pool import InterpreterPool
+from pybooktools.run_scripts.result_cache import ResultCache, with_cache
+from pybooktools.run_scripts.run_one_script import ChildProcesses, run_script
+from pybooktools.run_scripts.script_pool import ScriptPool
 from pybooktools.run_scripts.script_result import ScriptResult
 from pybooktools.util.console import console
 from pybooktools.util.display import warn
 
 
+def script_runner(
+    pool: ScriptPool | InterpreterPool | ForkServer | None,
+    timeout: Optional[float],
+    processes: Optional[ChildProcesses] = None,
+) -> Callable[[Path], ScriptResult]:
+    run = pool.run if pool else run_script
+    return lambda script_path: run(script_path, timeout, processes)
+
+
 def run_scripts(
     scripts: Generator[Path, None, None] | list[Path],
+    pool: ScriptPool | InterpreterPool | ForkServer | None = None,
+    cache: ResultCache | None = None,
+    timeout: Optional[float] = None,
 ) -> list[ScriptResult]:
     """
     Runs a list or generator of script Paths sequentially.
     Stops on the first failure and returns that ScriptResult.
     Otherwise returns a list of all successful ScriptResults.
+    If `pool` is given, scripts run in its warm workers, subinterpreters or forked children instead of fresh interpreters.
+    If `cache` is given, unchanged scripts are not re-run.
+    A script still running after `timeout` seconds is killed and fails with status "timeout".
     """
     results: list[ScriptResult] = []
+    runner = with_cache(script_runner(pool, timeout), cache)
 
     for path in scripts:
         try:
-            result = run_script(path)
+            result = runner(path)
         except Exception as exc:
             warn(f"Exception running script {path}: {exc}")
             syntax = Syntax(
@@ -34,7 +55,7 @@ def run_scripts(
             )
             console.print(syntax)
             warn(f"{exc}")
-            return [ScriptResult(-1, str(exc))]
+            return [ScriptResult(-1, str(exc), "failed")]
 
         match result.return_code:
             case 0:
@@ -49,19 +70,36 @@ def run_scripts(
 def run_scripts_parallel(
     scripts: Generator[Path, None, None] | list[Path],
     max_workers: int | None = None,
+    pool: ScriptPool | InterpreterPool | ForkServer | None = None,
+    cache: ResultCache | None = None,
+    timeout: Optional[float] = None,
+    durations: DurationStore | None = None,
 ) -> list[ScriptResult]:
     """
     Takes a generator of script Paths, runs them in parallel (up to `max_workers` at once),
     logs each Python interpreter, and stops on the first script failure.
+    If `pool` is given, scripts run in its warm workers, subinterpreters or forked children instead of fresh interpreters.
+    If `cache` is given, unchanged scripts are not re-run.
+    A script still running after `timeout` seconds is killed and fails with status "timeout".
+    If `durations` is given, scripts start in its schedule order and each run is timed into it.
 
     Returns:
-      - a ScriptResult for the first script that failed, cancelling all others
+      - a ScriptResult for the first script that failed, after killing the
+        scripts still running and cancelling those not yet started
       - or a list of ScriptResult for all scripts if none failed
     """
     results: list[ScriptResult] = []
+    processes = ChildProcesses()
+    runner = with_cache(with_durations(script_runner(pool, timeout, processes), durations), cache)
+    if durations:
+        scripts = durations.schedule(scripts)
+
+    def stop_others(executor: ThreadPoolExecutor) -> None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        processes.kill_all()
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_path = {executor.submit(run_script, path): path for path in scripts}
+        future_to_path = {executor.submit(runner, path): path for path in scripts}
 
         for future in as_completed(future_to_path):
             script_path = future_to_path[future]
@@ -77,18 +115,14 @@ def run_scripts_parallel(
                 )
                 console.print(syntax)
                 warn(f"{exc}")
-                for f in future_to_path:
-                    if not f.done():
-                        f.cancel()
-                return [ScriptResult(-1, str(exc))]
+                stop_others(executor)
+                return [ScriptResult(-1, str(exc), "failed")]
 
             match result.return_code:
                 case 0:
                     results.append(result)
                 case _:
-                    for f in future_to_path:
-                        if not f.done():
-                            f.cancel()
+                    stop_others(executor)
                     results.append(result)
                     return results
 
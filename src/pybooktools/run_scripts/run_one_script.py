@@ -1,36 +1,103 @@
 # run_one_script.py
+import locale
 import os
 import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional
 
 from rich.syntax import Syntax
 
 from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.resource_usage import ResourceUsage, from_rusage, reap
 from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util import config
 from pybooktools.util.console import console
 from pybooktools.util.display import warn
 
 
-def run_script(script_path: Path) -> ScriptResult:
+def script_pythonpath(script_path: Path) -> str:
     """
-    Runs the script in its virtual environment and returns the output.
-    Ensures the script's parent directory is on PYTHONPATH so it can import from its parent.
+    PYTHONPATH for running script_path: its parent's parent directory
+    comes first so the example can import from its parent.
     """
-    python_exec = get_virtual_env_python()
-
-    env = os.environ.copy()
     parent_dir = script_path.parent.parent.resolve()
-    env["PYTHONPATH"] = f"{parent_dir}{os.pathsep}{env.get('PYTHONPATH', '')}"
+    return f"{parent_dir}{os.pathsep}{os.environ.get('PYTHONPATH', '')}"
+
+
+def output_encoding() -> str:
+    """The encoding subprocess.run(text=True) uses for a child's streams."""
+    return "utf-8" if sys.flags.utf8_mode else locale.getencoding()
+
+
+def decode_output(data: bytes, errors: str = "strict") -> str:
+    """
+    Decode captured output exactly the way subprocess.run(text=True) does,
+    so every execution backend produces identical strings.
+    """
+    return data.decode(output_encoding(), errors).replace("\r\n", "\n").replace("\r", "\n")
+
+
+class OutputLimit(NamedTuple):
+    """
+    The most output kept from one example. An example that goes past
+    either limit is killed, and only the whole lines within both are kept.
+    """
+    max_bytes: int = config.max_output_bytes
+    max_lines: int = config.max_output_lines
+
+    def exceeded(self, size: int, lines: int) -> bool:
+        return size > self.max_bytes or lines > self.max_lines
+
+    def prefix(self, data: bytes) -> bytes:
+        """
+        The whole lines at the start of data that fit both limits (a cut
+        line if there are none, or nothing if no more lines are allowed).
+        """
+        if self.max_lines <= 0:
+            return b""
+        cut = data[:self.max_bytes]
+        end, lines = -1, 0
+        while lines < self.max_lines and (found := cut.find(b"\n", end + 1)) != -1:
+            end, lines = found, lines + 1
+        return cut[:end + 1] if end != -1 else cut
+
+    def marker(self, at_line_start: bool = True) -> str:
+        """The line that ends truncated output, marking where the output was cut off."""
+        return (
+            ("" if at_line_start else "\n")
+            + f"[Output truncated: over {self.max_bytes:,} bytes or {self.max_lines:,} lines]\n"
+        )
+
+
+CHUNK_SIZE = 64 * 1024
 
-    result = subprocess.run(
-        [python_exec, str(script_path)],
-        capture_output=True,
-        text=True,
-        env=env,
-    )
 
-    if result.returncode != 0:
-        err_msg = f"Error running script {script_path}, {result.stderr}"
+def read_capped(stream: BinaryIO, limit: OutputLimit) -> tuple[bytes, bool]:
+    """
+    Read stream until EOF, or until it passes limit. Returns the output
+    (only limit.prefix of it past the limit) and whether the limit was passed.
+    """
+    chunks: list[bytes] = []
+    size = lines = 0
+    while chunk := stream.read1(CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+        if limit.exceeded(size, lines):
+            return limit.prefix(b"".join(chunks)), True
+    return b"".join(chunks), False
+
+
+def script_result(script_path: Path, return_code: int, stdout: str, stderr: str) -> ScriptResult:
+    """
+    Turn the raw outcome of running script_path into a ScriptResult,
+    reporting failures.
+    """
+    if return_code != 0:
+        err_msg = f"Error running script {script_path}, {stderr}"
         warn(err_msg)
         syntax = Syntax(
             script_path.read_text(encoding="utf-8"),
@@ -39,6 +106,274 @@ def run_script(script_path: Path) -> ScriptResult:
             line_numbers=True,
         )
         console.print(syntax)
-        return ScriptResult(result.returncode, err_msg)
+        return ScriptResult(return_code, err_msg, "failed")
+
+    return ScriptResult(0, stdout)
+
+
+def timed_out(script_path: Path, return_code: int, timeout: float) -> ScriptResult:
+    msg = f"Timed out after {timeout}s: {script_path}"
+    warn(msg)
+    return ScriptResult(return_code, msg, "timeout")
+
+
+def truncated(script_path: Path, stdout: bytes, limit: OutputLimit) -> ScriptResult:
+    """
+    Result for an example killed for too much output: the retained prefix
+    of stdout, ending with the truncation marker. The return code is -1.
+    """
+    text = decode_output(stdout, errors="replace")  # The cut may split a character
+    warn(f"Output truncated: {script_path}")
+    return ScriptResult(-1, text + limit.marker(not text or text.endswith("\n")), "truncated")
+
+
+def cancelled(script_path: Path, return_code: int = -1) -> ScriptResult:
+    return ScriptResult(return_code, f"Cancelled after another example failed: {script_path}", "cancelled")
+
+
+class ChildProcesses:
+    """
+    The processes running examples for one run, so that when an example
+    fails, kill_all() stops the others instead of waiting for them to finish.
+    After kill_all(), processes added later are killed immediately.
+    Safe to use from many threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running: set[subprocess.Popen] = set()
+        self.killed = False
+
+    def add(self, process: subprocess.Popen) -> bool:
+        """Track process. Returns False, having killed it, if kill_all() already ran."""
+        with self.lock:
+            if not self.killed:
+                self.running.add(process)
+                return True
+        process.kill()
+        return False
+
+    def discard(self, process: subprocess.Popen) -> None:
+        with self.lock:
+            self.running.discard(process)
+
+    def kill_all(self, grace: float = 1.0) -> None:
+        """Terminate every running process, killing any still alive after `grace` seconds."""
+        with self.lock:
+            self.killed = True
+            processes = list(self.running)
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + grace
+        for process in processes:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
 
-    return ScriptResult(0, result.stdout)
+
+class Captured(NamedTuple):
+    return_code: int
+    stdout: bytes
+    stderr: bytes
+    stopped: Optional[str] = None  # "timeout", "truncated" or "cancelled" if the process was killed
+    usage: Optional[ResourceUsage] = None
+
+
+def feed(stdin: BinaryIO, data: bytes) -> None:
+    try:
+        stdin.write(data)
+        stdin.close()
+    except OSError:  # The process exited without reading it all
+        pass
+
+
+def capture(
+    command: list[str],
+    env: dict[str, str],
+    source: Optional[str] = None,
+    timeout: Optional[float] = None,
+    processes: Optional[ChildProcesses] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> Captured:
+    """
+    Run command, feeding it `source` on stdin if given, and capture its
+    output as it is produced. The process is killed after `timeout`
+    seconds, as soon as its stdout or stderr passes `limit`, or when
+    `processes` kills it; `stopped` says which.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if source is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    if processes is not None and not processes.add(process):
+        process.communicate()
+        return Captured(process.returncode, b"", b"", "cancelled")
+    expired = threading.Event()
+
+    def expire() -> None:
+        expired.set()
+        process.kill()
+
+    stderr: list[tuple[bytes, bool]] = []
+
+    def read_stderr() -> None:
+        stderr.append(read_capped(process.stderr, limit))
+        if stderr[0][1]:
+            process.kill()
+
+    helpers = [threading.Thread(target=read_stderr)]
+    if source is not None:
+        helpers.append(threading.Thread(target=feed, args=(process.stdin, source.encode(output_encoding()))))
+    timer = threading.Timer(timeout, expire) if timeout else None
+    try:
+        for helper in helpers:
+            helper.start()
+        if timer:
+            timer.start()
+        stdout, stdout_over = read_capped(process.stdout, limit)
+        if stdout_over:
+            process.kill()
+        for helper in helpers:
+            helper.join()
+        rusage = reap(process)
+        wall = time.perf_counter() - start
+        errors, stderr_over = stderr[0]
+    finally:
+        if timer:
+            timer.cancel()
+        if processes is not None:
+            processes.discard(process)
+        process.stdout.close()
+        process.stderr.close()
+    if expired.is_set():
+        stopped = "timeout"
+    elif stdout_over or stderr_over:
+        stopped = "truncated"
+    elif processes is not None and processes.killed and process.returncode != 0:
+        stopped = "cancelled"
+    else:
+        stopped = None
+    usage = ResourceUsage(wall) if rusage is None else from_rusage(wall, rusage)
+    return Captured(process.returncode, stdout, errors, stopped, usage)
+
+
+def run_process(
+    command: list[str],
+    script_path: Path,
+    env: dict[str, str],
+    source: Optional[str] = None,
+    timeout: Optional[float] = None,
+    processes: Optional[ChildProcesses] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> ScriptResult:
+    """
+    Run command for script_path, feeding it `source` on stdin if given.
+    Kills it after `timeout` seconds, once its output passes `limit`, or
+    when `processes` kills it early.
+    """
+    if processes is not None and processes.killed:
+        return cancelled(script_path)
+    captured = capture(command, env, source, timeout, processes, limit)
+    match captured.stopped:
+        case "timeout":
+            result = timed_out(script_path, captured.return_code, timeout)
+        case "truncated":
+            result = truncated(script_path, captured.stdout, limit)
+        case "cancelled":
+            result = cancelled(script_path, captured.return_code)
+        case _:
+            result = script_result(
+                script_path, captured.return_code, decode_output(captured.stdout), decode_output(captured.stderr)
+            )
+    return result._replace(usage=captured.usage)
+
+
+def run_script(
+    script_path: Path,
+    timeout: Optional[float] = None,
+    processes: Optional[ChildProcesses] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> ScriptResult:
+    """
+    Runs the script in its virtual environment and returns the output.
+    Ensures the script's parent directory is on PYTHONPATH so it can import from its parent.
+    A script still running after `timeout` seconds is killed. A script whose
+    output passes `limit` is killed, and its output truncated.
+    """
+    python_exec = get_virtual_env_python()
+
+    env = os.environ.copy()
+    env["PYTHONPATH"] = script_pythonpath(script_path)
+
+    return run_process([python_exec, str(script_path)], script_path, env, None, timeout, processes, limit)
+
+
+def source_pythonpath(script_path: Path) -> str:
+    """
+    PYTHONPATH for running the source of script_path from memory: there is no
+    script directory at the front of sys.path, so it is added here.
+    """
+    return f"{script_path.parent.resolve()}{os.pathsep}{script_pythonpath(script_path)}"
+
+
+# `python -c` program that runs the source on stdin as `python script_path`
+# runs the file: with the same __file__, sys.argv and traceback lines.
+RUN_SOURCE_AS = """\
+import linecache, sys, traceback, types
+path, source = sys.argv[1], sys.stdin.read()
+linecache.cache[path] = (len(source), None, source.splitlines(True), path)
+sys.argv = [path]
+main = sys.modules["__main__"] = types.ModuleType("__main__")
+main.__file__, main.__builtins__ = path, __builtins__
+try:
+    exec(compile(source, path, "exec"), main.__dict__)
+except SystemExit:
+    raise
+except BaseException as exc:
+    traceback.print_exception(type(exc), exc, exc.__traceback__.tb_next)  # Without this program's frame
+    sys.exit(1)
+"""
+
+
+def run_source(
+    source: str,
+    script_path: Path,
+    timeout: Optional[float] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> ScriptResult:
+    """
+    Like run_script, but runs `source` fed through stdin instead of a file,
+    importing as if it were script_path, with __file__ and sys.argv[0] set
+    to script_path. Nothing is written to disk.
+    """
+    python_exec = get_virtual_env_python()
+
+    env = os.environ.copy()
+    env["PYTHONPATH"] = source_pythonpath(script_path)
+
+    command = [python_exec, "-c", RUN_SOURCE_AS, str(script_path)]
+    return run_process(command, script_path, env, source, timeout, limit=limit)
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_run_source_runs_as_its_file(tmp_path: Path):
+    example = tmp_path / "example.py"
+    source = (
+        "import sys\nfrom pathlib import Path\n"
+        "print(Path(__file__).name, Path(sys.argv[0]).name, __name__)\n"
+    )
+    example.write_text(source, encoding="utf-8")
+    result = run_source(source, example)
+    assert result.result_value == "example.py example.py __main__\n"
+    assert result == run_script(example)
+    failed = run_source("x = 1\nraise ValueError('boom')\n", example)
+    assert f'File "{example}", line 2, in <module>' in failed.result_value
+    assert "raise ValueError('boom')" in failed.result_value
+    assert "<string>" not in failed.result_value
@@ -0,0 +1,145 @@
+# run_statements.py
+"""
+Run an example's source and get the output of each top-level statement
+separately, for px to place beneath the statement that produced it.
+
+The source runs in statement_worker under the example interpreter, which
+executes the statements one at a time and reports where each statement's
+output ends. The source is not changed, so there is no marker text to
+print or split the output on, and nothing an example prints can be
+mistaken for a marker.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from pybooktools.run_scripts import statement_worker
+from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.run_one_script import (
+    OutputLimit, capture, decode_output, run_source, script_result, source_pythonpath, timed_out
+)
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util.display import warn
+
+
+def statement_result(
+    script_path: Path,
+    return_code: int,
+    output: bytes,
+    positions: list[int],
+    stderr: bytes,
+    limit: OutputLimit,
+) -> ScriptResult:
+    """
+    The ScriptResult for a statement-by-statement run. Output past `limit`
+    is cut off within the statement that passed it, which then ends with
+    the truncation marker, and the result has status "truncated".
+    """
+    pieces = [output[start:end] for start, end in zip([0, *positions], positions)]
+    unfinished = output[positions[-1] if positions else 0:]
+    size = lines = 0
+    for i, piece in enumerate([*pieces, unfinished]):
+        if limit.exceeded(size + len(piece), lines + piece.count(b"\n")):
+            kept = OutputLimit(limit.max_bytes - size, limit.max_lines - lines).prefix(piece)
+            text = decode_output(kept, errors="replace")
+            outputs = [decode_output(p) for p in pieces[:i]]
+            outputs.append(text + limit.marker(not text or text.endswith("\n")))
+            warn(f"Output truncated: {script_path}")
+            return ScriptResult(-1, "".join(outputs), "truncated", outputs)
+        size, lines = size + len(piece), lines + piece.count(b"\n")
+    if return_code != 0:
+        return script_result(script_path, return_code, "", decode_output(stderr))
+    outputs = [decode_output(piece) for piece in pieces]
+    return ScriptResult(0, "".join(outputs), outputs=outputs)
+
+
+def run_statements(
+    source: str,
+    script_path: Path,
+    timeout: Optional[float] = None,
+    limit: OutputLimit = OutputLimit(),
+) -> ScriptResult:
+    """
+    Like run_source, and the result's `outputs` holds the output of each
+    top-level statement of source that finished, in order.
+    """
+    env = os.environ.copy()
+    env["PYTHONPATH"] = source_pythonpath(script_path)
+    command = [get_virtual_env_python(), statement_worker.__file__, str(limit.max_bytes), str(script_path)]
+    # The worker applies limit to the example's output; latin-1 in JSON takes up to 6 bytes per byte
+    captured = capture(command, env, source, timeout, limit=OutputLimit(6 * limit.max_bytes + 65536, sys.maxsize))
+    if captured.stopped == "timeout":
+        result = timed_out(script_path, captured.return_code, timeout)
+    else:
+        try:
+            response = json.loads(captured.stdout)
+        except ValueError:  # The worker never reported, so nothing ran to completion
+            result = script_result(script_path, captured.return_code or 1, "", decode_output(captured.stderr))
+        else:
+            result = statement_result(
+                script_path,
+                captured.return_code,
+                response["output"].encode("latin-1"),
+                response["positions"],
+                captured.stderr,
+                limit,
+            )
+    return result._replace(usage=captured.usage)
+
+
+# --------------------------- TESTS ---------------------------
+
+
+def test_output_per_statement(tmp_path: Path):
+    example = tmp_path / "example.py"
+    source = (
+        "from __future__ import annotations\n"
+        "def f(x: Undefined) -> None:\n"
+        "    print('in f')\n"
+        "print('__$1$_tls__')\n"
+        "x = 1\n"
+        "print('partial', end='')\n"
+        "f(x); print('same line')\n"
+        "if x:\n"
+        "    import sys\n"
+        "    print('to stderr', file=sys.stderr)\n"
+    )
+    example.write_text(source, encoding="utf-8")
+    result = run_statements(source, example)
+    assert result.outputs == ["", "", "__$1$_tls__\n", "", "partial", "in f\n", "same line\n", ""]
+    assert result.result_value == run_source(source, example).result_value
+
+
+def test_statements_run_as_their_file(tmp_path: Path):
+    example = tmp_path / "example.py"
+    source = "import sys\nfrom pathlib import Path\nprint(Path(__file__).name, Path(sys.argv[0]).name)\n"
+    example.write_text(source, encoding="utf-8")
+    assert run_statements(source, example).outputs == ["", "", "example.py example.py\n"]
+    failed = run_statements("print('ok')\nraise ValueError('boom')\n", example)
+    assert f'File "{example}", line 2, in <module>' in failed.result_value
+    assert "raise ValueError('boom')" in failed.result_value and "<stdin>" not in failed.result_value
+
+
+def test_failures_and_runaway_output(tmp_path: Path):
+    example = tmp_path / "example.py"
+    example.write_text("", encoding="utf-8")
+    failed = run_statements("print('ok')\nraise ValueError('boom')\n", example)
+    assert failed.status == "failed" and "line 2" in failed.result_value and "ValueError: boom" in failed.result_value
+    exited = run_statements("import os\nprint('ok', flush=True)\nos._exit(4)\n", example)
+    assert exited.return_code == 4 and exited.status == "failed"
+    limit = OutputLimit(max_bytes=1000, max_lines=50)
+    runaway = run_statements("print('first')\nwhile True: print('x')\n", example, timeout=20, limit=limit)
+    assert runaway.status == "truncated"
+    assert runaway.outputs == ["first\n", "x\n" * 49 + limit.marker()]
+    limit = OutputLimit(max_bytes=1000, max_lines=2)  # Used up exactly at a statement boundary
+    boundary = run_statements("print('a')\nprint('b')\nprint('ccc')\nprint('d')\n", example, limit=limit)
+    assert boundary.status == "truncated"
+    assert boundary.outputs == ["a\n", "b\n", limit.marker()]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
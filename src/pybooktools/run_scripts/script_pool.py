@@ -0,0 +1,264 @@
+# script_pool.py
+"""
+Run examples in a pool of warm interpreter processes.
+
+Starting a fresh interpreter for every example (run_script) spends most
+of its time on interpreter startup and common imports. A ScriptPool
+starts each worker once, preloads config.preload_modules, and then runs
+every example as `__main__` in a fresh namespace, producing the same
+ScriptResult as run_script.
+"""
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from queue import SimpleQueue
+from typing import Iterable, Optional
+
+import pytest
+
+from pybooktools.run_scripts import pool_worker
+from pybooktools.run_scripts.get_virtual_environment import get_virtual_env_python
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.run_one_script import (
+    ChildProcesses, OutputLimit, cancelled, decode_output, run_script, script_pythonpath, script_result,
+    timed_out, truncated,
+)
+from pybooktools.run_scripts.script_result import ScriptResult
+from pybooktools.util import config
+
+
+class PoolWorker:
+    """One warm interpreter, driven through its stdin/stdout."""
+
+    def __init__(self, python_exec: str, preload: list[str]):
+        env = os.environ.copy()
+        env.pop("PYTHONPATH", None)  # Supplied per example instead
+        self.process = subprocess.Popen(
+            [python_exec, pool_worker.__file__, *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            env=env,
+        )
+        self.timed_out = False
+        # The worker captures each example's output here, so it can be read even if the worker dies:
+        self.captures = []
+        for _ in ("stdout", "stderr"):
+            fd, capture = tempfile.mkstemp(suffix=".out")
+            os.close(fd)
+            self.captures.append(Path(capture))
+
+    def _time_out(self) -> None:
+        self.timed_out = True
+        self.process.kill()
+
+    def captured(self, max_bytes: int) -> tuple[bytes, bytes]:
+        """The last example's (stdout, stderr), each cut off after max_bytes + 1 bytes."""
+        def read(capture: Path) -> bytes:
+            with capture.open("rb") as f:
+                return f.read(max_bytes + 1)
+
+        return read(self.captures[0]), read(self.captures[1])
+
+    def execute(
+        self, script_path: Path, timeout: Optional[float] = None, max_bytes: int = config.max_output_bytes
+    ) -> tuple[int, ResourceUsage]:
+        """
+        Run one example, returning (return_code, usage); its output is then
+        in `captured`. The worker's peak RSS belongs to no single example,
+        so usage leaves it out.
+        Raises OSError if the worker had already exited, so the example never
+        started. Raises EOFError if the worker died while running it, e.g.
+        because the example called os._exit() or printed more than max_bytes,
+        or was killed after `timeout` seconds (then `timed_out` is set).
+        """
+        request = {
+            "script": str(script_path),
+            "pythonpath": script_pythonpath(script_path),
+            "cwd": os.getcwd(),
+            "max_bytes": max_bytes,
+            "stdout": str(self.captures[0]),
+            "stderr": str(self.captures[1]),
+        }
+        if self.process.poll() is not None:
+            raise BrokenPipeError(f"Pool worker exited before running {script_path}")
+        for capture in self.captures:  # So a worker that dies at once leaves no stale output
+            capture.write_bytes(b"")
+        start = time.perf_counter()
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        timer = threading.Timer(timeout, self._time_out) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            line = self.process.stdout.readline()
+        finally:
+            if timer:
+                timer.cancel()
+        if not line:
+            raise EOFError(f"Pool worker exited while running {script_path}")
+        response = json.loads(line)
+        return response["returncode"], ResourceUsage(time.perf_counter() - start, response["user"], response["sys"])
+
+    def close(self) -> None:
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        for capture in self.captures:
+            capture.unlink(missing_ok=True)
+
+
+class ScriptPool:
+    """
+    A fixed number of warm workers; `run` is safe to call from many threads.
+    Use as a context manager so the workers are shut down.
+    """
+
+    def __init__(self, workers: int | None = None, preload: Iterable[str] = config.preload_modules):
+        self.python_exec = get_virtual_env_python()
+        self.preload = list(preload)
+        self.lock = threading.Lock()  # Guards self.workers, which threads change as workers die
+        self.workers = [
+            PoolWorker(self.python_exec, self.preload) for _ in range(workers or os.cpu_count() or 4)
+        ]
+        self.idle: SimpleQueue[PoolWorker] = SimpleQueue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def _replace(self, dead: PoolWorker) -> PoolWorker:
+        dead.close()
+        worker = PoolWorker(self.python_exec, self.preload)
+        with self.lock:
+            self.workers.remove(dead)
+            self.workers.append(worker)
+        return worker
+
+    def run(
+        self,
+        script_path: Path,
+        timeout: Optional[float] = None,
+        processes: Optional[ChildProcesses] = None,
+        limit: OutputLimit = OutputLimit(),
+    ) -> ScriptResult:
+        """
+        Like run_script. A worker that dies, times out, or is killed through
+        `processes`, is replaced by a fresh one. If the example ended its
+        worker, the result is the worker's exit code and the output so far,
+        as from a process of its own; an example is only re-run (by
+        run_script) if its worker was gone before it started.
+        """
+        if processes is not None and processes.killed:
+            return cancelled(script_path)
+        worker = self.idle.get()
+        process = worker.process
+        start = time.perf_counter()
+        try:
+            if processes is not None:
+                processes.add(process)
+            return_code, usage = worker.execute(script_path, timeout, limit.max_bytes)
+            stdout, stderr = worker.captured(limit.max_bytes)
+        except (EOFError, OSError) as exc:
+            dead = worker
+            stdout, stderr = dead.captured(limit.max_bytes)
+            worker = self._replace(dead)
+            if dead.timed_out:
+                return timed_out(script_path, process.returncode, timeout)
+            if processes is not None and processes.killed:
+                return cancelled(script_path, process.returncode)
+            if not isinstance(exc, EOFError):
+                # The worker was gone before the example started, so this runs it only once:
+                return run_script(script_path, timeout, processes, limit)
+            return_code, usage = process.returncode, ResourceUsage(time.perf_counter() - start)
+        finally:
+            if processes is not None:
+                processes.discard(process)
+            self.idle.put(worker)
+        if any(limit.exceeded(len(output), output.count(b"\n")) for output in (stdout, stderr)):
+            result = truncated(script_path, limit.prefix(stdout), limit)
+        else:
+            result = script_result(script_path, return_code, decode_output(stdout), decode_output(stderr))
+        return result._replace(usage=usage)
+
+    def close(self) -> None:
+        with self.lock:
+            workers = list(self.workers)
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self) -> "ScriptPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+# --------------------------- TESTS ---------------------------
+
+EXAMPLES = {
+    "book_util.py": "# book_util.py\nGREETING = 'hello from parent'\n",
+    "chapter/a.py": (
+        "# a.py\nimport sys\nfrom book_util import GREETING\n"
+        "print(GREETING)\nprint(__name__, sys.argv[0].endswith('a.py'))\n"
+        "print('to stderr', file=sys.stderr)\n"
+    ),
+    "chapter/b.py": "# b.py\nprint('line\\r\\nending')\nimport sys\nsys.exit(3)\n",
+    "chapter/c.py": "# c.py\nimport sibling\nprint(sibling.VALUE)\n",
+    "chapter/sibling.py": "# sibling.py\nVALUE = 42\n",
+    "chapter/d.py": "# d.py\nraise ValueError('boom')\n",
+    "chapter/e.py": "# e.py\nimport os\nprint('partial', flush=True)\nos._exit(5)\n",
+}
+
+
+def _write_examples(root: Path) -> list[Path]:
+    for name, text in EXAMPLES.items():
+        path = root / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return sorted((root / "chapter").glob("*.py"))
+
+
+def test_pool_matches_subprocess(tmp_path: Path):
+    scripts = _write_examples(tmp_path)
+    with ScriptPool(workers=2) as pool:
+        for script in scripts:
+            assert pool.run(script) == run_script(script), script
+
+
+def test_pool_forgets_example_modules(tmp_path: Path):
+    scripts = _write_examples(tmp_path)
+    sibling = tmp_path / "chapter" / "sibling.py"
+    c_py = next(s for s in scripts if s.name == "c.py")
+    with ScriptPool(workers=1) as pool:
+        assert pool.run(c_py).result_value == "42\n"
+        sibling.write_text("# sibling.py\nVALUE = 430\n", encoding="utf-8")
+        assert pool.run(c_py).result_value == "430\n"
+
+
+def test_dead_worker_reports_without_rerunning(tmp_path: Path):
+    log = tmp_path / "runs.txt"
+    exits = tmp_path / "exits.py"
+    exits.write_text(
+        f"# exits.py\nimport os\nwith open({str(log)!r}, 'a') as f:\n    f.write('ran\\n')\n"
+        "print('partial', flush=True)\nos._exit(5)\n",
+        encoding="utf-8",
+    )
+    runaway = tmp_path / "runaway.py"
+    runaway.write_text("# runaway.py\nwhile True:\n    print('x' * 9)\n", encoding="utf-8")
+    limit = OutputLimit(max_bytes=10_000, max_lines=100_000)
+    with ScriptPool(workers=1) as pool:
+        result = pool.run(exits)
+        assert log.read_text(encoding="utf-8") == "ran\n"
+        assert result == run_script(exits)
+        assert pool.run(runaway, limit=limit) == run_script(runaway, limit=limit)
+        assert len(pool.workers) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,7 +1,33 @@
 # script_result.py
-from typing import NamedTuple
+from typing import Literal, NamedTuple, Optional
+
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+
+# "timeout": killed after exceeding its wall-clock limit
+# "cancelled": stopped because another example failed first
+# "truncated": killed for printing more than the output limit; keeps the output up to it
+ScriptStatus = Literal["ok", "failed", "timeout", "cancelled", "truncated"]
 
 
 class ScriptResult(NamedTuple):
     return_code: int
     result_value: str
+    status: ScriptStatus = "ok"
+    # From run_statements: the output of each top-level statement that ran, in order
+    outputs: Optional[list[str]] = None
+    # What the run cost, if the runner measured it; None for cached results
+    usage: Optional[ResourceUsage] = None
+
+    # Usage differs from run to run of the same example, so results are
+    # equal when everything but the usage is:
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ScriptResult):
+            return self[:-1] == other[:-1]
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash(self[:-1])
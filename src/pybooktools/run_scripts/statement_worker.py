@@ -0,0 +1,136 @@
+# statement_worker.py
+"""
+Runs Python source one top-level statement at a time, recording where each
+statement's output ends, for px (see run_statements).
+
+Runs under the example interpreter (see get_virtual_env_python), which
+may not have pybooktools installed, so it only uses the standard library.
+
+    python statement_worker.py max_bytes script_path < source
+
+The source is parsed once. Each top-level statement is compiled on its own
+and executed in one shared `__main__` namespace, as `python script_path`
+would run the whole script: __file__, sys.argv and tracebacks name
+script_path. Output is captured at the file-descriptor level into a
+temporary file, and the file position is recorded after every statement,
+so each statement's output is a slice of the captured bytes: nothing is
+printed between statements and nothing has to be parsed back out.
+
+One JSON object goes to the original stdout as the process ends:
+    {"output": "...", "positions": [...], "truncated": false}
+`positions` holds the end of each finished statement's output; anything
+after the last position came from the statement that raised or exited.
+At most max_bytes + 1 bytes of output are returned; output past max_bytes
+ends the run at once with "truncated" set. Bytes travel as latin-1 text,
+which round-trips them unchanged. The exit status is the example's.
+"""
+import __future__
+import ast
+import builtins
+import json
+import linecache
+import os
+import sys
+import tempfile
+import threading
+import traceback
+import types
+from typing import Callable
+
+if __package__:
+    from pybooktools.run_scripts.pool_worker import example_traceback, exit_code
+else:  # Run as a script, from its own directory
+    from pool_worker import example_traceback, exit_code
+
+
+def execute_statements(source: str, filename: str, mark: Callable[[], int], positions: list[int]) -> None:
+    """
+    Execute source statement by statement in a fresh `__main__` module whose
+    __file__ is filename, appending mark() (the current output position) to
+    positions after each statement finishes. Exceptions, SystemExit
+    included, propagate; their tracebacks show lines of source.
+    """
+    main = types.ModuleType("__main__")
+    main.__builtins__ = builtins
+    main.__file__ = filename
+    saved_main = sys.modules["__main__"]
+    sys.modules["__main__"] = main
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    flags = 0  # __future__ imports apply to every later statement
+    try:
+        tree = ast.parse(source, filename)
+        main.__doc__ = ast.get_docstring(tree, clean=False)
+        for statement in tree.body:
+            code = compile(ast.Module([statement], []), filename, "exec", flags=flags, dont_inherit=True)
+            exec(code, main.__dict__)
+            if isinstance(statement, ast.ImportFrom) and statement.module == "__future__":
+                for alias in statement.names:
+                    flags |= getattr(__future__, alias.name).compiler_flag
+            positions.append(mark())
+    finally:
+        sys.modules["__main__"] = saved_main
+
+
+def main() -> None:
+    max_bytes, script = int(sys.argv[1]), sys.argv[2]
+    source = sys.stdin.read()
+    responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    out = tempfile.TemporaryFile()
+    sys.stdout.flush()
+    os.dup2(out.fileno(), 1)
+    # argv as for `python script`; sys.path[0] as for `python -` (PYTHONPATH supplies the script's directory):
+    sys.argv = [script]
+    sys.path[0] = ""
+    positions: list[int] = []
+    respond_once = threading.Lock()
+
+    def mark() -> int:
+        sys.stdout.flush()
+        return os.lseek(out.fileno(), 0, os.SEEK_CUR)
+
+    def respond(truncated: bool) -> None:
+        if not respond_once.acquire(blocking=False):
+            return
+        try:
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)  # Stop further output moving the file position
+        os.close(devnull)
+        out.seek(0)
+        output = out.read(max_bytes + 1).decode("latin-1")
+        responses.write(json.dumps({"output": output, "positions": positions, "truncated": truncated}))
+        responses.flush()
+
+    done = threading.Event()
+
+    def watch_output() -> None:
+        while not done.wait(0.05):
+            if os.fstat(out.fileno()).st_size > max_bytes:
+                respond(truncated=True)
+                real_exit(1)
+
+    real_exit = os._exit
+
+    def exit_now(code: int) -> None:  # os._exit() skips everything below
+        respond(truncated=False)
+        real_exit(code)
+
+    os._exit = exit_now
+    threading.Thread(target=watch_output, daemon=True).start()
+    try:
+        execute_statements(source, script, mark, positions)
+        status = 0
+    except SystemExit as exc:
+        status = exit_code(exc)
+    except BaseException as exc:  # noqa Report it like an uncaught exception
+        traceback.print_exception(type(exc), exc, example_traceback(exc, script))
+        status = 1
+    done.set()
+    respond(truncated=False)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
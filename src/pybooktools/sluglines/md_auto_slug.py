@@ -21,6 +21,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+from pybooktools.md_examples.chapter_model import Chapter, load_chapter
+
 
 @dataclass
 class SlugInserter:
@@ -40,73 +42,53 @@ class SlugInserter:
         return list(self.directory.rglob("*.md"))
 
     @staticmethod
-    def _insert_slug_lines(content: str) -> str:
+    def _missing_slug_lines(chapter: Chapter) -> dict[int, str]:
         """
-        Insert slug lines before Python code blocks in the markdown example_body if they
-        don't already have one. Each code block is detected by the pattern
-        \"```python\" and ended by \"```\".
+        Replacements for the Python code blocks in the chapter that
+        don't already have a slug line, keyed by block index.
 
         Slug lines follow the pattern: \"# example_N.py\".
 
         Steps:
-        1. Find each Python code block using a regex capturing (```python)(example_body)(```).
-        2. Split the example_body into lines.
+        1. Take each Python code block from the chapter model.
+        2. Split its example_body into lines.
         3. Remove leading blank lines.
         4. If the first non-blank line is NOT already a slug, insert it.
-        5. Reassemble and replace in the original text.
+        5. Rebuild the block, to be spliced into the original text.
         """
-        pattern = re.compile(r"(```python)(.*?)(```)", re.DOTALL)
-
-        def replacer(match: re.Match[str]) -> str:
-            block_start = match.group(1)  # "```python"
-            block_content = match.group(2)
-            block_end = match.group(3)  # "```"
-
-            # Split on newlines (without discarding them all).
-            lines = block_content.splitlines(keepends=False)
+        slug_pattern = re.compile(r"^#\s+\S+\.py\s*$")
+        replacements: dict[int, str] = {}
+        count = 0
+        for i, (info, block) in enumerate(zip(chapter.block_info, chapter.blocks)):
+            if not info.fence_tag.startswith("python"):
+                continue
+            indent = chapter.indent(i)  # splice puts it back
+            lines = [line.removeprefix(indent) for line in block.content.split("\n")]
 
             # Remove all leading blank lines (lines that are empty after .strip()).
             while lines and not lines[0].strip():
                 lines.pop(0)
 
-            # If there's no example_body at all after removing leading blanks,
-            # or we can't get a first line to check:
-            if not lines:
-                # There's nothing to annotate
-                return match.group(0)
-
-            # Check if the first non-blank line is already a slug
-            first_line = lines[0].rstrip()
-            slug_pattern = re.compile(r"^#\s+\S+\.py\s*$")
-            if slug_pattern.match(first_line):
-                # Already has a slug line
-                return match.group(0)
+            # There's nothing to annotate, or it already has a slug line:
+            if not lines or slug_pattern.match(lines[0].rstrip()):
+                continue
 
-            # Insert a slug line
-            if not hasattr(replacer, "count"):
-                replacer.count = 1
-            else:
-                replacer.count += 1
-
-            lines.insert(0, f"# example_{replacer.count}.py")  # type: ignore
-
-            # Rebuild the code block example_body
+            count += 1
+            lines.insert(0, f"# example_{count}.py")
             new_block_content = "\n".join(lines)
+            replacements[i] = f"```{info.fence_tag}\n{new_block_content}\n```"
 
-            # Return the entire code block with the inserted slug
-            return f"{block_start}\n{new_block_content}\n{block_end}"
-
-        return pattern.sub(replacer, content)
+        return replacements
 
     def process_files(self) -> None:
         """
-        Find Markdown files, read their example_body, insert slug lines, then rewrite the files.
+        Find Markdown files, insert slug lines, then rewrite the files that changed.
         """
         md_files = self._find_markdown_files()
         for md_file in md_files:
-            original_content = md_file.read_text(encoding='utf-8')
-            updated_content = self._insert_slug_lines(original_content)
-            md_file.write_text(updated_content, encoding='utf-8')
+            chapter = load_chapter(md_file)
+            if replacements := self._missing_slug_lines(chapter):
+                md_file.write_text(chapter.splice(replacements), encoding='utf-8')
 
 
 def main() -> None:
@@ -4,6 +4,8 @@ from typing import Annotated
 
 import typer
 
+from pybooktools.find_files.file_index import indexed_files
+from pybooktools.find_files.find_file_types import EXCLUDE_DIRS
 from pybooktools.sluglines.slug import ensure_slug_line
 from pybooktools.util.console import console
 from pybooktools.util.display import display_function_name
@@ -21,7 +23,8 @@ def main(
     ctx: typer.Context,
     recursive: Annotated[bool, typer.Option(
         "--recursive", "-r",
-        help="Recursively search for Python files in subdirectories (that don't start with '.' or '_')"
+        help="Recursively search for Python files in subdirectories "
+             "(that don't start with '.' or '_', and aren't excluded like venv or book_utils)"
     )] = False,
     files: Annotated[list[Path], typer.Option(
         "--files", "-f", help="Specify one or more files to process"
@@ -38,8 +41,11 @@ def main(
 
     if files:  # Multiple files on the command line
         code_files: list[Path] = files
-    elif recursive:
-        code_files: list[Path] = list(Path.cwd().rglob("*.py"))
+    elif recursive:  # From the find_files index, which skips unchanged directories
+        code_files: list[Path] = [
+            f for f in indexed_files(Path.cwd(), prune=EXCLUDE_DIRS)
+            if f.suffix == ".py"
+        ]
     else:  # No flags == find all files in the current directory:
         code_files: list[Path] = list(Path.cwd().glob("*.py"))
 
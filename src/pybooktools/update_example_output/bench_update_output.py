@@ -0,0 +1,69 @@
+# bench_update_output.py
+"""
+Compare the original output splicing (separator tags inserted into the code,
+then every line searched for every tag) with the statement path ExampleUpdater
+uses now (per-statement outputs from run_statements placed after each
+statement's last line), over synthetic examples with a growing number of
+top-level statements. The statement path should scale linearly; the original
+grows with lines × tags.
+Only the splicing is timed, using the output each version of the code would
+produce, and both must give the same result.
+"""
+import time
+
+from pybooktools.update_example_output.example_updater import format_output, splice_statement_outputs
+from pybooktools.update_example_output.insert_tls_tags import insert_top_level_separators
+from pybooktools.update_example_output.tls_results_to_dict import tls_tags_to_dict
+
+
+def synthetic_example(statements: int) -> tuple[str, str, list[str]]:
+    """
+    Source with `statements` top-level prints, the output of its tagged
+    version, and the per-statement outputs run_statements would report.
+    """
+    source = "".join(f"print('value {n}')\n" for n in range(statements))
+    tagged_output = "".join(f"value {n}\n__${n + 1}$_tls__\n" for n in range(statements))
+    outputs = [f"value {n}\n" for n in range(statements)]
+    return source, tagged_output, outputs
+
+
+def dict_scan_merge(source: str, tagged_output: str) -> str:
+    with_tls_tags = insert_top_level_separators(source)
+    tls_tag_dict = tls_tags_to_dict(tagged_output)
+    with_outputs = []
+    for line in with_tls_tags.splitlines():
+        for key, value in tls_tag_dict.items():
+            if key in line:
+                with_outputs.extend(value)
+                break
+        else:
+            with_outputs.append(line)
+    with_outputs.append("")
+    return "\n".join(with_outputs)
+
+
+def statement_merge(source: str, outputs: list[str]) -> str:
+    return splice_statement_outputs(source, [format_output(output) for output in outputs])
+
+
+def best_time(merge, source: str, output, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        merge(source, output)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    print(f"{'statements':>10} {'dict scan (s)':>14} {'statements (s)':>15} {'speedup':>8}")
+    for statements in (250, 500, 1000, 2000, 4000):
+        source, tagged_output, outputs = synthetic_example(statements)
+        assert dict_scan_merge(source, tagged_output) == statement_merge(source, outputs)
+        old = best_time(dict_scan_merge, source, tagged_output)
+        new = best_time(statement_merge, source, outputs)
+        print(f"{statements:>10} {old:>14.4f} {new:>15.4f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # example_updater.py
+import ast
 import re
 import shutil
 from dataclasses import dataclass
@@ -7,26 +8,71 @@ from typing import Optional
 
 from icecream import ic
 
-from pybooktools.run_scripts.run_one_script import run_script
-from pybooktools.update_example_output.insert_tls_tags import insert_top_level_separators
-from pybooktools.update_example_output.tls_results_to_dict import tls_tags_to_dict
+from pybooktools.run_scripts.interpreter_pool import InterpreterPool
+from pybooktools.run_scripts.resource_usage import ResourceUsage
+from pybooktools.run_scripts.result_cache import ResultCache, with_source_cache
+from pybooktools.run_scripts.run_statements import run_statements
+from pybooktools.update_example_output.output_formatter import output_format
+from pybooktools.util import config
 from pybooktools.util.path_utils import cleaned_dir
 from pybooktools.util.python_example_validator import python_example_validator
 
 
+def format_output(output: str, wrap: bool = True) -> list[str]:
+    """The output of one statement as formatted output comment lines."""
+    if not output:
+        return []
+    return [
+        formatted
+        for line in output.removesuffix("\n").split("\n")
+        for formatted in output_format(line, wrap=wrap)
+    ]
+
+
+def splice_statement_outputs(source: str, outputs: list[list[str]]) -> str:
+    """
+    Place outputs[i] after the last line of top-level statement i of source,
+    as run_statements reports them. Statements past the end of outputs
+    (after a failure) get nothing.
+    """
+    after_line: dict[int, list[str]] = {}
+    for statement, lines in zip(ast.parse(source).body, outputs):
+        after_line.setdefault(statement.end_lineno, []).extend(lines)
+    with_outputs = []
+    for lineno, line in enumerate(source.splitlines(), start=1):
+        with_outputs.append(line)
+        with_outputs.extend(after_line.get(lineno, ()))
+    with_outputs.append("")
+    return "\n".join(with_outputs)
+
+
 @dataclass
 class ExampleUpdater:
+    """
+    Every stage (cleaned code, output, updated code) is kept in memory and
+    the cleaned code runs from stdin one top-level statement at a time (see
+    run_statements), so each statement's output is known without adding
+    anything to the code. The stages are written to a `.validate_<stem>`
+    scratch directory only when verbose or debug is set.
+    """
     example_path: Path
     verbose: bool
+    debug: bool = False
     example_name: Optional[str] = None
     validate_dir: Optional[Path] = None
     original_source: Optional[str] = None
     cleaned_code: Optional[str] = None
     updated_code: Optional[str] = None
+    cache: Optional[ResultCache] = None
+    interpreters: Optional[InterpreterPool] = None  # Run in subinterpreters instead of a subprocess
+    timeout: Optional[float] = config.example_timeout  # Seconds before the example is stopped; None for no limit
+    updated: bool = False  # True once the example file has been rewritten
+    usage: Optional[ResourceUsage] = None  # What running the example cost; None if cached
 
     def __post_init__(self):
         self.example_name = self.example_path.name
-        self.validate_dir = cleaned_dir(self.example_path, ".validate_")
+        if self.verbose or self.debug:
+            self.validate_dir = cleaned_dir(self.example_path, ".validate_")
         python_example_validator(self.example_path)
         self.original_source = self.example_path.read_text(encoding="utf-8")
         # Remove comments starting with `## `
@@ -35,54 +81,51 @@ class ExampleUpdater:
         )
         self.__write_with_ext(self.cleaned_code, "0_cleaned")
 
-    def __write_with_ext(self, text: str, ext: str, ftype="py") -> Path:
+    def __write_with_ext(self, text: str, ext: str, ftype="py") -> Optional[Path]:
+        """Write a scratch file, if there is a scratch directory."""
+        if self.validate_dir is None:
+            return None
         outpath = self.validate_dir / f"{self.example_path.stem}_{ext}.{ftype}"
         outpath.write_text(text, encoding="utf-8")
         return outpath
 
     def remove_validate_dir(self):
-        shutil.rmtree(self.validate_dir)
+        if self.validate_dir is not None:
+            shutil.rmtree(self.validate_dir)
 
     def update_output(self, wrap: bool = True) -> str:
         if self.verbose:
             print(f"update_output Updating {self.example_name}")
-        with_tls_tags = insert_top_level_separators(self.cleaned_code)
-        tls_tagged = self.__write_with_ext(with_tls_tags, "1_tls_tags")
-        return_code, result_value = run_script(tls_tagged)
-        if return_code != 0:
-            if not self.verbose:
-                self.remove_validate_dir()
+        runner = self.interpreters.run_statements if self.interpreters else run_statements
+        run = with_source_cache(
+            lambda source, path: runner(source, path, self.timeout), self.cache, mode="statements"
+        )
+        result = run(self.cleaned_code, self.example_path)
+        self.usage = result.usage
+        return_code, result_value = result.return_code, result.result_value
+        issue = ""
+        if result.status == "timeout":
+            return f"Timed out after {self.timeout}s: {self.example_path.parent}/{self.example_name}"
+        if result.status == "truncated":
+            # Inject the output kept up to the limit; its last line marks the cut
+            issue = f"Truncated output: {self.example_path.parent}/{self.example_name}"
+        elif return_code != 0:
             return f"Failed: {self.example_path.parent}/{self.example_name}    {return_code = }"
         self.__write_with_ext(result_value, "2_output", "txt")
-        tls_tag_dict = tls_tags_to_dict(result_value, wrap=wrap)
-        self.__write_with_ext(
-            "\n".join(tls_tag_dict.keys()), "3_tls_tag_keys", ftype="txt"
-        )
-        if self.verbose:
-            ic(tls_tag_dict)
-        self.__write_with_ext(
-            ic.format(tls_tag_dict), "3_tls_tag_dict", ftype="txt"
-        )
+        statement_outputs = [format_output(output, wrap=wrap) for output in result.outputs]
+        if self.validate_dir is not None:
+            self.__write_with_ext(
+                ic.format(statement_outputs), "3_statement_outputs", ftype="txt"
+            )
         if self.verbose:
-            print(self.example_path.read_text(encoding="utf-8"))
-            print("with_tls_tags:\n", with_tls_tags)
-        with_outputs = []
-        for line in with_tls_tags.splitlines():
-            for key, value in tls_tag_dict.items():
-                if key in line:
-                    with_outputs.extend(value)
-                    break
-            else:
-                with_outputs.append(line)
-        with_outputs.append("")
-        self.updated_code = "\n".join(with_outputs)
+            ic(statement_outputs)
+            print(self.original_source)
+        self.updated_code = splice_statement_outputs(self.cleaned_code, statement_outputs)
         self.__write_with_ext(self.updated_code, "4_updated")
         if self.verbose:
             print(self.updated_code)
             print(f"Original {self.example_name} NOT overwritten")
-        else:
-            if self.original_source != self.updated_code:
-                self.example_path.write_text(self.updated_code, encoding="utf-8")
-                print(f"Updated {self.example_name}")
-            self.remove_validate_dir()
-        return ""
+        elif self.original_source != self.updated_code:
+            self.example_path.write_text(self.updated_code, encoding="utf-8")
+            self.updated = True
+        return issue
@@ -2,8 +2,11 @@
 """
 Update embedded outputs in Python examples
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 from pathlib import Path
+from threading import Lock
 from typing import Annotated, Optional, Iterable
 
 from cyclopts import App, Parameter, Group, ValidationError
@@ -11,7 +14,12 @@ from cyclopts.types import ExistingDirectory
 from rich.console import Console
 from rich.panel import Panel
 
-from pybooktools.find_files.find_file_types import find_python_files
+from pybooktools.find_files.file_index import FileIndex
+from pybooktools.find_files.find_file_types import EXCLUDE_DIRS, find_python_files
+from pybooktools.run_scripts.import_graph import ImportGraph
+from pybooktools.run_scripts.interpreter_pool import InterpreterPool
+from pybooktools.run_scripts.resource_usage import ResourceUsage, SortKey, usage_table
+from pybooktools.run_scripts.result_cache import ResultCache
 from pybooktools.update_example_output.example_updater import ExampleUpdater
 from pybooktools.util.python_example_validator import PyExample
 
@@ -36,7 +44,21 @@ class OptFlags:
     no_wrap: Annotated[bool, Parameter(name="-nowrap", help="Do not wrap output", group=optg)] = False
     verbose: Annotated[bool, Parameter(name="-v", help="Verbose", group=optg)] = False
     trace: Annotated[bool, Parameter(name="-t", help="Trace", group=optg)] = False
-    debug: Annotated[bool, Parameter(name="-d", help="Debug", group=optg)] = False
+    debug: Annotated[bool, Parameter(name="-d", help="Debug: keep .validate_ scratch files", group=optg)] = False
+    no_cache: Annotated[bool, Parameter(name="-nocache", help="Re-run unchanged examples", group=optg)] = False
+    changed: Annotated[bool, Parameter(
+        name="-changed", help="Only examples affected by edits since the last run", group=optg
+    )] = False
+    jobs: Annotated[int, Parameter(name="-j", help="Number of examples to process at once", group=optg)] = 1
+    subinterp: Annotated[bool, Parameter(
+        name="-subinterp", help="Run examples in subinterpreters (Python 3.14+)", group=optg
+    )] = False
+    sort: Annotated[SortKey, Parameter(
+        name="-sort", help="Order the resource usage table (-r) by wall, cpu or rss", group=optg
+    )] = "wall"
+
+    def cache(self) -> Optional[ResultCache]:
+        return None if self.no_cache else ResultCache()
 
 
 def report(fname: str, files: list[Path], opts: OptFlags):
@@ -51,14 +73,15 @@ def report(fname: str, files: list[Path], opts: OptFlags):
 class Issues:
     path: Path = Path("issues.txt")
     issue_list: list[str] = field(default_factory=list)
+    lock: Lock = field(default_factory=Lock, repr=False)
 
     def __post_init__(self) -> None:
         """Clear the issues.txt file on creation"""
         self.path.write_text("", encoding="utf-8")
 
     def add(self, line: str) -> None:
-        """Appends non-empty strings to the file"""
-        with self.path.open("a", encoding="utf-8") as f:
+        """Appends non-empty strings to the file; safe to call from many threads"""
+        with self.lock, self.path.open("a", encoding="utf-8") as f:
             if line.strip():
                 f.write(f"{line.strip()}\n")
                 self.issue_list.append(line)
@@ -74,19 +97,82 @@ class Issues:
 issues = Issues()  # Clears issues.txt when this script is loaded
 
 
-def process_example(example_path: Path, verbose=False, wrap: bool = True) -> str:
-    """Process a single example"""
+def update_example(
+        example_path: Path,
+        verbose=False,
+        wrap: bool = True,
+        cache: Optional[ResultCache] = None,
+        debug: bool = False,
+        interpreters: Optional[InterpreterPool] = None,
+) -> tuple[str, bool, Optional[ResourceUsage]]:
+    """
+    Update a single example, returning (issue, updated, usage); usage is
+    None if the output came from the cache.
+    Prints nothing unless verbose, so it can run in a worker thread.
+    """
     if verbose:
         print(f"process({example_path}, verbose={verbose}, wrap={wrap}) ...")
-    return ExampleUpdater(example_path, verbose=verbose).update_output(wrap=wrap)
+    updater = ExampleUpdater(
+        example_path, verbose=verbose, debug=debug, cache=cache, interpreters=interpreters
+    )
+    issue = updater.update_output(wrap=wrap)
+    return issue, updater.updated, updater.usage
 
 
-def process_example_list(example_paths: Iterable[Path], verbose=False, wrap: bool = True) -> None:
-    """Process a list of examples"""
-    for example_path in example_paths:
-        result = process_example(example_path, verbose=verbose, wrap=wrap)
-        if result:
-            issues.add(result)
+def process_example(
+        example_path: Path,
+        verbose=False,
+        wrap: bool = True,
+        cache: Optional[ResultCache] = None,
+        debug: bool = False,
+) -> str:
+    """Process a single example"""
+    issue, updated, _ = update_example(example_path, verbose, wrap, cache, debug)
+    if updated:
+        print(f"Updated {example_path.name}")
+    return issue
+
+
+def process_example_list(
+        example_paths: Iterable[Path],
+        verbose=False,
+        wrap: bool = True,
+        cache: Optional[ResultCache] = None,
+        debug: bool = False,
+        jobs: int = 1,
+        subinterpreters: bool = False,
+        usage_sort: Optional[SortKey] = None,
+) -> list[str]:
+    """
+    Process a list of examples, up to `jobs` at once, returning the issue
+    (or "") for each. Results are reported in the order of example_paths
+    no matter which finishes first. Verbose output is only readable serially,
+    so verbose forces a single job. With subinterpreters, the examples run
+    in an InterpreterPool of `jobs` subinterpreters. With usage_sort, a table
+    of what each example that ran cost follows, sorted by it.
+    """
+    example_paths = list(example_paths)
+    jobs = 1 if verbose else max(1, jobs)
+    results: list[str] = []
+    usage: list[tuple[Path, ResourceUsage]] = []
+    with (
+        InterpreterPool(jobs) if subinterpreters else nullcontext() as interpreters,
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+    ):
+        outcomes = executor.map(
+            lambda path: update_example(path, verbose, wrap, cache, debug, interpreters), example_paths
+        )
+        for example_path, (issue, updated, cost) in zip(example_paths, outcomes):
+            if updated:
+                print(f"Updated {example_path.name}")
+            if issue:
+                issues.add(issue)
+            if cost is not None:
+                usage.append((example_path, cost))
+            results.append(issue)
+    if usage_sort and usage:
+        console.print(usage_table(usage, usage_sort, count=15))
+    return results
 
 
 @app.command(name="-f", sort_key=1)
@@ -95,7 +181,9 @@ def update_examples(files: list[PyExample], *, opts: Optional[OptFlags] = None)
     opts = opts or OptFlags()
     if opts.verbose:
         report("process_files", files, opts=opts)
-    process_example_list(files, opts.verbose, not opts.no_wrap)
+    process_example_list(
+        files, opts.verbose, not opts.no_wrap, opts.cache(), opts.debug, opts.jobs, opts.subinterp
+    )
     issues.display(f"{files}")
 
 
@@ -107,10 +195,12 @@ def update_all_examples_in_dir(
     """All: Update all Python examples in specified directory [.]"""
     opts = opts or OptFlags()
     # paths = [p for p in target_dir.glob("*.py") if p.name != "__init__.py"]
-    paths = list(find_python_files("d", target_dir))
+    paths = sorted(find_python_files("d", target_dir))
     if opts.verbose:
         report("all_files_in_dir", paths, opts=opts)
-    process_example_list(paths, opts.verbose, not opts.no_wrap)
+    process_example_list(
+        paths, opts.verbose, not opts.no_wrap, opts.cache(), opts.debug, opts.jobs, opts.subinterp
+    )
     issues.display(f"{target_dir}")
 
 
@@ -118,11 +208,22 @@ def update_all_examples_in_dir(
 def recursive(target_dir: ExistingDirectory = Path("."), opts: Optional[OptFlags] = None) -> None:
     """Recursive: Update all Python examples in specified directory [.] AND subdirectories"""
     opts = opts or OptFlags()
-    for p in find_python_files("r", target_dir):
-        if opts.verbose:
-            report("recursive", [p], opts=opts)
-        process_example(p, opts.verbose, not opts.no_wrap)
-        issues.display(f"{p}")
+    paths = sorted(find_python_files("r", target_dir))
+    graph = ImportGraph("px", index=FileIndex(target_dir, EXCLUDE_DIRS).refresh()) if opts.changed else None
+    if graph:
+        paths = graph.affected(paths)
+    if opts.verbose:
+        report("recursive", paths, opts=opts)
+    results = process_example_list(
+        paths, opts.verbose, not opts.no_wrap, opts.cache(), opts.debug, opts.jobs, opts.subinterp, opts.sort
+    )
+    if graph:
+        graph.record(
+            [p for p, issue in zip(paths, results) if not issue],
+            [p for p, issue in zip(paths, results) if issue],
+        )
+        graph.save()
+    issues.display(f"{target_dir}")
 
 
 # Demo tests:
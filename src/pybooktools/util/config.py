@@ -9,6 +9,16 @@ LINE_LENGTH: Final[int] = 65
 
 book_chapters = Path(r"C:\git\ThinkingInTypes.github.io\Chapters")
 
+# Persistent caches (example results, indexes) live here, relative to the working directory:
+cache_dir: Final[Path] = Path(".pybooktools_cache")
+
+# Wall-clock limit in seconds for running one example; a hung example fails instead of blocking the run:
+example_timeout: Final[float] = 60.0
+
+# Output kept from one example; one that prints more is killed and its output truncated:
+max_output_bytes: Final[int] = 1_000_000
+max_output_lines: Final[int] = 10_000
+
 chapter_pattern: Final[str] = r"^[CZ](\d+)_.+\.md$"
 
 repo_chapter_pattern: Final[str] = r"^[cz]\d+_[a-z_]+$"
@@ -20,3 +30,27 @@ listing_pattern: Final[Pattern[str]] = re.compile(r"```python\n(# (.*?)\n)?(.*?)
 default_slug_line_pattern: Pattern[str] = re.compile(
     r"^\s*(?:#|//)\s*(\S+\.[a-zA-Z0-9_]+)"
 )
+
+# Modules imported once by each warm worker in run_scripts.script_pool, and
+# by the fork server in run_scripts.fork_server. Missing modules are skipped,
+# so third-party entries are safe here. Name the submodules examples use:
+# importing a package does not always import them.
+preload_modules: Final[tuple[str, ...]] = (
+    "abc",
+    "collections",
+    "dataclasses",
+    "datetime",
+    "decimal",
+    "enum",
+    "functools",
+    "itertools",
+    "json",
+    "pathlib",
+    "re",
+    "textwrap",
+    "typing",
+    "pydantic",
+    "pydantic.main",  # BaseModel, which `import pydantic` loads lazily
+    "rich",
+    "rich.console",
+)
@@ -0,0 +1,79 @@
+# disk_cache.py
+"""
+A directory of cache entries, one text file per key, shared by the
+example-result and ruff-format caches. Entries are written atomically, so
+concurrent processes and threads never see half an entry; reading an entry
+marks it recently used, and eviction removes entries by age and then the
+least recently used beyond a total size.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write text to path by way of a temporary file of its own in the same directory."""
+    fd, temp = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+class DiskCache:
+    def __init__(self, cache_dir: Path, suffix: str, max_age_days: float, max_size_mb: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.max_size = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.evict()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def read(self, key: str) -> Optional[str]:
+        entry = self._entry(key)
+        try:
+            text = entry.read_text(encoding="utf-8")
+        except OSError:
+            return None
+        try:
+            os.utime(entry)  # Recently used entries survive eviction
+        except OSError:  # Evicted meanwhile by another process
+            pass
+        return text
+
+    def write(self, key: str, text: str) -> None:
+        write_atomic(self._entry(key), text)
+
+    def evict(self) -> None:
+        """Remove entries older than max_age, then the least recently used beyond max_size."""
+        now = time.time()
+        entries: list[tuple[float, int, Path]] = []
+        for entry in self.cache_dir.glob(f"*{self.suffix}"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                entry.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        if self.max_size is None:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for entry in self.cache_dir.glob(f"*{self.suffix}"):
+            entry.unlink(missing_ok=True)